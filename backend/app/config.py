@@ -4,6 +4,7 @@ Initializes Supabase client and Gemini AI model.
 """
 
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -13,13 +14,34 @@ load_dotenv()
 SUPABASE_URL: str = os.getenv("SUPABASE_URL", "")
 SUPABASE_KEY: str = os.getenv("SUPABASE_KEY", "")
 GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
+# Project JWT secret (Settings > API) for verifying HS256 access tokens locally
+SUPABASE_JWT_SECRET: str = os.getenv("SUPABASE_JWT_SECRET", "")
+
+# Database I/O: blocking Supabase calls run on a pool of DB_MAX_WORKERS
+# threads (app/utils/db.py), sharing one keep-alive HTTP/2 connection pool
+DB_MAX_WORKERS: int = int(os.getenv("DB_MAX_WORKERS", "100"))
+DB_TIMEOUT_SECONDS: float = float(os.getenv("DB_TIMEOUT_SECONDS", "30"))
+# Per-query timeout for independent queries fanned out with db.gather
+DB_QUERY_TIMEOUT_SECONDS: float = float(os.getenv("DB_QUERY_TIMEOUT_SECONDS", "5"))
 
 # Initialize Supabase client
 supabase_client = None
 try:
     if SUPABASE_URL and SUPABASE_KEY:
-        from supabase import create_client, Client
-        supabase_client: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        import httpx
+        from supabase import create_client, Client, ClientOptions
+        supabase_http_client = httpx.Client(
+            http2=True,
+            follow_redirects=True,
+            timeout=DB_TIMEOUT_SECONDS,
+            limits=httpx.Limits(
+                max_connections=DB_MAX_WORKERS,
+                max_keepalive_connections=DB_MAX_WORKERS
+            )
+        )
+        supabase_client: Client = create_client(
+            SUPABASE_URL, SUPABASE_KEY, options=ClientOptions(httpx_client=supabase_http_client)
+        )
         print("✅ Supabase client initialized successfully.")
     else:
         print("⚠️ Warning: SUPABASE_URL or SUPABASE_KEY not found.")
@@ -39,4 +61,90 @@ try:
         print("⚠️ Warning: GEMINI_API_KEY not found.")
         print("   Gemini AI features will be unavailable.")
 except Exception as e:
-    print(f"❌ Error initializing Gemini AI model: {e}")
\ No newline at end of file
+    print(f"❌ Error initializing Gemini AI model: {e}")
+
+# ============ Performance Tuning ============
+# Maximum number of rendered amortization schedule PDFs kept in memory
+SCHEDULE_PDF_CACHE_SIZE: int = int(os.getenv("SCHEDULE_PDF_CACHE_SIZE", "256"))
+
+# Gemini calls run in a bounded thread pool so they never block the event loop
+LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT_SECONDS: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+
+# Cache for generated LLM explanations and messages (keyed by prompt hash)
+LLM_CACHE_SIZE: int = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+LLM_CACHE_TTL_SECONDS: float = float(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+# Optional shared backend across workers: "" (in-process only) or "supabase"
+LLM_CACHE_BACKEND: str = os.getenv("LLM_CACHE_BACKEND", "").lower()
+
+# Persist loan applications before the AI explanation is generated; the
+# explanation is filled in by a background task (overridable per request)
+DEFER_AI_EXPLANATION: bool = os.getenv("DEFER_AI_EXPLANATION", "false").lower() in ("1", "true", "yes")
+
+# Access token verification: "local" checks signature/expiry in-process
+# (HS256 secret or cached JWKS) and falls back to Supabase when no key is
+# available; "remote" always calls supabase.auth.get_user
+JWT_VERIFICATION: str = os.getenv("JWT_VERIFICATION", "local").lower()
+JWT_AUDIENCE: str = os.getenv("JWT_AUDIENCE", "authenticated")
+JWKS_REFRESH_SECONDS: float = float(os.getenv("JWKS_REFRESH_SECONDS", "600"))
+
+# Cache for profiles.role lookups; the short TTL bounds how long a role change
+# takes to reach other workers (the worker making the change invalidates at once)
+ROLE_CACHE_SIZE: int = int(os.getenv("ROLE_CACHE_SIZE", "4096"))
+ROLE_CACHE_TTL_SECONDS: float = float(os.getenv("ROLE_CACHE_TTL_SECONDS", "60"))
+
+# Keyset pagination for list endpoints (?cursor=&page_size=)
+LIST_DEFAULT_PAGE_SIZE: int = int(os.getenv("LIST_DEFAULT_PAGE_SIZE", "50"))
+LIST_MAX_PAGE_SIZE: int = int(os.getenv("LIST_MAX_PAGE_SIZE", "500"))
+
+# Rows per chunk when streaming bank statement CSVs
+BANK_STATEMENT_CHUNK_ROWS: int = int(os.getenv("BANK_STATEMENT_CHUNK_ROWS", "5000"))
+
+# Normalized description -> category cache for statement imports; admin
+# corrections are persisted to MERCHANT_CATEGORY_FILE (JSON) when set
+MERCHANT_CACHE_SIZE: int = int(os.getenv("MERCHANT_CACHE_SIZE", "50000"))
+MERCHANT_CATEGORY_FILE: str = os.getenv("MERCHANT_CATEGORY_FILE", "")
+
+# Batched transaction writes for statement imports
+INGEST_BATCH_SIZE: int = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+INGEST_MAX_CONCURRENCY: int = int(os.getenv("INGEST_MAX_CONCURRENCY", "4"))
+INGEST_MAX_RETRIES: int = int(os.getenv("INGEST_MAX_RETRIES", "3"))
+INGEST_RETRY_BACKOFF_SECONDS: float = float(os.getenv("INGEST_RETRY_BACKOFF_SECONDS", "0.5"))
+
+# Background statement ingestion: the upload is stored under
+# STATEMENT_UPLOAD_DIR and processed by a worker pool (overridable per request)
+STATEMENT_JOB_MODE: bool = os.getenv("STATEMENT_JOB_MODE", "false").lower() in ("1", "true", "yes")
+STATEMENT_JOB_WORKERS: int = int(os.getenv("STATEMENT_JOB_WORKERS", "2"))
+STATEMENT_UPLOAD_DIR: str = os.getenv(
+    "STATEMENT_UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "riskoff-statements")
+)
+# On startup, statements still "processing" after this long with no file in
+# STATEMENT_UPLOAD_DIR are marked failed. Instances that run jobs should share
+# STATEMENT_UPLOAD_DIR so their running jobs are visible to each other's sweep
+STATEMENT_JOB_STALE_MINUTES: int = int(os.getenv("STATEMENT_JOB_STALE_MINUTES", "60"))
+
+# Process-pool statement parsing for large files: statements of at least
+# PARALLEL_PARSE_MIN_BYTES are cut into PARALLEL_PARSE_BLOCK_BYTES blocks on
+# line boundaries and parsed on PARSER_PROCESSES cores
+PARSER_PROCESSES: int = int(os.getenv("PARSER_PROCESSES", str(os.cpu_count() or 1)))
+PARALLEL_PARSE_MIN_BYTES: int = int(os.getenv("PARALLEL_PARSE_MIN_BYTES", str(4 * 1024 * 1024)))
+PARALLEL_PARSE_BLOCK_BYTES: int = int(os.getenv("PARALLEL_PARSE_BLOCK_BYTES", str(2 * 1024 * 1024)))
+
+# Skip statement rows the user has already uploaded (content hash per row,
+# looked up in batches of DEDUP_LOOKUP_BATCH_SIZE; see sql/transaction_dedup.sql).
+# Without that SQL applied, statements are saved with plain inserts instead
+DEDUP_TRANSACTIONS: bool = os.getenv("DEDUP_TRANSACTIONS", "true").lower() in ("1", "true", "yes")
+DEDUP_LOOKUP_BATCH_SIZE: int = int(os.getenv("DEDUP_LOOKUP_BATCH_SIZE", "100"))
+
+# Per-user /user/dashboard snapshots, evicted when the user's profile, loans
+# or transactions change; the TTL bounds staleness on other workers
+DASHBOARD_CACHE_SIZE: int = int(os.getenv("DASHBOARD_CACHE_SIZE", "10000"))
+DASHBOARD_CACHE_TTL_SECONDS: float = float(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "300"))
+
+# Months of income/expense history in the dashboard series (read from the
+# spending rollup, see sql/spending_rollups.sql)
+DASHBOARD_SERIES_MONTHS: int = int(os.getenv("DASHBOARD_SERIES_MONTHS", "12"))
+
+# Profiles scored per batch by the customer score recompute job
+# (see sql/customer_scores.sql)
+CUSTOMER_SCORE_BATCH_SIZE: int = int(os.getenv("CUSTOMER_SCORE_BATCH_SIZE", "1000"))
@@ -4,6 +4,7 @@ A Fintech application for risk assessment and loan management.
 With rate limiting and security middleware.
 """
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
@@ -13,17 +14,32 @@ from slowapi.errors import RateLimitExceeded
 
 from app.config import supabase_client
 from app.routers import auth, loans, upload, admin, agent, zudu, user, grievances, simulator, analytics
+from app.services import statement_jobs
 
 # Initialize rate limiter
 limiter = Limiter(key_func=get_remote_address)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Resume or fail statement jobs a previous process left unfinished."""
+    recovered = await statement_jobs.recover_jobs()
+    if recovered["requeued"] or recovered["failed"]:
+        print(
+            f"⚠️ Unfinished statement jobs: {recovered['requeued']} requeued, "
+            f"{recovered['failed']} marked failed"
+        )
+    yield
+
+
 # Initialize FastAPI application
 app = FastAPI(
     title="RISKOFF API",
     description="A Fintech API for risk assessment and loan management",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Attach limiter to app state
@@ -3,12 +3,18 @@ Admin router for RISKOFF API.
 Handles administrative operations with role-based access control.
 """
 
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import Optional
-from app.config import supabase_client
-from app.schemas import LoanStatusUpdate, RiskAnalysisRequest
-from app.utils.security import get_current_user, CurrentUser
-from app.services import notification, audit
+import asyncio
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from typing import Any, Dict, Iterable, List, Optional
+from app.config import supabase_client, LIST_DEFAULT_PAGE_SIZE, LIST_MAX_PAGE_SIZE
+from app.schemas import LoanStatusUpdate, RiskAnalysisRequest, UserRoleUpdate, MerchantCategoryOverride
+from app.utils.security import get_current_user, CurrentUser, invalidate_user_role
+from app.utils import db
+from app.services import notification, audit, customer_score, dashboard_cache
+from app.services.llm import llm_service
+from app.services.parser import merchant_cache, normalize_description, CATEGORY_KEYWORDS
+from app.services.risk_engine import annuity_factor, DEFAULT_ANNUAL_RATE
+from app.utils.pagination import LOAN_FIELDS, select_fields, page_limit, select_page, paginate, page_total, build_page
 
 router = APIRouter(
     prefix="/admin",
@@ -21,46 +27,99 @@ async def verify_admin(current_user: CurrentUser = Depends(get_current_user)) ->
     """
     Dependency to verify the current user has admin privileges.
     
+    The role comes from the profiles table via get_current_user, which is
+    resolved once per request and served from the role cache.
+    
     Raises:
         HTTPException: 403 if user is not an admin
     """
+    if (current_user.role or "").lower() != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    
+    return current_user
+
+
+# ============ Helpers ============
+
+# User IDs per profiles lookup; keeps the PostgREST query string short
+PROFILE_BATCH_SIZE = 200
+
+
+async def _fetch_profile_map(user_ids: Iterable[Optional[str]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetch full_name and email for many users with batched in_() queries,
+    issued concurrently.
+    
+    Returns:
+        Map of user ID to profile row. Users whose batch failed are left out.
+    """
+    unique_ids = list(dict.fromkeys(uid for uid in user_ids if uid))
+    batches = [
+        unique_ids[start:start + PROFILE_BATCH_SIZE]
+        for start in range(0, len(unique_ids), PROFILE_BATCH_SIZE)
+    ]
+    responses = await asyncio.gather(*[
+        db.execute(supabase_client.table("profiles").select("id, full_name, email").in_("id", batch))
+        for batch in batches
+    ], return_exceptions=True)
+    
+    profiles: Dict[str, Dict[str, Any]] = {}
+    for batch, response in zip(batches, responses):
+        if isinstance(response, Exception):
+            print(f"⚠️ Profile lookup failed for {len(batch)} users: {response}")
+            continue
+        for profile in response.data or []:
+            profiles[profile.get("id")] = profile
+    
+    return profiles
+
+
+def _summarize_loans(loans: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Group loans by status in one pass, in the same shape as get_loan_stats.
+    Fallback for databases without sql/loan_stats.sql applied.
+    """
+    summary: Dict[str, Dict[str, Any]] = {}
+    for loan in loans:
+        loan_status = loan.get("status") or "UNKNOWN"
+        row = summary.setdefault(loan_status, {"status": loan_status, "loan_count": 0, "total_volume": 0.0})
+        row["loan_count"] += 1
+        row["total_volume"] += float(loan.get("amount") or 0)
+    return list(summary.values())
+
+
+def _risk_category(score: float) -> str:
+    """Map a risk score to LOW / MEDIUM / HIGH."""
+    if score <= 30:
+        return "LOW"
+    elif score <= 60:
+        return "MEDIUM"
+    return "HIGH"
+
+
+async def _lookup_customer_score(user_id: str) -> int:
+    """
+    A customer's score from their profile: the persisted score when it is
+    current, otherwise computed from the profile's financial data.
+    
+    Raises:
+        HTTPException: 503 without a database, 404 if the profile is missing
+    """
     if not supabase_client:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Database service unavailable"
+            detail="Supabase client not initialized"
         )
-    
-    try:
-        # Check if user has admin role in profiles table
-        response = supabase_client.table("profiles").select("role").eq(
-            "id", current_user.id
-        ).limit(1).execute()
-        
-        if not response.data:
-            # No profile found - check if it might be stored elsewhere
-            # For now, deny access
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Admin privileges required"
-            )
-        
-        user_role = response.data[0].get("role", "").lower()
-        
-        if user_role != "admin":
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Admin privileges required"
-            )
-        
-        return current_user
-        
-    except HTTPException:
-        raise
-    except Exception as e:
+    response = await db.execute(supabase_client.table("profiles").select("*").eq("id", user_id).limit(1))
+    if not response.data:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Admin privileges required"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"User with ID {user_id} not found"
         )
+    return customer_score.get_customer_score(response.data[0])
 
 
 # ============ Admin Endpoints ============
@@ -80,22 +139,25 @@ async def get_dashboard_stats(admin: CurrentUser = Depends(verify_admin)):
         )
 
     try:
-        # Fetch all loans
-        response = supabase_client.table("loans").select("status, amount").execute()
-        loans = response.data or []
+        # Per-status counts and volume from the trigger-maintained summary
+        summary = None
+        try:
+            summary = (await db.execute(supabase_client.rpc("get_loan_stats"))).data
+        except Exception as e:
+            print(f"⚠️ get_loan_stats unavailable, aggregating loans directly: {e}")
 
-        # Calculate stats
-        total_loans = len(loans)
-        pending_count = sum(1 for l in loans if l.get("status") == "PENDING")
-        approved_count = sum(1 for l in loans if l.get("status") == "APPROVED")
-        rejected_count = sum(1 for l in loans if l.get("status") == "REJECTED")
-        total_volume = sum(float(l.get("amount", 0)) for l in loans)
+        if summary is None:
+            response = await db.execute(supabase_client.table("loans").select("status, amount"))
+            summary = _summarize_loans(response.data or [])
+
+        counts = {row.get("status"): int(row.get("loan_count") or 0) for row in summary}
+        total_volume = sum(float(row.get("total_volume") or 0) for row in summary)
 
         return {
-            "total_loans": total_loans,
-            "pending_count": pending_count,
-            "approved_count": approved_count,
-            "rejected_count": rejected_count,
+            "total_loans": sum(counts.values()),
+            "pending_count": counts.get("PENDING", 0),
+            "approved_count": counts.get("APPROVED", 0),
+            "rejected_count": counts.get("REJECTED", 0),
             "total_volume": round(total_volume, 2)
         }
 
@@ -107,11 +169,23 @@ async def get_dashboard_stats(admin: CurrentUser = Depends(verify_admin)):
 
 
 @router.get("/loans")
-async def get_all_loans(admin: CurrentUser = Depends(verify_admin)):
+async def get_all_loans(
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    page_size: Optional[int] = Query(
+        None, ge=1, le=LIST_MAX_PAGE_SIZE,
+        description=f"Rows per page (default {LIST_DEFAULT_PAGE_SIZE} with a cursor; omit both for every row)"
+    ),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    include_total: bool = Query(False, description="Count all matching rows for total (paged requests only)"),
+    admin: CurrentUser = Depends(verify_admin)
+):
     """
-    Get all loan applications for admin review.
+    Get loan applications for admin review.
     
-    Returns loans ordered by newest first with user info.
+    Returns loans ordered by newest first with user info. With cursor or
+    page_size they come one page at a time; pass next_cursor back to fetch
+    the following page. total is the number of loans, not the page length;
+    paged requests get it only with include_total=true (otherwise null).
     Requires admin role.
     """
     if not supabase_client:
@@ -120,53 +194,43 @@ async def get_all_loans(admin: CurrentUser = Depends(verify_admin)):
             detail="Supabase client not initialized"
         )
 
+    columns = select_fields(fields, LOAN_FIELDS)
+
     try:
-        # Fetch all loans
-        response = supabase_client.table("loans").select("*").order(
-            "created_at", desc=True
-        ).execute()
+        # Fetch one page of loans
+        limit = page_limit(cursor, page_size)
+        query = select_page(supabase_client.table("loans"), columns, limit, include_total)
+        response = await db.execute(paginate(query, cursor, limit))
+        
+        loans, next_cursor = build_page(response.data, limit)
         
-        loans = response.data or []
+        # One batched profile fetch for every borrower on the page
+        profiles = await _fetch_profile_map(loan.get("user_id") for loan in loans)
         
-        # Enrich loans with user info and derived fields
+        # Enrich loans with user info and derived fields in a single pass
         enriched_loans = []
         for loan in loans:
-            # Get user info from profiles table
-            user_id = loan.get("user_id")
-            if user_id:
-                try:
-                    profile_response = supabase_client.table("profiles").select(
-                        "full_name, email"
-                    ).eq("id", user_id).limit(1).execute()
-                    
-                    if profile_response.data:
-                        profile = profile_response.data[0]
-                        loan["user_name"] = profile.get("full_name", "N/A")
-                        loan["user_email"] = profile.get("email", "N/A")
-                    else:
-                        loan["user_name"] = "Unknown"
-                        loan["user_email"] = "N/A"
-                except:
+            # Borrower info only when user_id was selected (see ?fields=)
+            if "user_id" in loan:
+                user_id = loan.get("user_id")
+                profile = profiles.get(user_id) if user_id else None
+                if profile is not None:
+                    loan["user_name"] = profile.get("full_name", "N/A")
+                    loan["user_email"] = profile.get("email", "N/A")
+                else:
                     loan["user_name"] = "Unknown"
                     loan["user_email"] = "N/A"
-            else:
-                loan["user_name"] = "Unknown"
-                loan["user_email"] = "N/A"
             
             # Derive risk_category from risk_score if not present
             if not loan.get("risk_category") and loan.get("risk_score") is not None:
-                score = loan.get("risk_score", 0)
-                if score <= 30:
-                    loan["risk_category"] = "LOW"
-                elif score <= 60:
-                    loan["risk_category"] = "MEDIUM"
-                else:
-                    loan["risk_category"] = "HIGH"
+                loan["risk_category"] = _risk_category(loan.get("risk_score", 0))
             
             enriched_loans.append(loan)
         
-        return {"loans": enriched_loans, "total": len(enriched_loans)}
+        return {"loans": enriched_loans, "total": page_total(response, loans, limit), "next_cursor": next_cursor}
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -201,9 +265,9 @@ async def update_loan_status(
 
     try:
         # First, get the current loan to retrieve user_id and current explanation
-        loan_response = supabase_client.table("loans").select("*").eq(
+        loan_response = await db.execute(supabase_client.table("loans").select("*").eq(
             "id", loan_id
-        ).limit(1).execute()
+        ).limit(1))
         
         if not loan_response.data:
             raise HTTPException(
@@ -214,7 +278,7 @@ async def update_loan_status(
         current_loan = loan_response.data[0]
         user_id = current_loan.get("user_id")
         old_status = current_loan.get("status")
-        current_explanation = current_loan.get("ai_explanation", "")
+        current_explanation = (current_loan.get("ai_explanation") or "")
         
         # Prepare update data
         update_data = {"status": update.status}
@@ -230,9 +294,9 @@ async def update_loan_status(
             update_data["admin_remarks"] = update.remarks
 
         # Update the loan
-        response = supabase_client.table("loans").update(update_data).eq(
+        response = await db.execute(supabase_client.table("loans").update(update_data).eq(
             "id", loan_id
-        ).execute()
+        ))
 
         if not response.data:
             raise HTTPException(
@@ -241,6 +305,8 @@ async def update_loan_status(
             )
 
         updated_loan = response.data[0]
+        if user_id:
+            dashboard_cache.invalidate_dashboard(user_id)
         
         # Fetch user email from profiles
         user_email = None
@@ -248,9 +314,9 @@ async def update_loan_status(
         
         if user_id:
             try:
-                profile_response = supabase_client.table("profiles").select(
+                profile_response = await db.execute(supabase_client.table("profiles").select(
                     "email, full_name"
-                ).eq("id", user_id).limit(1).execute()
+                ).eq("id", user_id).limit(1))
                 
                 if profile_response.data:
                     user_email = profile_response.data[0].get("email")
@@ -296,6 +362,163 @@ async def update_loan_status(
         )
 
 
+@router.get("/llm-cache")
+async def get_llm_cache_stats(admin: CurrentUser = Depends(verify_admin)):
+    """
+    Get hit/miss counters for the LLM response cache.
+    Requires admin role.
+    """
+    return llm_service.cache_stats()
+
+
+@router.delete("/llm-cache")
+async def clear_llm_cache(admin: CurrentUser = Depends(verify_admin)):
+    """
+    Invalidate all cached LLM explanations and messages.
+    Use after changing prompt wording or the underlying model.
+    Requires admin role.
+    """
+    await llm_service.invalidate_cache()
+
+    await audit.log_action(
+        user_id=admin.id,
+        action="ADMIN_LLM_CACHE_CLEAR",
+        details={}
+    )
+
+    return {"message": "LLM response cache cleared"}
+
+
+@router.get("/merchant-categories")
+async def get_merchant_categories(admin: CurrentUser = Depends(verify_admin)):
+    """
+    List category corrections and merchant cache counters.
+    Requires admin role.
+    """
+    return {
+        "overrides": merchant_cache.overrides(),
+        "stats": merchant_cache.stats()
+    }
+
+
+@router.put("/merchant-categories")
+async def set_merchant_category(
+    override: MerchantCategoryOverride,
+    admin: CurrentUser = Depends(verify_admin)
+):
+    """
+    Correct the category for a statement description.
+    
+    Applies to every description with the same merchant key on future
+    statement imports. Requires admin role.
+    """
+    valid_categories = list(CATEGORY_KEYWORDS.keys()) + ["Misc"]
+    if override.category not in valid_categories:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid category. Must be one of: {valid_categories}"
+        )
+    
+    if not normalize_description(override.description):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Description must contain at least one letter"
+        )
+    
+    key = await asyncio.to_thread(merchant_cache.set_override, override.description, override.category)
+    
+    await audit.log_action(
+        user_id=admin.id,
+        action="ADMIN_MERCHANT_CATEGORY",
+        details={"merchant_key": key, "category": override.category}
+    )
+    
+    return {"message": "Merchant category saved", "merchant_key": key, "category": override.category}
+
+
+@router.delete("/merchant-categories")
+async def delete_merchant_category(
+    description: str = Query(..., min_length=1),
+    admin: CurrentUser = Depends(verify_admin)
+):
+    """
+    Remove a category correction so keyword matching applies again.
+    Requires admin role.
+    """
+    if not await asyncio.to_thread(merchant_cache.remove_override, description):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No category correction for this description"
+        )
+    
+    await audit.log_action(
+        user_id=admin.id,
+        action="ADMIN_MERCHANT_CATEGORY",
+        details={"merchant_key": normalize_description(description), "category": None}
+    )
+    
+    return {"message": "Merchant category removed"}
+
+
+@router.patch("/users/{user_id}/role")
+async def update_user_role(
+    user_id: str,
+    update: UserRoleUpdate,
+    admin: CurrentUser = Depends(verify_admin)
+):
+    """
+    Change a user's role.
+    
+    Invalidates the cached role so the change applies on the user's next request.
+    Requires admin role.
+    """
+    if not supabase_client:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Supabase client not initialized"
+        )
+
+    valid_roles = ["user", "admin"]
+    new_role = update.role.lower()
+    if new_role not in valid_roles:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid role. Must be one of: {valid_roles}"
+        )
+
+    try:
+        response = await db.execute(supabase_client.table("profiles").update({
+            "role": new_role
+        }).eq("id", user_id))
+
+        if not response.data:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"User with ID {user_id} not found"
+            )
+
+        invalidate_user_role(user_id)
+
+        await audit.log_action(
+            user_id=admin.id,
+            action="ADMIN_ROLE_CHANGE",
+            details={
+                "target_user_id": user_id,
+                "new_role": new_role
+            }
+        )
+
+        return {"message": "User role updated successfully", "user_id": user_id, "role": new_role}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
 # ============ Legacy Endpoints (Backward Compatibility) ============
 
 @router.patch("/loans/status")
@@ -325,9 +548,9 @@ async def update_loan_status_legacy(
     try:
         # First, get the current loan to retrieve user_id and current explanation
         # SECURITY FIX: Use update.loan_id instead of undefined loan_id
-        loan_response = supabase_client.table("loans").select("*").eq(
+        loan_response = await db.execute(supabase_client.table("loans").select("*").eq(
             "id", update.loan_id
-        ).limit(1).execute()
+        ).limit(1))
         
         if not loan_response.data:
             raise HTTPException(
@@ -337,7 +560,7 @@ async def update_loan_status_legacy(
         
         current_loan = loan_response.data[0]
         old_status = current_loan.get("status")
-        current_explanation = current_loan.get("ai_explanation", "")
+        current_explanation = (current_loan.get("ai_explanation") or "")
         
         # Prepare update data
         update_data = {"status": update.status}
@@ -352,9 +575,9 @@ async def update_loan_status_legacy(
         if update.remarks:
             update_data["admin_remarks"] = update.remarks
 
-        response = supabase_client.table("loans").update(update_data).eq(
+        response = await db.execute(supabase_client.table("loans").update(update_data).eq(
             "id", update.loan_id
-        ).execute()
+        ))
 
         if not response.data:
             raise HTTPException(
@@ -362,6 +585,9 @@ async def update_loan_status_legacy(
                 detail="Loan not found"
             )
 
+        if current_loan.get("user_id"):
+            dashboard_cache.invalidate_dashboard(current_loan["user_id"])
+
         return {
             "message": "Loan status updated successfully",
             "loan": response.data[0]
@@ -387,18 +613,30 @@ async def analyze_risk(request: RiskAnalysisRequest, admin: CurrentUser = Depend
     - Customer credit score
     - Loan amount vs income ratio
     
+    Pass customer_score, or user_id to use the customer's stored score.
+    
     Returns detailed risk assessment with recommendation.
     Requires admin role.
     """
+    if request.customer_score is None and not request.user_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide customer_score or user_id"
+        )
+
     try:
+        score = request.customer_score
+        if score is None:
+            score = await _lookup_customer_score(request.user_id)
+        
         # Calculate monthly income
         monthly_income = request.annual_income / 12
         
-        # Calculate EMI (12% annual interest rate)
-        rate = 0.12 / 12
+        # Calculate EMI (12% annual interest rate) from the cached annuity factor
         months = request.loan_tenure_months
         principal = request.loan_amount_requested
-        emi = (principal * rate * pow(1 + rate, months)) / (pow(1 + rate, months) - 1)
+        factor = float(annuity_factor(DEFAULT_ANNUAL_RATE, months))
+        emi = principal * factor
         
         # EMI to Income Ratio
         emi_to_income = (emi / monthly_income) * 100
@@ -428,16 +666,16 @@ async def analyze_risk(request: RiskAnalysisRequest, admin: CurrentUser = Depend
             risk_factors.append("Less than 3 years employment")
         
         # Customer score factor
-        if request.customer_score < 300:
+        if score < 300:
             risk_score += 35
             risk_factors.append("Very low customer score (< 300)")
-        elif request.customer_score < 500:
+        elif score < 500:
             risk_score += 25
             risk_factors.append("Low customer score (< 500)")
-        elif request.customer_score < 650:
+        elif score < 650:
             risk_score += 15
             risk_factors.append("Below average customer score (< 650)")
-        elif request.customer_score < 750:
+        elif score < 750:
             risk_score += 5
             risk_factors.append("Average customer score")
         
@@ -489,7 +727,7 @@ async def analyze_risk(request: RiskAnalysisRequest, admin: CurrentUser = Depend
         # Calculate max recommended loan based on income
         disposable_income = monthly_income - request.monthly_expenses
         max_emi_affordable = disposable_income * 0.4  # 40% of disposable income
-        max_loan = (max_emi_affordable * (pow(1 + rate, months) - 1)) / (rate * pow(1 + rate, months))
+        max_loan = max_emi_affordable / factor
         
         return {
             "risk_score": risk_score,
@@ -501,11 +739,47 @@ async def analyze_risk(request: RiskAnalysisRequest, admin: CurrentUser = Depend
             "emi_to_income_ratio": round(emi_to_income, 2),
             "debt_to_income_ratio": round(debt_to_income, 2),
             "max_recommended_loan": round(max(max_loan, 0), 2),
+            "customer_score": score,
             "risk_factors": risk_factors if risk_factors else ["No significant risk factors identified"]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Risk analysis failed: {str(e)}"
         )
+
+
+@router.post("/customer-scores/recompute")
+async def recompute_customer_scores(admin: CurrentUser = Depends(verify_admin)):
+    """
+    Recompute stored customer scores for profiles changed since the last run.
+    
+    Only profiles whose financial data changed, or that were scored with an
+    older version of the rules, are read and scored (in vectorized batches).
+    Safe to call on a schedule. Requires admin role.
+    """
+    if not supabase_client:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Supabase client not initialized"
+        )
+
+    try:
+        summary = await customer_score.recompute_customer_scores()
+
+        await audit.log_action(
+            user_id=admin.id,
+            action="ADMIN_CUSTOMER_SCORE_RECOMPUTE",
+            details=summary
+        )
+
+        return summary
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Customer score recompute failed: {str(e)}"
+        )
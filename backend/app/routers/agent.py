@@ -8,6 +8,7 @@ from app.config import supabase_client
 from app.schemas import ChatRequest, ChatResponse
 from app.services.llm import generate_bank_chat_response
 from app.utils.security import get_current_user, CurrentUser
+from app.utils import db
 
 router = APIRouter(
     prefix="/agent",
@@ -38,35 +39,31 @@ async def chat_with_agent(
         # Get user's full name from profiles table (or use metadata from auth)
         user_name = current_user.full_name or "Valued Customer"
         
-        # Try to get additional profile info if available
-        try:
-            profile_response = supabase_client.table("profiles").select("full_name").eq("id", current_user.id).limit(1).execute()
+        # Fetch profile name and latest loan concurrently; either may fail
+        # (e.g. missing table) and the chat continues with defaults
+        profile_response, loan_response = await db.gather(
+            supabase_client.table("profiles").select("full_name").eq("id", current_user.id).limit(1),
+            supabase_client.table("loans").select("*").eq(
+                "user_id", current_user.id
+            ).order("created_at", desc=True).limit(1)
+        )
+
+        if not isinstance(profile_response, Exception):
             if profile_response.data and profile_response.data[0].get("full_name"):
                 user_name = profile_response.data[0]["full_name"]
-        except:
-            pass  # Use the name from auth metadata if profiles table doesn't exist
 
-        # Get the user's latest loan application
+        # The user's latest loan application
         loan_details = {"status": "No active application"}
-        
-        try:
-            loan_response = supabase_client.table("loans").select("*").eq(
-                "user_id", current_user.id
-            ).order("created_at", desc=True).limit(1).execute()
-
-            if loan_response.data:
-                loan = loan_response.data[0]
-                loan_details = {
-                    "status": loan.get("status", "PENDING"),
-                    "amount": loan.get("amount", 0),
-                    "emi": loan.get("emi", 0),
-                    "risk_score": loan.get("risk_score", 0),
-                    "tenure_months": loan.get("tenure_months", 0),
-                    "ai_explanation": loan.get("ai_explanation", "")
-                }
-        except Exception as e:
-            # If loans table query fails, continue with default context
-            pass
+        if not isinstance(loan_response, Exception) and loan_response.data:
+            loan = loan_response.data[0]
+            loan_details = {
+                "status": loan.get("status", "PENDING"),
+                "amount": loan.get("amount", 0),
+                "emi": loan.get("emi", 0),
+                "risk_score": loan.get("risk_score", 0),
+                "tenure_months": loan.get("tenure_months", 0),
+                "ai_explanation": loan.get("ai_explanation", "")
+            }
 
         # Generate AI response
         result = await generate_bank_chat_response(
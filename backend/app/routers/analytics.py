@@ -6,7 +6,8 @@ Provides spending breakdown and AI-powered financial advice.
 from fastapi import APIRouter, HTTPException, Depends
 from app.config import supabase_client
 from app.utils.security import get_current_user, CurrentUser
-from app.services import llm
+from app.utils import db
+from app.services import aggregation, llm, rollups
 
 router = APIRouter(
     prefix="/analytics",
@@ -17,35 +18,31 @@ router = APIRouter(
 async def get_spending_analytics(current_user: CurrentUser = Depends(get_current_user)):
     """
     Get spending breakdown by category and AI financial advice.
+    
+    Totals come from the per-user spending rollup maintained as
+    transactions are saved.
     """
     try:
-        # 1. Fetch transactions for the current user
-        response = supabase_client.table("transactions").select("*").eq("user_id", current_user.id).execute()
-        txns = response.data or []
-        
-        if not txns:
+        # 1. Read the precomputed rollup, aggregating the transactions
+        # column-wise only when the rollup table is unavailable
+        rollup = await db.run(rollups.get_spending_rollup, current_user.id)
+        if rollup is None:
+            response = await db.execute(supabase_client.table("transactions").select(
+                "amount, category, description, transaction_date, transaction_type"
+            ).eq("user_id", current_user.id))
+            spending = aggregation.aggregate_spending(response.data or [])
+            total_spent, category_totals = spending["total_spent"], spending["category_totals"]
+        else:
+            total_spent, category_totals = rollups.summarize_spending(rollup)
+
+        if not category_totals:
             return {
                 "total_spent": 0,
                 "breakdown": {},
                 "ai_advisor_feedback": "No transaction data available. Upload a bank statement to get insights!"
             }
 
-        # 2. Aggregate Data
-        category_totals = {}
-        total_spent = 0
-        
-        for t in txns:
-            # Check for 'Debit' or negative amounts if type not specified
-            t_type = t.get('type') or t.get('transaction_type')
-            amount = float(t.get('amount', 0))
-            
-            if t_type == 'Debit' or (t_type is None and amount < 0):
-                cat = t.get('category', 'Uncategorized') or 'Uncategorized'
-                abs_amt = abs(amount)
-                category_totals[cat] = category_totals.get(cat, 0) + abs_amt
-                total_spent += abs_amt
-        
-        # 3. Get AI Advice
+        # 2. Get AI Advice
         summary = f"Total Spent: ${round(total_spent, 2)}. Breakdown: {category_totals}"
         advice = await llm.generate_financial_advice(summary)
 
@@ -13,7 +13,8 @@ from slowapi.util import get_remote_address
 
 from app.config import supabase_client
 from app.schemas import UserSignup, UserLogin
-from app.utils.security import get_current_user, CurrentUser
+from app.utils.security import get_current_user, CurrentUser, get_user_role
+from app.utils import db
 
 # Rate limiter for auth endpoints
 limiter = Limiter(key_func=get_remote_address)
@@ -56,7 +57,7 @@ async def signup(request: Request, user: UserSignup) -> AuthResponse:
 
     try:
         # Create user in Supabase Auth
-        auth_response = supabase_client.auth.sign_up({
+        auth_response = await db.run(supabase_client.auth.sign_up, {
             "email": user.email,
             "password": user.password,
             "options": {
@@ -141,7 +142,7 @@ async def login(request: Request, user: UserLogin) -> AuthResponse:
         )
 
     try:
-        auth_response = supabase_client.auth.sign_in_with_password({
+        auth_response = await db.run(supabase_client.auth.sign_in_with_password, {
             "email": user.email,
             "password": user.password
         })
@@ -157,11 +158,8 @@ async def login(request: Request, user: UserLogin) -> AuthResponse:
         # Fetch role from profiles table
         user_role = "user"
         try:
-            profile_response = supabase_client.table("profiles").select("role").eq(
-                "id", auth_response.user.id
-            ).execute()
-            if profile_response.data and len(profile_response.data) > 0:
-                user_role = profile_response.data[0].get("role", "user")
+            # Also primes the role cache for the requests that follow
+            user_role = await db.run(get_user_role, auth_response.user.id) or "user"
         except Exception:
             # Default to 'user' if profile lookup fails
             pass
@@ -222,7 +220,7 @@ async def logout(current_user: CurrentUser = Depends(get_current_user)):
         )
 
     try:
-        supabase_client.auth.sign_out()
+        await db.run(supabase_client.auth.sign_out)
         return {"message": "Logged out successfully"}
     except Exception as e:
         raise HTTPException(
@@ -249,7 +247,7 @@ async def refresh_token(refresh_token: str):
         )
 
     try:
-        auth_response = supabase_client.auth.refresh_session(refresh_token)
+        auth_response = await db.run(supabase_client.auth.refresh_session, refresh_token)
         
         if not auth_response.session:
             raise HTTPException(
@@ -4,11 +4,15 @@ Handles user support tickets and admin responses.
 """
 
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List
-from app.config import supabase_client
-from app.schemas import GrievanceCreate, GrievanceResponse, GrievanceReply
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from typing import List, Optional
+from app.config import supabase_client, LIST_DEFAULT_PAGE_SIZE, LIST_MAX_PAGE_SIZE
+from app.schemas import GrievanceCreate, GrievanceResponse, GrievanceListItem, GrievancePage, GrievanceReply
 from app.utils.security import get_current_user, CurrentUser
+from app.utils import db
+from app.utils.pagination import (
+    GRIEVANCE_FIELDS, select_fields, page_limit, select_page, paginate, page_total, build_page
+)
 
 router = APIRouter(
     prefix="/grievances",
@@ -45,7 +49,7 @@ async def submit_grievance(
         }
         
         # Insert into database
-        response = supabase_client.table("grievances").insert(grievance_data).execute()
+        response = await db.execute(supabase_client.table("grievances").insert(grievance_data))
         
         if not response.data:
             raise HTTPException(
@@ -92,9 +96,9 @@ async def get_my_grievances(
         )
     
     try:
-        response = supabase_client.table("grievances").select("*").eq(
+        response = await db.execute(supabase_client.table("grievances").select("*").eq(
             "user_id", current_user.id
-        ).order("created_at", desc=True).execute()
+        ).order("created_at", desc=True))
         
         grievances = []
         for record in response.data:
@@ -121,13 +125,24 @@ async def get_my_grievances(
 
 # ============ Admin Endpoints ============
 
-@router.get("/admin/all", response_model=List[GrievanceResponse])
+@router.get("/admin/all", response_model=GrievancePage, response_model_exclude_unset=True)
 async def get_all_grievances(
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    page_size: Optional[int] = Query(
+        None, ge=1, le=LIST_MAX_PAGE_SIZE,
+        description=f"Rows per page (default {LIST_DEFAULT_PAGE_SIZE} with a cursor; omit both for every row)"
+    ),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    include_total: bool = Query(False, description="Count all matching rows for total (paged requests only)"),
     current_user: CurrentUser = Depends(get_current_user)
 ):
     """
-    Get all grievances from all users.
+    Get grievances from all users, newest first.
     
+    Paginated by cursor when cursor or page_size is given; pass next_cursor
+    back to fetch the following page. total is the number of grievances;
+    paged requests get it only with include_total=true (otherwise null).
+    With ?fields= each grievance carries only the requested columns.
     Requires admin role.
     """
     # Verify admin role
@@ -143,27 +158,31 @@ async def get_all_grievances(
             detail="Database service unavailable"
         )
     
+    columns = select_fields(fields, GRIEVANCE_FIELDS)
+    
     try:
-        response = supabase_client.table("grievances").select("*").order(
-            "created_at", desc=True
-        ).execute()
+        limit = page_limit(cursor, page_size)
+        query = select_page(supabase_client.table("grievances"), columns, limit, include_total)
+        result = await db.execute(paginate(query, cursor, limit))
+        records, next_cursor = build_page(result.data, limit)
         
         grievances = []
-        for record in response.data:
-            grievances.append(GrievanceResponse(
-                id=str(record.get("id")),
-                user_id=record.get("user_id"),
-                grievance_type=record.get("grievance_type"),
-                subject=record.get("subject"),
-                description=record.get("description"),
-                status=record.get("status"),
-                admin_response=record.get("admin_response"),
-                created_at=str(record.get("created_at")),
-                resolved_at=record.get("resolved_at")
-            ))
+        for record in records:
+            # Only the selected columns are set, so projections stay partial
+            item = {key: record.get(key) for key in GRIEVANCE_FIELDS if key in record}
+            for key in ("id", "created_at"):
+                if item.get(key) is not None:
+                    item[key] = str(item[key])
+            grievances.append(GrievanceListItem(**item))
         
-        return grievances
+        return GrievancePage(
+            grievances=grievances,
+            total=page_total(result, records, limit),
+            next_cursor=next_cursor
+        )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -197,9 +216,9 @@ async def reply_to_grievance(
     
     try:
         # Check if grievance exists
-        check = supabase_client.table("grievances").select("id").eq(
+        check = await db.execute(supabase_client.table("grievances").select("id").eq(
             "id", grievance_id
-        ).execute()
+        ))
         
         if not check.data:
             raise HTTPException(
@@ -218,9 +237,9 @@ async def reply_to_grievance(
             update_data["resolved_at"] = datetime.utcnow().isoformat()
         
         # Update grievance
-        response = supabase_client.table("grievances").update(update_data).eq(
+        response = await db.execute(supabase_client.table("grievances").update(update_data).eq(
             "id", grievance_id
-        ).execute()
+        ))
         
         if not response.data:
             raise HTTPException(
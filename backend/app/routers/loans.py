@@ -4,15 +4,28 @@ Handles loan applications and risk assessment with authentication.
 With rate limiting for security.
 """
 
-from fastapi import APIRouter, HTTPException, status, Depends, Request
+import asyncio
+import io
+import math
+from typing import Any, Dict, Iterator, Optional
+from fastapi import APIRouter, HTTPException, status, Depends, Request, Query
+from fastapi.responses import StreamingResponse
 from slowapi import Limiter
 from slowapi.util import get_remote_address
-from app.config import supabase_client
+from app.config import (
+    supabase_client,
+    SCHEDULE_PDF_CACHE_SIZE,
+    DEFER_AI_EXPLANATION,
+    LIST_DEFAULT_PAGE_SIZE,
+    LIST_MAX_PAGE_SIZE,
+)
 from app.schemas import LoanCreate, LoanResponse, LoanApplication, RiskResult
-from app.services.risk_engine import calculate_risk_score
-from app.services import audit
-from app.services.llm import generate_rejection_reason, generate_approval_message
+from app.services.risk_engine import calculate_risk_score, generate_amortization_schedule, DEFAULT_ANNUAL_RATE
+from app.services import audit, dashboard_cache, explanations
+from app.utils.cache import TTLCache
+from app.utils.pagination import LOAN_FIELDS, select_fields, page_limit, select_page, paginate, page_total, build_page
 from app.utils.security import get_current_user, CurrentUser, require_admin
+from app.utils import db
 
 # Rate limiter for loan endpoints
 limiter = Limiter(key_func=get_remote_address)
@@ -22,19 +35,30 @@ router = APIRouter(
     tags=["Loans"]
 )
 
+# Rendered schedule PDFs keyed by (loan_id, amount, rate, tenure, borrower name)
+_schedule_pdf_cache = TTLCache(maxsize=SCHEDULE_PDF_CACHE_SIZE)
+
+# Size of each chunk when streaming a PDF to the client
+PDF_STREAM_CHUNK_SIZE = 64 * 1024
+
 
 @router.post("/apply", response_model=LoanResponse)
 @limiter.limit("3/minute")  # SECURITY: Prevent spam applications
 async def apply_for_loan(
     request: Request,
     application: LoanCreate,
+    defer_explanation: Optional[bool] = Query(
+        None, description="Return before the AI explanation is generated (defaults to DEFER_AI_EXPLANATION)"
+    ),
     current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Submit a loan application and get instant risk assessment.
     
     Requires authentication. Calculates risk, generates AI explanation,
-    saves to database, and logs the action.
+    saves to database, and logs the action. In deferred mode the loan is
+    saved straight away and the explanation is generated in the background;
+    fetch it later from GET /loans/{id}/explanation.
     """
     if not supabase_client:
         raise HTTPException(
@@ -44,9 +68,9 @@ async def apply_for_loan(
 
     try:
         # Fetch existing approved loans for this user to calculate total EMI burden
-        existing_loans_response = supabase_client.table("loans").select("emi, status").eq(
+        existing_loans_response = await db.execute(supabase_client.table("loans").select("emi, status").eq(
             "user_id", current_user.id
-        ).eq("status", "APPROVED").execute()
+        ).eq("status", "APPROVED"))
         
         existing_emi = 0.0
         if existing_loans_response.data:
@@ -61,14 +85,12 @@ async def apply_for_loan(
             existing_emi=existing_emi
         )
 
-        # Generate AI explanation based on status
-        if risk_result["status"] == "REJECTED":
-            ai_explanation = await generate_rejection_reason(risk_result["reasons"])
-        else:
-            ai_explanation = await generate_approval_message(
-                amount=application.amount,
-                emi=risk_result["emi"],
-                tenure_months=application.tenure_months
+        # Generate AI explanation based on status (or leave it for the background task)
+        defer = DEFER_AI_EXPLANATION if defer_explanation is None else defer_explanation
+        ai_explanation = None
+        if not defer:
+            ai_explanation = await explanations.generate_decision_message(
+                risk_result, application.amount, application.tenure_months
             )
 
         # Prepare loan data for database
@@ -85,7 +107,7 @@ async def apply_for_loan(
         }
 
         # Store loan application in Supabase
-        response = supabase_client.table("loans").insert(loan_data).execute()
+        response = await db.execute(supabase_client.table("loans").insert(loan_data))
 
         if not response.data:
             raise HTTPException(
@@ -94,6 +116,12 @@ async def apply_for_loan(
             )
 
         loan_record = response.data[0]
+        dashboard_cache.invalidate_dashboard(current_user.id)
+
+        if defer:
+            explanations.schedule_explanation(
+                loan_record.get("id"), risk_result, application.amount, application.tenure_months
+            )
 
         # Log the action (non-blocking, won't crash on failure)
         await audit.log_action(
@@ -117,8 +145,9 @@ async def apply_for_loan(
             risk_score=risk_result["score"],
             max_approved_amount=max_approved,
             emi=risk_result["emi"],
-            ai_explanation=ai_explanation,
-            risk_reason=", ".join(risk_result["reasons"])
+            ai_explanation=ai_explanation or explanations.EXPLANATION_PENDING_MESSAGE,
+            risk_reason=", ".join(risk_result["reasons"]),
+            explanation_pending=defer
         )
 
     except HTTPException:
@@ -131,9 +160,22 @@ async def apply_for_loan(
 
 
 @router.get("/my-loans")
-async def get_my_loans(current_user: CurrentUser = Depends(get_current_user)):
+async def get_my_loans(
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    page_size: Optional[int] = Query(
+        None, ge=1, le=LIST_MAX_PAGE_SIZE,
+        description=f"Rows per page (default {LIST_DEFAULT_PAGE_SIZE} with a cursor; omit both for every row)"
+    ),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    include_total: bool = Query(False, description="Count all matching rows for total (paged requests only)"),
+    current_user: CurrentUser = Depends(get_current_user)
+):
     """
-    Get all loan applications for the authenticated user.
+    Get loan applications for the authenticated user, newest first.
+    
+    Paginated by cursor when cursor or page_size is given; pass next_cursor
+    back to fetch the following page. total is the number of matching loans;
+    paged requests get it only with include_total=true (otherwise null).
     """
     if not supabase_client:
         raise HTTPException(
@@ -141,12 +183,17 @@ async def get_my_loans(current_user: CurrentUser = Depends(get_current_user)):
             detail="Supabase client not initialized"
         )
 
+    columns = select_fields(fields, LOAN_FIELDS)
+
     try:
-        response = supabase_client.table("loans").select("*").eq(
-            "user_id", current_user.id
-        ).order("created_at", desc=True).execute()
+        limit = page_limit(cursor, page_size)
+        query = select_page(supabase_client.table("loans"), columns, limit, include_total).eq("user_id", current_user.id)
+        response = await db.execute(paginate(query, cursor, limit))
+        loans, next_cursor = build_page(response.data, limit)
 
-        return {"loans": response.data, "total": len(response.data)}
+        return {"loans": loans, "total": page_total(response, loans, limit), "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -156,11 +203,21 @@ async def get_my_loans(current_user: CurrentUser = Depends(get_current_user)):
 
 @router.get("/")
 async def get_all_loans(
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    page_size: Optional[int] = Query(
+        None, ge=1, le=LIST_MAX_PAGE_SIZE,
+        description=f"Rows per page (default {LIST_DEFAULT_PAGE_SIZE} with a cursor; omit both for every row)"
+    ),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    include_total: bool = Query(False, description="Count all matching rows for total (paged requests only)"),
     current_user: CurrentUser = Depends(require_admin)  # SECURITY: Admin only
 ):
     """
-    Get all loan applications (admin view).
+    Get loan applications (admin view), newest first.
     
+    Paginated by cursor when cursor or page_size is given; pass next_cursor
+    back to fetch the following page. total is the number of loans;
+    paged requests get it only with include_total=true (otherwise null).
     SECURITY: Requires admin role.
     """
     if not supabase_client:
@@ -169,9 +226,16 @@ async def get_all_loans(
             detail="Supabase client not initialized"
         )
 
+    columns = select_fields(fields, LOAN_FIELDS)
+
     try:
-        response = supabase_client.table("loans").select("*").execute()
-        return {"loans": response.data}
+        limit = page_limit(cursor, page_size)
+        query = select_page(supabase_client.table("loans"), columns, limit, include_total)
+        response = await db.execute(paginate(query, cursor, limit))
+        loans, next_cursor = build_page(response.data, limit)
+        return {"loans": loans, "total": page_total(response, loans, limit), "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -197,7 +261,7 @@ async def get_loan_by_id(
         )
 
     try:
-        response = supabase_client.table("loans").select("*").eq("id", loan_id).execute()
+        response = await db.execute(supabase_client.table("loans").select("*").eq("id", loan_id))
 
         if not response.data:
             raise HTTPException(
@@ -242,7 +306,7 @@ async def get_loan_explanation(
 
     try:
         # Fetch the loan
-        response = supabase_client.table("loans").select("*").eq("id", loan_id).execute()
+        response = await db.execute(supabase_client.table("loans").select("*").eq("id", loan_id))
         
         if not response.data:
             raise HTTPException(
@@ -263,6 +327,11 @@ async def get_loan_explanation(
         if loan.get("ai_explanation"):
             return {"explanation": loan.get("ai_explanation")}
         
+        # A deferred generation may still be running for this loan
+        explanation = await explanations.wait_for_explanation(loan_id)
+        if explanation:
+            return {"explanation": explanation}
+        
         # Generate new explanation using LLM
         from app.services.llm import generate_risk_explanation
         
@@ -274,9 +343,9 @@ async def get_loan_explanation(
         
         # Optionally save the explanation back to the loan
         try:
-            supabase_client.table("loans").update({
+            await db.execute(supabase_client.table("loans").update({
                 "ai_explanation": explanation
-            }).eq("id", loan_id).execute()
+            }).eq("id", loan_id))
         except:
             pass  # Non-critical if save fails
         
@@ -290,3 +359,178 @@ async def get_loan_explanation(
             detail=f"Error generating explanation: {str(e)}"
         )
 
+
+# ============ Amortization Schedule ============
+
+def _render_schedule_pdf(schedule_data: Dict[str, Any], user_name: str) -> bytes:
+    """Render an amortization schedule as a PDF document."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, title="Loan Amortization Schedule")
+    styles = getSampleStyleSheet()
+
+    summary = [
+        ["Borrower", user_name],
+        ["Loan ID", str(schedule_data.get("loan_id", ""))],
+        ["Loan Amount", f"Rs. {schedule_data['loan_amount']:,.2f}"],
+        ["Interest Rate", f"{schedule_data['interest_rate']}% p.a."],
+        ["Tenure", f"{schedule_data['tenure_months']} months"],
+        ["Monthly EMI", f"Rs. {schedule_data['emi']:,.2f}"],
+        ["Total Payment", f"Rs. {schedule_data['total_payment']:,.2f}"],
+        ["Total Interest", f"Rs. {schedule_data['total_interest']:,.2f}"],
+    ]
+
+    rows = [["Month", "EMI", "Principal", "Interest", "Balance"]]
+    for entry in schedule_data["schedule"]:
+        rows.append([
+            str(entry["month"]),
+            f"{entry['emi']:,.2f}",
+            f"{entry['principal']:,.2f}",
+            f"{entry['interest']:,.2f}",
+            f"{entry['balance']:,.2f}",
+        ])
+
+    schedule_table = Table(rows, repeatRows=1)
+    schedule_table.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#1e3a8a")),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("ALIGN", (1, 0), (-1, -1), "RIGHT"),
+        ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+        ("FONTSIZE", (0, 0), (-1, -1), 8),
+    ]))
+
+    doc.build([
+        Paragraph("RISKOFF - Loan Amortization Schedule", styles["Title"]),
+        Table(summary, hAlign="LEFT"),
+        Spacer(1, 12),
+        schedule_table,
+    ])
+    return buffer.getvalue()
+
+
+def _iter_pdf_chunks(pdf_bytes: bytes) -> Iterator[bytes]:
+    """Yield the PDF in fixed-size chunks for streaming."""
+    view = memoryview(pdf_bytes)
+    for start in range(0, len(view), PDF_STREAM_CHUNK_SIZE):
+        yield bytes(view[start:start + PDF_STREAM_CHUNK_SIZE])
+
+
+async def generate_schedule_pdf(schedule_data: Dict[str, Any], user_name: str) -> StreamingResponse:
+    """
+    Build a streamed PDF response for an amortization schedule.
+    
+    Rendered PDFs are cached by (loan_id, amount, rate, tenure, borrower
+    name) so repeated downloads of long schedules skip the expensive
+    rendering step. Rendering runs on a worker thread.
+    """
+    cache_key = (
+        str(schedule_data.get("loan_id")),
+        float(schedule_data["loan_amount"]),
+        float(schedule_data["interest_rate"]),
+        int(schedule_data["tenure_months"]),
+        user_name,
+    )
+
+    pdf_bytes = _schedule_pdf_cache.get(cache_key)
+    if pdf_bytes is None:
+        pdf_bytes = await asyncio.to_thread(_render_schedule_pdf, schedule_data, user_name)
+        _schedule_pdf_cache.set(cache_key, pdf_bytes)
+
+    filename = f"loan_{schedule_data.get('loan_id', 'schedule')}_schedule.pdf"
+    return StreamingResponse(
+        _iter_pdf_chunks(pdf_bytes),
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Content-Length": str(len(pdf_bytes))
+        }
+    )
+
+
+@router.get("/{loan_id}/schedule")
+async def get_loan_schedule(
+    loan_id: str,
+    format: str = Query("json", description="Response format: json or pdf"),
+    page: int = Query(1, ge=1, description="Page number (JSON only)"),
+    page_size: int = Query(12, ge=1, le=360, description="Months per page (JSON only)"),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    Get the month-by-month amortization schedule for an approved loan.
+    
+    Returns paginated JSON by default, or a downloadable PDF with format=pdf.
+    Users can only access their own loans. Admins can access any loan.
+    """
+    if not supabase_client:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Supabase client not initialized"
+        )
+
+    try:
+        response = await db.execute(supabase_client.table("loans").select("*").eq("id", loan_id))
+
+        if not response.data:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Loan not found"
+            )
+
+        loan = response.data[0]
+
+        # SECURITY: Verify ownership - users can only access their own loans
+        if loan.get("user_id") != current_user.id and current_user.role != "admin":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You don't have permission to access this loan"
+            )
+
+        if loan.get("status") != "APPROVED":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Repayment schedule is only available for approved loans"
+            )
+
+        # A stored 0% rate is a real interest-free loan, not a missing rate
+        interest_rate = loan.get("interest_rate")
+        schedule_data = generate_amortization_schedule(
+            principal=float(loan.get("amount") or 0),
+            tenure_months=int(loan.get("tenure_months") or 0),
+            annual_rate=DEFAULT_ANNUAL_RATE if interest_rate is None else float(interest_rate)
+        )
+        schedule_data["loan_id"] = loan.get("id", loan_id)
+
+        if format.lower() == "pdf":
+            user_name = current_user.full_name or "Valued Customer"
+            if loan.get("user_id") != current_user.id:
+                try:
+                    profile_response = await db.execute(supabase_client.table("profiles").select("full_name").eq(
+                        "id", loan.get("user_id")
+                    ).limit(1))
+                    if profile_response.data and profile_response.data[0].get("full_name"):
+                        user_name = profile_response.data[0]["full_name"]
+                except:
+                    pass  # Fall back to the generic name
+            return await generate_schedule_pdf(schedule_data, user_name)
+
+        # Default: paginated JSON
+        total_months = len(schedule_data["schedule"])
+        start = (page - 1) * page_size
+        schedule_data["schedule"] = schedule_data["schedule"][start:start + page_size]
+        schedule_data["page"] = page
+        schedule_data["page_size"] = page_size
+        schedule_data["total_months"] = total_months
+        schedule_data["total_pages"] = math.ceil(total_months / page_size) if total_months else 0
+        return schedule_data
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
@@ -3,10 +3,11 @@ Simulator router for RISKOFF API.
 Provides 'What If' analysis for loan applicants without saving data.
 """
 
+from typing import Annotated, List, Optional
 from fastapi import APIRouter, HTTPException, status
-from pydantic import BaseModel
-from app.services.risk_engine import calculate_risk_score
-from app.schemas import RiskResult
+from pydantic import BaseModel, Field
+from app.services.risk_engine import calculate_risk_score, calculate_risk_scores_batch, MAX_TENURE_MONTHS
+from app.schemas import RiskResult, BatchRiskResult
 
 router = APIRouter(
     prefix="/simulator",
@@ -19,6 +20,14 @@ class SimulationRequest(BaseModel):
     income: float
     expenses: float
 
+class BatchSimulationRequest(BaseModel):
+    """Columnar batch of applications: the i-th entry of each list is one application."""
+    amount: List[float] = Field(..., min_length=1)
+    tenure_months: List[Annotated[int, Field(ge=1, le=MAX_TENURE_MONTHS)]] = Field(..., min_length=1)
+    income: List[float] = Field(..., min_length=1)
+    expenses: List[float] = Field(..., min_length=1)
+    existing_emi: Optional[List[float]] = None
+
 @router.post("/calculate", response_model=RiskResult)
 async def simulate_loan_risk(request: SimulationRequest):
     """
@@ -45,3 +54,51 @@ async def simulate_loan_risk(request: SimulationRequest):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Simulation failed: {str(e)}"
         )
+
+
+@router.post("/calculate-batch", response_model=BatchRiskResult)
+async def simulate_loan_risk_batch(request: BatchSimulationRequest):
+    """
+    Score a whole portfolio of applications in a single request.
+    Inputs are columnar arrays; decisions are identical to /simulator/calculate
+    for every row, but reasons are not included.
+    """
+    count = len(request.amount)
+    columns = [request.tenure_months, request.income, request.expenses]
+    if request.existing_emi is not None:
+        columns.append(request.existing_emi)
+    if any(len(column) != count for column in columns):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="All input arrays must have the same length."
+        )
+
+    if (
+        any(amount <= 0 for amount in request.amount)
+        or any(income < 0 for income in request.income)
+        or any(expense < 0 for expense in request.expenses)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Amount, income, and expenses must be non-negative."
+        )
+
+    try:
+        result = calculate_risk_scores_batch(
+            amounts=request.amount,
+            tenure_months=request.tenure_months,
+            incomes=request.income,
+            expenses=request.expenses,
+            existing_emis=request.existing_emi
+        )
+        return {
+            "count": count,
+            "scores": result["score"].tolist(),
+            "statuses": result["status"].tolist(),
+            "emis": result["emi"].tolist()
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Batch simulation failed: {str(e)}"
+        )
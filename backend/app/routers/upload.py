@@ -4,14 +4,19 @@ Handles receipt image and bank statement uploads with database persistence.
 With rate limiting for security.
 """
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, status, Depends, Request
+import asyncio
+from fastapi import APIRouter, HTTPException, UploadFile, File, status, Depends, Request, Query
+from fastapi.responses import JSONResponse
 from typing import Optional
 from slowapi import Limiter
 from slowapi.util import get_remote_address
-from app.config import supabase_client
+from app.config import supabase_client, STATEMENT_JOB_MODE
 from app.schemas import ReceiptData
-from app.services.parser import parse_bank_statement_csv, analyze_receipt_image, transcribe_audio
+from app.services.parser import analyze_receipt_image, transcribe_audio, verify_identity_in_file
+from app.services.ingestion import ingest_statement
+from app.services import dashboard_cache, rollups, statement_jobs
 from app.utils.security import get_current_user, CurrentUser, get_current_user_optional
+from app.utils import db
 
 # Rate limiter for upload endpoints
 limiter = Limiter(key_func=get_remote_address)
@@ -78,6 +83,9 @@ async def upload_receipt(
 @router.post("/bank-statement")
 async def upload_bank_statement(
     file: UploadFile = File(...),
+    background: Optional[bool] = Query(
+        None, description="Process in a background job and return immediately (defaults to STATEMENT_JOB_MODE)"
+    ),
     current_user: CurrentUser = Depends(get_current_user)
 ):
     """
@@ -85,6 +93,10 @@ async def upload_bank_statement(
     
     Requires authentication. Transactions are linked to the user's account.
     Includes identity verification - the file must contain the user's name.
+    Rows already saved from an earlier upload are skipped and counted in
+    transactions_duplicate. In background mode the file is stored and queued, a 202 with the
+    statement_id is returned, and progress is polled from
+    GET /upload/bank-statement/{statement_id}.
     """
     if not supabase_client:
         raise HTTPException(
@@ -100,11 +112,14 @@ async def upload_bank_statement(
         )
 
     try:
-        # Read file content
-        file_content = await file.read()
+        # Stream from the spooled upload instead of reading it into memory
+        source = file.file
+        source.seek(0, 2)
+        file_size = source.tell()
+        source.seek(0)
 
         # Validate file is not empty
-        if len(file_content) == 0:
+        if file_size == 0:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="The uploaded file is empty"
@@ -116,14 +131,26 @@ async def upload_bank_statement(
         # Try to get name from profiles table if not in token
         if not user_full_name and supabase_client:
             try:
-                profile_response = supabase_client.table("profiles").select("full_name").eq(
+                profile_response = await db.execute(supabase_client.table("profiles").select("full_name").eq(
                     "id", current_user.id
-                ).limit(1).execute()
+                ).limit(1))
                 if profile_response.data and profile_response.data[0].get("full_name"):
                     user_full_name = profile_response.data[0]["full_name"]
             except:
                 pass  # Continue without profile lookup
 
+        # Check identity up front so a mismatch is reported before anything is saved
+        if user_full_name:
+            try:
+                verify_identity_in_file(source.read(2048), user_full_name)
+            except ValueError:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="Identity Verification Failed: The uploaded file does not match your account."
+                )
+            finally:
+                source.seek(0)
+
         # Step 1: Save bank statement record
         statement_record = {
             "user_id": current_user.id,
@@ -133,15 +160,31 @@ async def upload_bank_statement(
         }
 
         try:
-            statement_response = supabase_client.table("bank_statements").insert(statement_record).execute()
+            statement_response = await db.execute(supabase_client.table("bank_statements").insert(statement_record))
             statement_id = statement_response.data[0]["id"] if statement_response.data else None
         except Exception as e:
             # If bank_statements table doesn't exist, continue without it
             statement_id = None
 
-        # Step 2: Parse the bank statement CSV with identity verification
+        # Background mode needs a statement record to report progress on
+        run_in_background = STATEMENT_JOB_MODE if background is None else background
+        if run_in_background and statement_id:
+            path = await asyncio.to_thread(statement_jobs.store_upload, source, current_user.id, statement_id)
+            statement_jobs.submit_statement_job(statement_id, path, current_user.id, user_full_name)
+            return JSONResponse(
+                status_code=status.HTTP_202_ACCEPTED,
+                content={
+                    "status": "processing",
+                    "message": "Bank statement queued for processing",
+                    "statement_id": statement_id,
+                    "status_url": f"/upload/bank-statement/{statement_id}"
+                }
+            )
+
+        # Steps 2-5: Parse, categorize, drop already-saved rows and save in
+        # batches, then mark the statement completed
         try:
-            transactions = parse_bank_statement_csv(file_content, user_full_name)
+            result = await ingest_statement(source, current_user.id, user_full_name, statement_id)
         except ValueError as e:
             error_message = str(e)
             if "Identity Mismatch" in error_message:
@@ -151,54 +194,23 @@ async def upload_bank_statement(
                 )
             raise
 
-        if not transactions:
-            raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail="No transactions found in the CSV file"
-            )
-
-        # Step 3: Prepare transactions for database insert
-        transactions_to_insert = []
-        for txn in transactions:
-            db_transaction = {
-                "user_id": current_user.id,
-                "description": txn.get("description"),
-                "amount": txn.get("amount"),
-                "category": txn.get("category", "Misc"),
-                "transaction_date": txn.get("date"),
-                "transaction_type": txn.get("type", "Debit")
-            }
-            # Only include if we have at least description or amount
-            if db_transaction["description"] or db_transaction["amount"]:
-                transactions_to_insert.append(db_transaction)
-
-        # Step 4: Bulk insert transactions
-        inserted_count = 0
-        if transactions_to_insert:
-            try:
-                insert_response = supabase_client.table("transactions").insert(transactions_to_insert).execute()
-                inserted_count = len(insert_response.data) if insert_response.data else 0
-            except Exception as e:
-                # Log error but don't fail - return parsed data
-                print(f"⚠️ Database insert error: {e}")
-
-        # Step 5: Update statement status to completed
-        if statement_id:
-            try:
-                supabase_client.table("bank_statements").update({
-                    "status": "completed",
-                    "transactions_count": inserted_count
-                }).eq("id", statement_id).execute()
-            except:
-                pass
-
+        if result.get("error"):
+            # Parsing stopped part-way after earlier rows were saved
+            message = f"Bank statement partly processed: {result['error']}"
+        else:
+            message = "Bank statement processed successfully"
         return {
-            "status": "success",
-            "message": "Bank statement processed successfully",
-            "transactions_parsed": len(transactions),
-            "transactions_saved": inserted_count,
+            "status": "partial" if result["transactions_failed"] or result.get("error") else "success",
+            "message": message,
+            "error": result.get("error"),
+            "transactions_parsed": result["transactions_parsed"],
+            "transactions_saved": result["transactions_saved"],
+            "transactions_failed": result["transactions_failed"],
+            "transactions_new": result["transactions_new"],
+            "transactions_duplicate": result["transactions_duplicate"],
+            "failed_batches": result["failed_batches"],
             "statement_id": statement_id,
-            "transactions": transactions[:10]  # Return first 10 for preview
+            "transactions": result["preview"]  # Return first 10 for preview
         }
 
     except HTTPException:
@@ -215,6 +227,73 @@ async def upload_bank_statement(
         )
 
 
+@router.get("/bank-statement/{statement_id}")
+async def get_bank_statement_status(
+    statement_id: str,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    Get processing status for an uploaded bank statement.
+    
+    Status moves through processing -> completed / failed. Requires
+    authentication; users can only see their own statements.
+    """
+    if not supabase_client:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database service unavailable"
+        )
+
+    try:
+        response = await db.execute(supabase_client.table("bank_statements").select("*").eq(
+            "id", statement_id
+        ).limit(1))
+
+        if not response.data:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Bank statement not found"
+            )
+
+        statement = response.data[0]
+        if statement.get("user_id") != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You don't have permission to access this statement"
+            )
+
+        result = {
+            "statement_id": statement.get("id"),
+            "file_name": statement.get("file_name"),
+            "status": statement.get("status"),
+            "transactions_saved": statement.get("transactions_count") or 0,
+            "error": statement.get("error_message"),
+            "created_at": statement.get("created_at")
+        }
+
+        # Live counters when this worker is (or was recently) running the job
+        progress = statement_jobs.get_job_progress(statement_id)
+        if progress:
+            result["transactions_parsed"] = progress.get("transactions_parsed", 0)
+            if "transactions_failed" in progress:
+                result["transactions_failed"] = progress["transactions_failed"]
+            if "transactions_duplicate" in progress:
+                result["transactions_duplicate"] = progress["transactions_duplicate"]
+            if result["status"] == "processing":
+                result["status"] = progress.get("status", "processing")
+            result["error"] = result["error"] or progress.get("error")
+
+        return result
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
 @router.post("/receipt/save")
 async def save_receipt_transaction(
     merchant_name: str,
@@ -244,7 +323,7 @@ async def save_receipt_transaction(
             "transaction_type": "Debit"
         }
 
-        response = supabase_client.table("transactions").insert(transaction_data).execute()
+        response = await db.execute(supabase_client.table("transactions").insert(transaction_data))
 
         if not response.data:
             raise HTTPException(
@@ -252,6 +331,9 @@ async def save_receipt_transaction(
                 detail="Failed to save transaction"
             )
 
+        await db.run(rollups.record_spending, current_user.id, rollups.spending_deltas(response.data))
+        dashboard_cache.invalidate_dashboard(current_user.id)
+
         return {
             "status": "success",
             "message": "Receipt transaction saved successfully",
@@ -405,9 +487,9 @@ async def verify_kyc(
         # Try to get name from profiles table if not in token
         if not user_full_name:
             try:
-                profile_response = supabase_client.table("profiles").select("full_name").eq(
+                profile_response = await db.execute(supabase_client.table("profiles").select("full_name").eq(
                     "id", current_user.id
-                ).limit(1).execute()
+                ).limit(1))
                 if profile_response.data and profile_response.data[0].get("full_name"):
                     user_full_name = profile_response.data[0]["full_name"]
             except:
@@ -433,11 +515,11 @@ async def verify_kyc(
         verification_status = "pending"
         if name_matched:
             try:
-                supabase_client.table("profiles").update({
+                await db.execute(supabase_client.table("profiles").update({
                     "verified": True,
                     "kyc_document_type": extracted_data.get("document_type"),
                     "kyc_verified_at": "now()"
-                }).eq("id", current_user.id).execute()
+                }).eq("id", current_user.id))
                 verification_status = "verified"
             except Exception as e:
                 # If update fails (e.g., column doesn't exist), still return success
@@ -3,14 +3,17 @@ User router for RISKOFF API.
 Handles user profile and dashboard data.
 """
 
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Request, Response
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field, field_validator
 from typing import Optional, List
 from datetime import date
 import re
 
-from app.config import supabase_client
+from app.config import supabase_client, DASHBOARD_SERIES_MONTHS
+from app.services import customer_score, dashboard_cache, rollups
 from app.utils.security import get_current_user, CurrentUser
+from app.utils import db
 
 router = APIRouter(
     prefix="/user",
@@ -93,7 +96,7 @@ async def get_profile(current_user: CurrentUser = Depends(get_current_user)):
 
     try:
         # Get full profile from profiles table
-        response = supabase_client.table("profiles").select("*").eq("id", current_user.id).execute()
+        response = await db.execute(supabase_client.table("profiles").select("*").eq("id", current_user.id))
         
         if not response.data:
             return {"profile_completed": False}
@@ -134,7 +137,7 @@ async def update_profile(profile_update: ProfileUpdate, current_user: CurrentUse
                 detail="No data to update"
             )
         
-        response = supabase_client.table("profiles").update(update_data).eq("id", current_user.id).execute()
+        response = await db.execute(supabase_client.table("profiles").update(update_data).eq("id", current_user.id))
         
         if not response.data:
             raise HTTPException(
@@ -142,6 +145,8 @@ async def update_profile(profile_update: ProfileUpdate, current_user: CurrentUse
                 detail="Profile not found"
             )
         
+        dashboard_cache.invalidate_dashboard(current_user.id)
+        
         return {"message": "Profile updated successfully", "profile": response.data[0]}
         
     except HTTPException:
@@ -154,10 +159,21 @@ async def update_profile(profile_update: ProfileUpdate, current_user: CurrentUse
 
 
 @router.get("/dashboard")
-async def get_dashboard(current_user: CurrentUser = Depends(get_current_user)):
+async def get_dashboard(request: Request, current_user: CurrentUser = Depends(get_current_user)):
     """
     Get dashboard data for the current user.
     Financial data comes from the profiles table.
+    
+    Spending breakdown and the month-by-month income vs expense series cover
+    the last DASHBOARD_SERIES_MONTHS months of the user's spending rollup.
+    
+    Profile, loans and rollup are fetched concurrently. If one of them fails
+    or times out the rest is still returned, and its name is listed in
+    "unavailable".
+    
+    Complete dashboards are cached per user until their profile, loans or
+    transactions change. Responses carry an ETag; a request whose
+    If-None-Match still matches gets 304 Not Modified with no body.
     """
     if not supabase_client:
         raise HTTPException(
@@ -165,14 +181,62 @@ async def get_dashboard(current_user: CurrentUser = Depends(get_current_user)):
             detail="Database service unavailable"
         )
 
+    cached = dashboard_cache.get(current_user.id)
+    if cached:
+        body, etag = cached
+    else:
+        built_at = dashboard_cache.generation(current_user.id)
+        body = await _build_dashboard(current_user.id)
+        if body["unavailable"]:
+            # Never cache a partial dashboard
+            etag = dashboard_cache.compute_etag(body)
+        else:
+            # Skipped if the data changed while the dashboard was being built
+            etag = dashboard_cache.store(current_user.id, body, built_at)
+
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if dashboard_cache.etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return JSONResponse(content=body, headers=headers)
+
+
+async def _build_dashboard(user_id: str) -> dict:
+    """Compute the dashboard body for a user (see get_dashboard)."""
     try:
-        # Get full profile with financial data
-        profile_response = supabase_client.table("profiles").select("*").eq("id", current_user.id).execute()
-        profile = profile_response.data[0] if profile_response.data else {}
+        # Get full profile with financial data, user loans and monthly rollup concurrently
+        profile_response, loans_response, rollup_response = await db.gather(
+            supabase_client.table("profiles").select("*").eq("id", user_id),
+            supabase_client.table("loans").select("*").eq("user_id", user_id).order("created_at", desc=True),
+            # select("*"): total_income only exists once sql/spending_rollups.sql
+            # has been re-run; summarize_cashflow treats it as 0 when missing
+            supabase_client.table("spending_rollups").select("*").eq(
+                "user_id", user_id
+            ).gte("month", rollups.first_month(DASHBOARD_SERIES_MONTHS))
+        )
         
-        # Get user loans
-        loans_response = supabase_client.table("loans").select("*").eq("user_id", current_user.id).order("created_at", desc=True).execute()
-        loans = loans_response.data or []
+        # Serve what loaded; fail only when nothing did
+        responses = (profile_response, loans_response, rollup_response)
+        if all(isinstance(response, Exception) for response in responses):
+            raise profile_response
+        unavailable = []
+        if isinstance(profile_response, Exception):
+            print(f"⚠️ Dashboard profile query failed: {profile_response!r}")
+            unavailable.append("profile")
+            profile = {}
+        else:
+            profile = profile_response.data[0] if profile_response.data else {}
+        if isinstance(loans_response, Exception):
+            print(f"⚠️ Dashboard loans query failed: {loans_response!r}")
+            unavailable.append("loans")
+            loans = []
+        else:
+            loans = loans_response.data or []
+        if isinstance(rollup_response, Exception):
+            print(f"⚠️ Dashboard spending rollup query failed: {rollup_response!r}")
+            unavailable.append("transactions")
+            rollup = []
+        else:
+            rollup = rollup_response.data or []
         
         # Get financial data from profile
         annual_income = profile.get("annual_income", 0) or 0
@@ -181,7 +245,6 @@ async def get_dashboard(current_user: CurrentUser = Depends(get_current_user)):
         mutual_funds = profile.get("mutual_funds", 0) or 0
         stocks = profile.get("stocks", 0) or 0
         fixed_deposits = profile.get("fixed_deposits", 0) or 0
-        existing_loans_count = profile.get("existing_loans", 0) or 0
         
         # Calculate loan summary
         pending_loans = len([l for l in loans if l.get("status") == "PENDING"])
@@ -191,58 +254,11 @@ async def get_dashboard(current_user: CurrentUser = Depends(get_current_user)):
         total_assets = account_balance + mutual_funds + stocks + fixed_deposits
         monthly_income = annual_income / 12 if annual_income else 0
         
-        # Simple scoring algorithm
-        score = 500  # Base score
-        
-        if annual_income >= 1000000:
-            score += 150
-        elif annual_income >= 500000:
-            score += 100
-        elif annual_income >= 300000:
-            score += 50
-            
-        if total_assets >= 1000000:
-            score += 100
-        elif total_assets >= 500000:
-            score += 75
-        elif total_assets >= 100000:
-            score += 50
-            
-        if monthly_income > 0:
-            expense_ratio = monthly_expenses / monthly_income
-            if expense_ratio < 0.3:
-                score += 100
-            elif expense_ratio < 0.5:
-                score += 50
-            elif expense_ratio > 0.8:
-                score -= 50
-                
-        if existing_loans_count == 0:
-            score += 50
-        elif existing_loans_count <= 2:
-            score += 20
-        else:
-            score -= 30
-            
-        # Cap score between 300-900
-        score = max(300, min(900, score))
-        
-        # Mock spending breakdown
-        spending_breakdown = [
-            {"category": "Food & Dining", "amount": monthly_expenses * 0.3},
-            {"category": "Shopping", "amount": monthly_expenses * 0.25},
-            {"category": "Transportation", "amount": monthly_expenses * 0.15},
-            {"category": "Bills & Utilities", "amount": monthly_expenses * 0.2},
-            {"category": "Entertainment", "amount": monthly_expenses * 0.1}
-        ] if monthly_expenses > 0 else []
+        # Persisted customer score, or computed from the profile when stale
+        score = customer_score.get_customer_score(profile)
         
-        # Mock income vs expense data
-        income_vs_expense = [
-            {"month": "Oct", "income": monthly_income, "expenses": monthly_expenses * 0.9},
-            {"month": "Nov", "income": monthly_income, "expenses": monthly_expenses * 0.95},
-            {"month": "Dec", "income": monthly_income, "expenses": monthly_expenses * 1.1},
-            {"month": "Jan", "income": monthly_income, "expenses": monthly_expenses}
-        ] if monthly_income > 0 else []
+        # Monthly income vs expense and spending by category from transactions
+        income_vs_expense, spending_breakdown = rollups.summarize_cashflow(rollup)
         
         return {
             "customer_score": score,
@@ -266,7 +282,8 @@ async def get_dashboard(current_user: CurrentUser = Depends(get_current_user)):
             "income_vs_expense": income_vs_expense,
             "expense_mismatch": False,
             "expense_mismatch_percent": 0,
-            "profile_completed": annual_income > 0
+            "profile_completed": annual_income > 0,
+            "unavailable": unavailable
         }
         
     except Exception as e:
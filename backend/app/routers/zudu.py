@@ -7,6 +7,7 @@ import os
 from datetime import datetime, timedelta
 from fastapi import APIRouter, HTTPException, status, Header
 from app.config import supabase_client
+from app.utils import db
 from app.schemas import ZuduResponse
 
 router = APIRouter(
@@ -62,7 +63,7 @@ async def get_loan_status_by_phone(phone_number: str, _: bool = Header(default=N
 
     try:
         # Query user by phone number from profiles table
-        user_response = supabase_client.table("profiles").select("id, full_name").eq("phone", phone_number).execute()
+        user_response = await db.execute(supabase_client.table("profiles").select("id, full_name").eq("phone", phone_number))
 
         if not user_response.data:
             return ZuduResponse(
@@ -75,7 +76,7 @@ async def get_loan_status_by_phone(phone_number: str, _: bool = Header(default=N
         full_name = user.get("full_name", "Customer")
 
         # Fetch latest loan for this user
-        loan_response = supabase_client.table("loans").select("*").eq("user_id", user_id).order("created_at", desc=True).limit(1).execute()
+        loan_response = await db.execute(supabase_client.table("loans").select("*").eq("user_id", user_id).order("created_at", desc=True).limit(1))
 
         if not loan_response.data:
             return ZuduResponse(
@@ -145,7 +146,7 @@ async def get_payment_reminder(phone_number: str, _: str = Header(default=None,
 
     try:
         # Query user by phone number
-        user_response = supabase_client.table("profiles").select("id, full_name").eq("phone", phone_number).execute()
+        user_response = await db.execute(supabase_client.table("profiles").select("id, full_name").eq("phone", phone_number))
 
         if not user_response.data:
             return ZuduResponse(
@@ -158,7 +159,7 @@ async def get_payment_reminder(phone_number: str, _: str = Header(default=None,
         full_name = user.get("full_name", "Customer")
 
         # Find latest APPROVED loan
-        loan_response = supabase_client.table("loans").select("*").eq("user_id", user_id).eq("status", "APPROVED").order("created_at", desc=True).limit(1).execute()
+        loan_response = await db.execute(supabase_client.table("loans").select("*").eq("user_id", user_id).eq("status", "APPROVED").order("created_at", desc=True).limit(1))
 
         if not loan_response.data:
             return ZuduResponse(
@@ -102,6 +102,7 @@ class LoanResponse(BaseModel):
     emi: float = Field(..., description="Calculated EMI amount")
     ai_explanation: str = Field(..., description="AI-generated explanation")
     risk_reason: Optional[str] = Field(None, description="Detailed risk assessment reasons")
+    explanation_pending: bool = Field(False, description="True while the AI explanation is generated in the background")
 
     class Config:
         json_schema_extra = {
@@ -135,6 +136,24 @@ class RiskResult(BaseModel):
         }
 
 
+class BatchRiskResult(BaseModel):
+    """Schema for columnar batch risk assessment results."""
+    count: int = Field(..., description="Number of applications scored")
+    scores: List[float] = Field(..., description="Risk score (0-100) per application")
+    statuses: List[str] = Field(..., description="Risk status per application: APPROVED, REJECTED")
+    emis: List[float] = Field(..., description="Calculated EMI amount per application")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "count": 2,
+                "scores": [0.0, 100.0],
+                "statuses": ["APPROVED", "REJECTED"],
+                "emis": [8884.88, 44424.39]
+            }
+        }
+
+
 # ============ Receipt Schemas ============
 class ReceiptData(BaseModel):
     """Schema for parsed receipt data."""
@@ -167,6 +186,17 @@ class LoanStatusUpdate(BaseModel):
     remarks: Optional[str] = Field(None, description="Admin remarks")
 
 
+class UserRoleUpdate(BaseModel):
+    """Schema for admin user role update."""
+    role: str = Field(..., description="New role: user, admin")
+
+
+class MerchantCategoryOverride(BaseModel):
+    """Schema for admin correction of a statement description's category."""
+    description: str = Field(..., min_length=1, description="Statement description (any reference numbers are ignored)")
+    category: str = Field(..., description="Category to assign, e.g. Food, Transport, Misc")
+
+
 class RiskAnalysisRequest(BaseModel):
     """Schema for admin risk analysis tool."""
     age: int = Field(..., ge=18, le=100, description="Customer age")
@@ -176,7 +206,10 @@ class RiskAnalysisRequest(BaseModel):
     monthly_expenses: float = Field(..., ge=0, description="Monthly expenses")
     loan_amount_requested: float = Field(..., gt=0, description="Requested loan amount")
     loan_tenure_months: int = Field(..., ge=6, le=240, description="Loan tenure in months")
-    customer_score: int = Field(..., ge=0, le=900, description="Customer credit score")
+    customer_score: Optional[int] = Field(
+        default=None, ge=0, le=900, description="Customer credit score (looked up from user_id when omitted)"
+    )
+    user_id: Optional[str] = Field(default=None, description="Customer whose stored score to use")
     has_expense_mismatch: bool = Field(default=False, description="Fraud flag for expense mismatch")
 
     class Config:
@@ -252,6 +285,26 @@ class GrievanceResponse(BaseModel):
     resolved_at: Optional[str] = Field(None, description="Resolution timestamp")
 
 
+class GrievanceListItem(BaseModel):
+    """Grievance in a list; with ?fields= only the requested columns are set."""
+    id: Optional[str] = Field(None, description="Grievance ID")
+    user_id: Optional[str] = Field(None, description="User who submitted")
+    grievance_type: Optional[str] = Field(None, description="Type of grievance")
+    subject: Optional[str] = Field(None, description="Subject")
+    description: Optional[str] = Field(None, description="Description")
+    status: Optional[str] = Field(None, description="Status: open, in_progress, resolved")
+    admin_response: Optional[str] = Field(None, description="Admin reply")
+    created_at: Optional[str] = Field(None, description="Creation timestamp")
+    resolved_at: Optional[str] = Field(None, description="Resolution timestamp")
+
+
+class GrievancePage(BaseModel):
+    """A page of grievances, in the same envelope as the loan lists."""
+    grievances: List[GrievanceListItem] = Field(..., description="Grievances, newest first")
+    total: Optional[int] = Field(None, description="Matching grievances (paged requests: only with include_total)")
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next page, null on the last page")
+
+
 class GrievanceReply(BaseModel):
     """Schema for admin to reply to a grievance."""
     status: str = Field(..., description="New status: in_progress, resolved")
@@ -0,0 +1,151 @@
+"""
+Columnar spending aggregation for RISKOFF API.
+Computes category totals, monthly series, top merchants and percentiles
+for a set of transactions in one vectorized pass with NumPy.
+
+Text columns (type, category, date, description) repeat heavily in bank
+data, so each is factorized once, per-value logic runs on the distinct
+values only, and totals are summed per code with np.bincount.
+"""
+
+from typing import Any, Callable, Dict, List, Mapping, Sequence, Tuple, Union
+import numpy as np
+import pandas as pd
+from app.services.parser import normalize_description
+from app.services.rollups import month_key
+
+# Percentiles of individual spend amounts reported by aggregate_spending
+SPENDING_PERCENTILES = (50, 90, 99)
+
+# Number of merchants returned in top_merchants
+TOP_MERCHANTS = 5
+
+# Columns read from each transaction
+COLUMNS = ("amount", "category", "type", "transaction_type", "transaction_date", "description")
+
+# Transaction rows, or a mapping of column name -> values
+TransactionColumns = Union[Sequence[Mapping[str, Any]], Mapping[str, Sequence[Any]]]
+
+
+def _to_columns(transactions: TransactionColumns) -> Dict[str, Sequence[Any]]:
+    if isinstance(transactions, Mapping):
+        size = len(next(iter(transactions.values()), []))
+        return {name: transactions.get(name, [None] * size) for name in COLUMNS}
+    return {name: [row.get(name) for row in transactions] for name in COLUMNS}
+
+
+def _amounts(values: Sequence[Any]) -> np.ndarray:
+    """Float amounts; missing or unparseable values become 0."""
+    try:
+        amounts = np.asarray(values, dtype=float)
+    except (TypeError, ValueError):
+        amounts = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy(dtype=float)
+    return np.nan_to_num(amounts, nan=0.0)
+
+
+def _factorize(values: Sequence[Any]) -> Tuple[np.ndarray, List[Any]]:
+    """Integer codes per row and the distinct values (missing as None)."""
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=False)
+    return codes, [None if pd.isna(value) else value for value in uniques]
+
+
+def _flags(codes: np.ndarray, uniques: List[Any], predicate: Callable[[Any], bool]) -> np.ndarray:
+    """Evaluate predicate once per distinct value and broadcast to rows."""
+    return np.array([predicate(value) for value in uniques], dtype=bool)[codes]
+
+
+def _group_totals(
+    codes: np.ndarray,
+    uniques: List[Any],
+    spent: np.ndarray,
+    label: Callable[[Any], str]
+) -> Dict[str, Dict[str, float]]:
+    """Sum spend and count rows per label, where several values may share a label."""
+    sums = np.bincount(codes, weights=spent, minlength=len(uniques))
+    counts = np.bincount(codes, minlength=len(uniques))
+    totals: Dict[str, Dict[str, float]] = {}
+    for value, total, count in zip(uniques, sums, counts):
+        if not count:
+            continue
+        entry = totals.setdefault(label(value), {"total_spent": 0.0, "txn_count": 0})
+        entry["total_spent"] += float(total)
+        entry["txn_count"] += int(count)
+    return totals
+
+
+def aggregate_spending(
+    transactions: TransactionColumns,
+    top_merchants: int = TOP_MERCHANTS
+) -> Dict[str, Any]:
+    """
+    Aggregate spending over transaction columns.
+
+    Same rules as the analytics endpoint: the type is "type", else
+    "transaction_type"; a row is spending when that type is Debit, or when
+    it has no type and a negative amount. Spend is the absolute amount and
+    an empty category is "Uncategorized". Months and merchant keys follow
+    rollups.month_key and parser.normalize_description.
+
+    Args:
+        transactions: Row dicts or a dict of columns with amount, category
+            and optionally type/transaction_type, transaction_date and
+            description
+        top_merchants: Number of merchants to return, largest spend first
+
+    Returns:
+        Dictionary with total_spent, txn_count, category_totals, monthly
+        ({YYYY-MM: amount}, oldest first), top_merchants and percentiles
+    """
+    columns = _to_columns(transactions)
+    amount = _amounts(columns["amount"])
+
+    type_codes, type_values = _factorize(columns["type"])
+    fallback_codes, fallback_values = _factorize(columns["transaction_type"])
+    use_fallback = ~_flags(type_codes, type_values, bool)
+    is_debit = _flags(type_codes, type_values, lambda value: value == "Debit") | (
+        use_fallback & _flags(fallback_codes, fallback_values, lambda value: value == "Debit")
+    )
+    untyped = use_fallback & _flags(fallback_codes, fallback_values, lambda value: value is None)
+    is_spend = is_debit | (untyped & (amount < 0))
+
+    spent = np.abs(amount[is_spend])
+    if not spent.size:
+        return {
+            "total_spent": 0,
+            "txn_count": 0,
+            "category_totals": {},
+            "monthly": {},
+            "top_merchants": [],
+            "percentiles": {}
+        }
+
+    def grouped(column: str, label: Callable[[Any], str]) -> Dict[str, Dict[str, float]]:
+        codes, uniques = _factorize(columns[column])
+        return _group_totals(codes[is_spend], uniques, spent, label)
+
+    categories = grouped("category", lambda value: str(value or "Uncategorized"))
+    months = grouped("transaction_date", lambda value: month_key(value))
+    merchants = grouped("description", lambda value: normalize_description(
+        None if value is None else str(value)
+    ))
+    merchants.pop("", None)
+    ranked = sorted(merchants.items(), key=lambda item: item[1]["total_spent"], reverse=True)
+
+    return {
+        "total_spent": round(float(spent.sum()), 2),
+        "txn_count": int(spent.size),
+        "category_totals": {
+            category: round(entry["total_spent"], 2) for category, entry in categories.items()
+        },
+        "monthly": {
+            month: round(months[month]["total_spent"], 2) for month in sorted(months)
+        },
+        "top_merchants": [
+            {"merchant": merchant, "total_spent": round(entry["total_spent"], 2), "txn_count": entry["txn_count"]}
+            for merchant, entry in ranked[:top_merchants]
+        ],
+        "percentiles": {
+            f"p{p}": round(float(value), 2)
+            for p, value in zip(SPENDING_PERCENTILES, np.percentile(spent, SPENDING_PERCENTILES))
+        }
+    }
@@ -6,6 +6,7 @@ Provides centralized audit trail for all important actions.
 from typing import Optional, Dict, Any
 from datetime import datetime
 from app.config import supabase_client
+from app.utils import db
 
 
 async def log_action(
@@ -40,7 +41,7 @@ async def log_action(
             "created_at": datetime.utcnow().isoformat()
         }
         
-        supabase_client.table("audit_logs").insert(log_entry).execute()
+        await db.execute(supabase_client.table("audit_logs").insert(log_entry))
         return True
         
     except Exception as e:
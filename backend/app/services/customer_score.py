@@ -0,0 +1,208 @@
+"""
+Customer score service for RISKOFF API.
+Computes the 300-900 customer score from a profile's income, expenses,
+assets and existing loans, for one profile or a whole column batch, and
+keeps the persisted score on profiles up to date (see sql/customer_scores.sql).
+"""
+
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+import numpy as np
+from app.config import supabase_client, CUSTOMER_SCORE_BATCH_SIZE
+from app.utils import db
+
+# Bump whenever the scoring rules change so every persisted score is recomputed
+SCORE_VERSION = 1
+
+MIN_SCORE = 300
+MAX_SCORE = 900
+BASE_SCORE = 500
+
+# Profile columns the score is computed from
+SCORE_INPUTS = (
+    "annual_income", "monthly_expenses", "account_balance", "mutual_funds",
+    "stocks", "fixed_deposits", "existing_loans"
+)
+
+
+def _number(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def total_assets(profile: Mapping[str, Any]) -> float:
+    """Bank balance plus mutual funds, stocks and fixed deposits."""
+    return sum(_number(profile.get(name)) for name in ("account_balance", "mutual_funds", "stocks", "fixed_deposits"))
+
+
+def calculate_customer_score(profile: Mapping[str, Any]) -> int:
+    """
+    Customer score (300-900) for a profile row.
+    
+    Starts at 500 and adjusts for annual income, total assets, the
+    monthly expense-to-income ratio and the number of existing loans.
+    Missing values count as 0.
+    """
+    annual_income = _number(profile.get("annual_income"))
+    monthly_expenses = _number(profile.get("monthly_expenses"))
+    assets = total_assets(profile)
+    existing_loans = _number(profile.get("existing_loans"))
+    monthly_income = annual_income / 12 if annual_income else 0
+
+    score = BASE_SCORE
+
+    if annual_income >= 1000000:
+        score += 150
+    elif annual_income >= 500000:
+        score += 100
+    elif annual_income >= 300000:
+        score += 50
+
+    if assets >= 1000000:
+        score += 100
+    elif assets >= 500000:
+        score += 75
+    elif assets >= 100000:
+        score += 50
+
+    if monthly_income > 0:
+        expense_ratio = monthly_expenses / monthly_income
+        if expense_ratio < 0.3:
+            score += 100
+        elif expense_ratio < 0.5:
+            score += 50
+        elif expense_ratio > 0.8:
+            score -= 50
+
+    if existing_loans == 0:
+        score += 50
+    elif existing_loans <= 2:
+        score += 20
+    else:
+        score -= 30
+
+    return max(MIN_SCORE, min(MAX_SCORE, score))
+
+
+def calculate_customer_scores_batch(
+    annual_incomes: Sequence[float],
+    monthly_expenses: Sequence[float],
+    assets: Sequence[float],
+    existing_loans: Sequence[float]
+) -> np.ndarray:
+    """
+    Score many customers in one vectorized pass.
+    
+    Applies exactly the same rules as calculate_customer_score to columnar
+    inputs. Missing (NaN) values count as 0.
+    
+    Args:
+        annual_incomes: Annual incomes
+        monthly_expenses: Monthly expenses
+        assets: Balance plus investments (see total_assets)
+        existing_loans: Number of existing loans
+    
+    Returns:
+        int64 array of scores
+    
+    Raises:
+        ValueError: If the input columns have different lengths
+    """
+    income = np.nan_to_num(np.asarray(annual_incomes, dtype=np.float64))
+    expense = np.nan_to_num(np.asarray(monthly_expenses, dtype=np.float64))
+    assets = np.nan_to_num(np.asarray(assets, dtype=np.float64))
+    loans = np.nan_to_num(np.asarray(existing_loans, dtype=np.float64))
+
+    n = income.shape[0]
+    if any(col.shape != (n,) for col in (expense, assets, loans)):
+        raise ValueError("All input columns must be one-dimensional and of equal length")
+
+    score = np.full(n, BASE_SCORE, dtype=np.int64)
+    score += np.select([income >= 1000000, income >= 500000, income >= 300000], [150, 100, 50], 0)
+    score += np.select([assets >= 1000000, assets >= 500000, assets >= 100000], [100, 75, 50], 0)
+
+    monthly_income = income / 12
+    has_income = monthly_income > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(has_income, expense / np.where(has_income, monthly_income, 1), 0)
+    score += np.select(
+        [has_income & (ratio < 0.3), has_income & (ratio < 0.5), has_income & (ratio > 0.8)],
+        [100, 50, -50],
+        0
+    )
+    score += np.select([loans == 0, loans <= 2], [50, 20], -30)
+
+    return np.clip(score, MIN_SCORE, MAX_SCORE)
+
+
+def score_profiles(profiles: Sequence[Mapping[str, Any]]) -> np.ndarray:
+    """Batch customer scores for profile rows (see calculate_customer_scores_batch)."""
+    return calculate_customer_scores_batch(
+        [_number(p.get("annual_income")) for p in profiles],
+        [_number(p.get("monthly_expenses")) for p in profiles],
+        [total_assets(p) for p in profiles],
+        [_number(p.get("existing_loans")) for p in profiles]
+    )
+
+
+def stored_score(profile: Mapping[str, Any]) -> Optional[int]:
+    """The persisted score if it is current (computed with SCORE_VERSION), else None."""
+    if profile.get("customer_score_version") == SCORE_VERSION and profile.get("customer_score") is not None:
+        return int(profile["customer_score"])
+    return None
+
+
+def get_customer_score(profile: Mapping[str, Any]) -> int:
+    """Persisted score when current, otherwise computed from the profile."""
+    score = stored_score(profile)
+    return calculate_customer_score(profile) if score is None else score
+
+
+async def recompute_customer_scores(batch_size: int = CUSTOMER_SCORE_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Recompute persisted scores for profiles that changed since the last run.
+    
+    Profiles whose score inputs changed (or that were scored with an older
+    SCORE_VERSION) are read in id order, batch_size at a time, scored in one
+    vectorized pass per batch and written back with apply_customer_scores.
+    Profiles edited while the job runs are left stale for the next run.
+    
+    Returns:
+        Dictionary with scanned, updated and version
+    """
+    scanned = updated = 0
+    last_id = None
+    batch_size = max(1, batch_size)
+
+    while True:
+        query = supabase_client.table("profiles").select(
+            "id, score_inputs_changed_at, " + ", ".join(SCORE_INPUTS)
+        ).or_(f"customer_score_version.is.null,customer_score_version.neq.{SCORE_VERSION}")
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        response = await db.execute(query.order("id").limit(batch_size))
+        profiles: List[Dict[str, Any]] = response.data or []
+        if not profiles:
+            break
+
+        scores = score_profiles(profiles)
+        result = await db.execute(supabase_client.rpc("apply_customer_scores", {
+            "p_scores": [
+                {
+                    "id": profile["id"],
+                    "customer_score": int(score),
+                    "score_inputs_changed_at": profile.get("score_inputs_changed_at")
+                }
+                for profile, score in zip(profiles, scores)
+            ],
+            "p_version": SCORE_VERSION
+        }))
+
+        scanned += len(profiles)
+        updated += int(result.data or 0)
+        last_id = profiles[-1]["id"]
+        if len(profiles) < batch_size:
+            break
+
+    return {"scanned": scanned, "updated": updated, "version": SCORE_VERSION}
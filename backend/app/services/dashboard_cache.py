@@ -0,0 +1,77 @@
+"""
+Dashboard snapshot cache for RISKOFF API.
+Keeps each user's computed /user/dashboard body with an ETag so repeat
+visits skip the database, and unchanged dashboards can be answered with
+304 Not Modified.
+"""
+
+import hashlib
+import itertools
+import json
+from typing import Any, Dict, Optional, Tuple
+from fastapi.encoders import jsonable_encoder
+from app.config import DASHBOARD_CACHE_SIZE, DASHBOARD_CACHE_TTL_SECONDS
+from app.utils.cache import TTLCache
+
+# user ID -> (body, etag)
+_dashboards = TTLCache(maxsize=DASHBOARD_CACHE_SIZE, ttl=DASHBOARD_CACHE_TTL_SECONDS)
+
+# user ID -> sequence number of the user's latest invalidation, and a counter
+# bumped when every dashboard is invalidated. A build only stores its body
+# when neither changed while it was querying (see generation and store).
+_invalidations = itertools.count(1)
+_user_generations = TTLCache(maxsize=DASHBOARD_CACHE_SIZE)
+_global_generation = 0
+
+
+def compute_etag(body: Dict[str, Any]) -> str:
+    """Strong ETag (quoted hex digest) for a JSON-serializable body."""
+    payload = json.dumps(jsonable_encoder(body), sort_keys=True, separators=(",", ":"))
+    return '"' + hashlib.sha256(payload.encode()).hexdigest()[:32] + '"'
+
+
+def get(user_id: str) -> Optional[Tuple[Dict[str, Any], str]]:
+    """Cached (body, etag) for a user, or None."""
+    return _dashboards.get(user_id)
+
+
+def generation(user_id: str) -> Tuple[int, int]:
+    """Invalidation state for a user; take it before building a dashboard."""
+    return _global_generation, _user_generations.get(user_id) or 0
+
+
+def store(user_id: str, body: Dict[str, Any], built_at: Optional[Tuple[int, int]] = None) -> str:
+    """
+    Cache a user's dashboard body and return its ETag.
+    
+    With built_at (from generation() before the build), the body is only
+    cached if the user's dashboard was not invalidated in the meantime, so
+    a build that raced an update never caches stale data.
+    """
+    etag = compute_etag(body)
+    if built_at is None or built_at == generation(user_id):
+        _dashboards.set(user_id, (body, etag))
+    return etag
+
+
+def invalidate_dashboard(user_id: Optional[str] = None) -> None:
+    """
+    Drop a cached dashboard after the user's data changes (or every
+    dashboard if user_id is None).
+    """
+    global _global_generation
+    if user_id is None:
+        _global_generation += 1
+        _dashboards.clear()
+    else:
+        # An evicted entry reads as 0, which also fails the store() check
+        _user_generations.set(user_id, next(_invalidations))
+        _dashboards.invalidate(user_id)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value matches etag (weak comparison)."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
@@ -0,0 +1,105 @@
+"""
+Explanation service for RISKOFF API.
+Generates AI decision messages for loan applications, either inline or
+deferred to a background task so the apply endpoint never waits on the LLM.
+"""
+
+import asyncio
+from typing import Any, Dict, Optional
+from app.config import supabase_client, LLM_TIMEOUT_SECONDS
+from app.services.llm import generate_rejection_reason, generate_approval_message
+from app.utils import db
+
+# Shown to the user until the deferred explanation is ready
+EXPLANATION_PENDING_MESSAGE = "Your personalised explanation is being prepared. Please check back shortly."
+
+# In-flight background generations keyed by loan ID (also keeps tasks referenced)
+_pending: Dict[str, "asyncio.Task[str]"] = {}
+
+
+async def generate_decision_message(
+    risk_result: Dict[str, Any],
+    amount: float,
+    tenure_months: int
+) -> str:
+    """
+    Generate the AI approval or rejection message for a risk result.
+
+    Args:
+        risk_result: Output of calculate_risk_score
+        amount: Requested loan amount
+        tenure_months: Loan tenure in months
+
+    Returns:
+        Human-readable decision message
+    """
+    if risk_result["status"] == "REJECTED":
+        return await generate_rejection_reason(risk_result["reasons"])
+    return await generate_approval_message(
+        amount=amount,
+        emi=risk_result["emi"],
+        tenure_months=tenure_months
+    )
+
+
+async def _generate_and_store(
+    loan_id: str,
+    risk_result: Dict[str, Any],
+    amount: float,
+    tenure_months: int
+) -> str:
+    """Generate the decision message and save it on the loan row."""
+    explanation = await generate_decision_message(risk_result, amount, tenure_months)
+
+    if supabase_client:
+        try:
+            # Only fill an empty explanation so an admin override is never clobbered
+            await db.execute(supabase_client.table("loans").update({
+                "ai_explanation": explanation
+            }).eq("id", loan_id).is_("ai_explanation", "null"))
+        except Exception as e:
+            print(f"⚠️ Could not save deferred explanation for loan {loan_id}: {e}")
+
+    return explanation
+
+
+def schedule_explanation(
+    loan_id: Any,
+    risk_result: Dict[str, Any],
+    amount: float,
+    tenure_months: int
+) -> None:
+    """
+    Queue explanation generation for a saved loan on the running event loop.
+
+    The task outlives the request; GET /loans/{id}/explanation can await it.
+    """
+    key = str(loan_id)
+    task = asyncio.create_task(_generate_and_store(key, risk_result, amount, tenure_months))
+    _pending[key] = task
+    task.add_done_callback(lambda _: _pending.pop(key, None))
+
+
+async def wait_for_explanation(loan_id: Any, timeout: Optional[float] = None) -> Optional[str]:
+    """
+    Wait for an in-flight deferred explanation.
+
+    Returns:
+        The explanation, or None if no generation is pending for this loan
+        (or it failed / timed out)
+    """
+    task = _pending.get(str(loan_id))
+    if task is None:
+        return None
+    try:
+        return await asyncio.wait_for(
+            asyncio.shield(task),
+            timeout=timeout if timeout is not None else LLM_TIMEOUT_SECONDS
+        )
+    except Exception:
+        return None
+
+
+def is_pending(loan_id: Any) -> bool:
+    """Check whether an explanation is still being generated for a loan."""
+    return str(loan_id) in _pending
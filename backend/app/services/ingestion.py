@@ -0,0 +1,514 @@
+"""
+Ingestion service for RISKOFF API.
+Runs the bank statement pipeline (parse, categorize, deduplicate, save) and
+writes transactions to the database in batches with bounded concurrency,
+retries and per-batch outcomes.
+"""
+
+import asyncio
+import hashlib
+import os
+from collections import Counter
+from typing import Any, AsyncIterator, BinaryIO, Dict, List, Optional, Union
+import httpx
+from app.config import (
+    supabase_client,
+    INGEST_BATCH_SIZE,
+    INGEST_MAX_CONCURRENCY,
+    INGEST_MAX_RETRIES,
+    INGEST_RETRY_BACKOFF_SECONDS,
+    PARSER_PROCESSES,
+    PARALLEL_PARSE_MIN_BYTES,
+    DEDUP_TRANSACTIONS,
+    DEDUP_LOOKUP_BATCH_SIZE,
+)
+from app.services import dashboard_cache, rollups
+from app.services.parser import iter_bank_statement_chunks, iter_bank_statement_blocks
+from app.utils import db
+
+# Postgres/PostgREST errors raised when sql/transaction_dedup.sql is not
+# applied: undefined column, no unique index for ON CONFLICT, and a column
+# missing from the schema cache
+_DEDUP_SCHEMA_ERRORS = {"42703", "42P10", "PGRST204"}
+
+# Cleared for the rest of the process once the dedup schema is found missing
+_dedup_available = True
+
+
+IDENTITY_MISMATCH_ERROR = "Identity Verification Failed: The uploaded file does not match your account."
+
+
+def _is_dedup_schema_error(error: Exception) -> bool:
+    return getattr(error, "code", None) in _DEDUP_SCHEMA_ERRORS
+
+
+def statement_error(error: Exception) -> str:
+    """User-facing error message for a statement that could not be processed."""
+    message = str(error)
+    if "Identity Mismatch" in message:
+        return IDENTITY_MISMATCH_ERROR
+    return message
+
+
+async def mark_statement_failed(
+    statement_id: Any,
+    error: str,
+    transactions_count: Optional[int] = None
+) -> None:
+    """Record a failed statement, and how many of its rows were saved, on its row."""
+    update: Dict[str, Any] = {"status": "failed"}
+    if transactions_count is not None:
+        update["transactions_count"] = transactions_count
+    try:
+        await db.execute(
+            supabase_client.table("bank_statements").update(update).eq("id", statement_id)
+        )
+        # Separate call: error_message is added by sql/bank_statements.sql
+        await db.execute(
+            supabase_client.table("bank_statements").update({
+                "error_message": error[:500]
+            }).eq("id", statement_id)
+        )
+    except Exception as e:
+        print(f"⚠️ Could not mark statement {statement_id} failed: {e}")
+
+
+class TransactionWriter:
+    """
+    Batched writer for the transactions table.
+    
+    Rows passed to add() are grouped into batches of batch_size and inserted
+    on worker threads, at most max_concurrency at a time. add() waits when
+    that many batches are in flight, so a fast parser cannot queue unbounded
+    work. Failed batches are retried with exponential backoff (see
+    _is_retryable). When a
+    statement_id is given, bank_statements.transactions_count is updated as
+    batches land. Spending and income in the saved rows are collected in
+    self.spending for the user's rollup.
+    
+    With on_conflict set, batches are upserted and rows that hit the
+    conflict target are skipped rather than failing the batch. If the
+    database lacks the content_hash column or its unique index, the writer
+    falls back to plain inserts and dedup is turned off for the process.
+    """
+    
+    def __init__(
+        self,
+        statement_id: Optional[Any] = None,
+        batch_size: int = INGEST_BATCH_SIZE,
+        max_concurrency: int = INGEST_MAX_CONCURRENCY,
+        max_retries: int = INGEST_MAX_RETRIES,
+        retry_backoff: float = INGEST_RETRY_BACKOFF_SECONDS,
+        on_conflict: Optional[str] = None
+    ):
+        self.statement_id = statement_id
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max(0, max_retries)
+        self.retry_backoff = retry_backoff
+        self.on_conflict = on_conflict
+        self._drop_hashes = False
+        self.saved = 0
+        self.failed = 0
+        self.skipped = 0
+        self.spending: rollups.SpendingDeltas = {}
+        self.outcomes: List[Dict[str, Any]] = []
+        self._buffer: List[Dict[str, Any]] = []
+        self._tasks: List[asyncio.Task] = []
+        self._slots = asyncio.Semaphore(max(1, max_concurrency))
+        self._progress_lock = asyncio.Lock()
+    
+    async def add(self, rows: List[Dict[str, Any]]) -> None:
+        """Queue rows, submitting every full batch."""
+        self._buffer.extend(rows)
+        while len(self._buffer) >= self.batch_size:
+            batch = self._buffer[:self.batch_size]
+            self._buffer = self._buffer[self.batch_size:]
+            await self._submit(batch)
+    
+    async def close(self) -> Dict[str, Any]:
+        """
+        Flush remaining rows and wait for every batch.
+        
+        Returns:
+            Summary with saved/failed/skipped row counts and per-batch outcomes
+        """
+        if self._buffer:
+            batch, self._buffer = self._buffer, []
+            await self._submit(batch)
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
+        
+        self.outcomes.sort(key=lambda outcome: outcome["batch"])
+        return {
+            "saved": self.saved,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "batches": len(self.outcomes),
+            "failed_batches": [o for o in self.outcomes if o["status"] == "failed"]
+        }
+    
+    async def _submit(self, batch: List[Dict[str, Any]]) -> None:
+        # Backpressure: wait for a free slot before starting another batch
+        await self._slots.acquire()
+        batch_number = len(self._tasks) + 1
+        task = asyncio.create_task(self._write(batch_number, batch))
+        task.add_done_callback(lambda _: self._slots.release())
+        self._tasks.append(task)
+    
+    async def _write(self, batch_number: int, rows: List[Dict[str, Any]]) -> None:
+        error = None
+        attempt = 0
+        while True:
+            upserting = self.on_conflict is not None
+            try:
+                response = await db.run(self._execute, rows)
+                saved = len(response.data) if response.data else 0
+                self.saved += saved
+                rollups.spending_deltas(response.data or [], self.spending)
+                outcome = {
+                    "batch": batch_number,
+                    "rows": len(rows),
+                    "saved": saved,
+                    "attempts": attempt + 1,
+                    "status": "saved"
+                }
+                if upserting:
+                    # Only inserted rows are returned; the rest already existed
+                    outcome["skipped"] = len(rows) - saved
+                    self.skipped += outcome["skipped"]
+                self.outcomes.append(outcome)
+                await self._update_progress()
+                return
+            except Exception as e:
+                error = e
+                if upserting and _is_dedup_schema_error(e):
+                    # Rejected before anything was written; resend as an insert
+                    self._disable_dedup(e)
+                    continue
+                if attempt >= self.max_retries or not self._is_retryable(e):
+                    break
+                await asyncio.sleep(self.retry_backoff * (2 ** attempt))
+                attempt += 1
+        
+        print(f"⚠️ Transaction batch {batch_number} failed after {attempt + 1} attempts: {error}")
+        self.failed += len(rows)
+        self.outcomes.append({
+            "batch": batch_number,
+            "rows": len(rows),
+            "saved": 0,
+            "attempts": attempt + 1,
+            "status": "failed",
+            "error": str(error)
+        })
+    
+    def _is_retryable(self, error: Exception) -> bool:
+        """
+        Whether a failed batch can safely be sent again.
+        
+        Upserts skip rows that already landed, so any failure is retried. A
+        plain insert may have been committed before a timeout or dropped
+        response, so it is retried only when the request never reached the
+        server (no connection could be made).
+        """
+        if self.on_conflict:
+            return True
+        return isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+    
+    def _disable_dedup(self, error: Exception) -> None:
+        """Switch this writer, and later statements, to plain inserts."""
+        global _dedup_available
+        if _dedup_available:
+            print(f"⚠️ Transaction dedup unavailable (apply sql/transaction_dedup.sql), saving without it: {error}")
+        _dedup_available = False
+        self.on_conflict = None
+        self._drop_hashes = True
+    
+    def _execute(self, rows: List[Dict[str, Any]]):
+        table = supabase_client.table("transactions")
+        if self.on_conflict:
+            return table.upsert(rows, on_conflict=self.on_conflict, ignore_duplicates=True).execute()
+        if self._drop_hashes:
+            rows = [{k: v for k, v in row.items() if k != "content_hash"} for row in rows]
+        return table.insert(rows).execute()
+    
+    async def _update_progress(self) -> None:
+        """Write the running saved count to the statement record."""
+        if not self.statement_id:
+            return
+        # Serialized so a slower update never overwrites a newer count
+        async with self._progress_lock:
+            saved = self.saved
+            try:
+                await db.execute(
+                    supabase_client.table("bank_statements").update({
+                        "transactions_count": saved
+                    }).eq("id", self.statement_id)
+                )
+            except Exception as e:
+                print(f"⚠️ Could not update statement progress: {e}")
+
+
+def _hash_number(value: Any) -> str:
+    if value is None:
+        return ""
+    try:
+        return f"{float(value):.2f}"
+    except (TypeError, ValueError):
+        return str(value).strip()
+
+
+def transaction_hash(user_id: str, txn: Dict[str, Any], occurrence: int = 0) -> str:
+    """
+    Stable content hash of a parsed statement row.
+    
+    Keyed on user, date, amount, description (lowercased, whitespace
+    collapsed) and balance. occurrence numbers identical rows within one
+    statement, so two equal purchases on the same day are both kept on the
+    first upload and both skipped on a re-upload.
+    """
+    description = " ".join(str(txn.get("description") or "").lower().split())
+    key = "|".join([
+        str(user_id),
+        str(txn.get("date") or "").strip(),
+        _hash_number(txn.get("amount")),
+        description,
+        _hash_number(txn.get("balance")),
+        str(occurrence)
+    ])
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def to_transaction_rows(
+    transactions: List[Dict[str, Any]],
+    user_id: str,
+    occurrences: Optional[Counter] = None
+) -> List[Dict[str, Any]]:
+    """
+    Map parsed statement rows to transactions table rows, skipping empty ones.
+    
+    When occurrences is given, each row gets a content_hash; pass the same
+    Counter for every chunk of a statement so repeats are numbered across
+    chunks.
+    """
+    rows = []
+    for txn in transactions:
+        db_transaction = {
+            "user_id": user_id,
+            "description": txn.get("description"),
+            "amount": txn.get("amount"),
+            "category": txn.get("category", "Misc"),
+            "transaction_date": txn.get("date"),
+            "transaction_type": txn.get("type", "Debit")
+        }
+        # Only include if we have at least description or amount
+        if db_transaction["description"] or db_transaction["amount"]:
+            if occurrences is not None:
+                key = transaction_hash(user_id, txn)
+                db_transaction["content_hash"] = transaction_hash(user_id, txn, occurrences[key])
+                occurrences[key] += 1
+            rows.append(db_transaction)
+    return rows
+
+
+class TransactionDeduplicator:
+    """
+    Drops statement rows the user has already uploaded.
+    
+    Hashes of each chunk are looked up in the user's existing transactions
+    (the (user_id, content_hash) index) in batches of lookup_batch_size. A
+    failed lookup keeps every row; the unique index then skips duplicates
+    at write time.
+    """
+    
+    def __init__(self, user_id: str, lookup_batch_size: int = DEDUP_LOOKUP_BATCH_SIZE):
+        self.user_id = user_id
+        self.lookup_batch_size = max(1, lookup_batch_size)
+        self.occurrences: Counter = Counter()
+        self.duplicates = 0
+    
+    async def filter(self, transactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Return hashed transactions table rows that are not yet saved."""
+        rows = to_transaction_rows(transactions, self.user_id, self.occurrences)
+        if not rows:
+            return rows
+        existing = await db.run(
+            self._existing_hashes, [row["content_hash"] for row in rows]
+        )
+        fresh = [row for row in rows if row["content_hash"] not in existing]
+        self.duplicates += len(rows) - len(fresh)
+        return fresh
+    
+    def _existing_hashes(self, hashes: List[str]) -> set:
+        existing = set()
+        try:
+            for start in range(0, len(hashes), self.lookup_batch_size):
+                batch = hashes[start:start + self.lookup_batch_size]
+                response = supabase_client.table("transactions").select("content_hash").eq(
+                    "user_id", self.user_id
+                ).in_("content_hash", batch).execute()
+                existing.update(row["content_hash"] for row in response.data or [])
+        except Exception as e:
+            print(f"⚠️ Duplicate lookup failed, relying on unique index: {e}")
+        return existing
+
+
+def _source_size(source: Union[bytes, BinaryIO]) -> int:
+    """Size in bytes of raw content or a seekable file object."""
+    if isinstance(source, (bytes, bytearray)):
+        return len(source)
+    position = source.tell()
+    source.seek(0, os.SEEK_END)
+    size = source.tell()
+    source.seek(position)
+    return size
+
+
+async def _threaded_chunks(
+    source: Union[bytes, BinaryIO],
+    user_full_name: Optional[str]
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Parse chunks on a worker thread so the event loop stays free."""
+    chunks = iter_bank_statement_chunks(source, user_full_name)
+    while True:
+        chunk = await asyncio.to_thread(next, chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+async def ingest_statement(
+    source: Union[bytes, BinaryIO],
+    user_id: str,
+    user_full_name: Optional[str] = None,
+    statement_id: Optional[Any] = None,
+    progress: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Parse a bank statement CSV and save its transactions.
+    
+    Chunks are parsed off the event loop and handed to a TransactionWriter,
+    so saving overlaps with parsing. Statements of PARALLEL_PARSE_MIN_BYTES
+    or more are split into blocks parsed across the process pool; smaller
+    ones are parsed on a worker thread. With DEDUP_TRANSACTIONS on, rows the
+    user has already uploaded are skipped (see TransactionDeduplicator). On
+    completion the spending and income in saved rows are added to the user's rollup and
+    the statement record is marked completed (or failed if no batch could
+    be saved). Any error marks the statement failed with its message. A
+    parse error after some chunks were saved does not raise: the statement
+    is marked failed and the counts are returned with status "partial" and
+    the error.
+    
+    Args:
+        source: Raw CSV bytes or a binary file object
+        user_id: Owner of the transactions
+        user_full_name: Optional name for identity verification
+        statement_id: bank_statements row to update, if any
+        progress: Optional dict updated in place with running counts
+        
+    Returns:
+        Dictionary with status, parsed/saved/failed/new/duplicate counts,
+        failed batches, a preview of the first 10 transactions and, for
+        "partial", the error
+        
+    Raises:
+        ValueError: On identity mismatch, an empty statement or a parse
+            error before anything was saved
+    """
+    try:
+        return await _ingest(source, user_id, user_full_name, statement_id, progress)
+    except Exception as e:
+        if statement_id:
+            await mark_statement_failed(statement_id, statement_error(e))
+        raise
+
+
+async def _ingest(
+    source: Union[bytes, BinaryIO],
+    user_id: str,
+    user_full_name: Optional[str],
+    statement_id: Optional[Any],
+    progress: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    parsed_count = 0
+    preview: List[Dict[str, Any]] = []
+    parse_error: Optional[Exception] = None
+    dedup = TransactionDeduplicator(user_id) if DEDUP_TRANSACTIONS and _dedup_available else None
+    writer = TransactionWriter(
+        statement_id=statement_id,
+        on_conflict="user_id,content_hash" if dedup else None
+    )
+    if PARSER_PROCESSES > 1 and _source_size(source) >= PARALLEL_PARSE_MIN_BYTES:
+        chunks = iter_bank_statement_blocks(source, user_full_name)
+    else:
+        chunks = _threaded_chunks(source, user_full_name)
+    
+    try:
+        async for chunk in chunks:
+            parsed_count += len(chunk)
+            if len(preview) < 10:
+                preview.extend(chunk[:10 - len(preview)])
+            rows = await dedup.filter(chunk) if dedup else to_transaction_rows(chunk, user_id)
+            if progress is not None:
+                progress["transactions_parsed"] = parsed_count
+                if dedup:
+                    progress["transactions_duplicate"] = dedup.duplicates
+            await writer.add(rows)
+    except Exception as e:
+        parse_error = e
+    finally:
+        # Always drain in-flight batches, even when parsing fails part-way,
+        # and count whatever was saved in the spending rollup
+        write_summary = await writer.close()
+        if writer.spending:
+            await db.run(rollups.record_spending, user_id, writer.spending)
+        if write_summary["saved"]:
+            dashboard_cache.invalidate_dashboard(user_id)
+    
+    saved = write_summary["saved"]
+    if parse_error is not None and not saved:
+        raise parse_error
+    
+    if not parsed_count:
+        raise ValueError("No transactions found in the CSV file")
+    
+    duplicates = write_summary["skipped"] + (dedup.duplicates if dedup else 0)
+    if parse_error is not None:
+        # Earlier chunks are already saved: report them with the error and
+        # leave the statement failed so it is not mistaken for complete
+        error = statement_error(parse_error)
+        if statement_id:
+            await mark_statement_failed(statement_id, error, saved)
+        return {
+            "status": "partial",
+            "error": error,
+            "transactions_parsed": parsed_count,
+            "transactions_saved": saved,
+            "transactions_failed": write_summary["failed"],
+            "transactions_new": saved,
+            "transactions_duplicate": duplicates,
+            "failed_batches": write_summary["failed_batches"],
+            "preview": preview
+        }
+    
+    all_failed = write_summary["failed"] > 0 and saved == 0
+    if statement_id:
+        try:
+            await db.execute(
+                supabase_client.table("bank_statements").update({
+                    "status": "failed" if all_failed else "completed",
+                    "transactions_count": saved
+                }).eq("id", statement_id)
+            )
+        except Exception as e:
+            print(f"⚠️ Could not update statement status: {e}")
+    
+    return {
+        "status": "failed" if all_failed else "completed",
+        "transactions_parsed": parsed_count,
+        "transactions_saved": saved,
+        "transactions_failed": write_summary["failed"],
+        "transactions_new": saved,
+        "transactions_duplicate": duplicates,
+        "failed_batches": write_summary["failed_batches"],
+        "preview": preview
+    }
@@ -3,8 +3,203 @@ LLM service for RISKOFF API.
 Handles Gemini text generation for various AI features.
 """
 
-from typing import Optional
-from app.config import gemini_model
+import asyncio
+import hashlib
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+from app.config import (
+    gemini_model, supabase_client,
+    LLM_MAX_CONCURRENCY, LLM_TIMEOUT_SECONDS,
+    LLM_CACHE_SIZE, LLM_CACHE_TTL_SECONDS, LLM_CACHE_BACKEND
+)
+from app.utils.cache import TTLCache
+from app.utils import db
+
+
+# ============ Async Execution ============
+# The Gemini SDK is synchronous. Calls run in a bounded thread pool so a slow
+# model response never stalls the event loop for unrelated requests.
+_llm_executor = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="gemini")
+
+# One semaphore per event loop (asyncio primitives are bound to a single loop)
+_llm_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    """Return the concurrency semaphore for the running event loop."""
+    loop = asyncio.get_running_loop()
+    semaphore = _llm_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        _llm_semaphores[loop] = semaphore
+    return semaphore
+
+
+async def call_model(model: Any, contents: Any, timeout: Optional[float] = None) -> Any:
+    """
+    Run model.generate_content off the event loop.
+
+    At most LLM_MAX_CONCURRENCY calls are in flight at once; each call is
+    bounded by a timeout (LLM_TIMEOUT_SECONDS by default).
+
+    Args:
+        model: Gemini GenerativeModel (or compatible object)
+        contents: Prompt string or list of content parts
+        timeout: Optional per-call timeout in seconds
+
+    Returns:
+        The SDK response object
+
+    Raises:
+        asyncio.TimeoutError: If the model does not respond in time
+    """
+    loop = asyncio.get_running_loop()
+    async with _get_semaphore():
+        return await asyncio.wait_for(
+            loop.run_in_executor(_llm_executor, model.generate_content, contents),
+            timeout=timeout if timeout is not None else LLM_TIMEOUT_SECONDS
+        )
+
+
+# ============ Response Cache ============
+# The risk engine emits a small set of reason templates, so explanation and
+# decision-message prompts repeat heavily. Successful model responses are
+# cached by a hash of the normalized prompt; fallback texts are never cached.
+
+def prompt_cache_key(prompt: str) -> str:
+    """Content address for a prompt: SHA-256 of its whitespace-normalized text."""
+    normalized = " ".join(prompt.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class SupabaseCacheBackend:
+    """
+    Shared response cache stored in the llm_response_cache table.
+    Lets every worker reuse responses generated by any other worker.
+    """
+
+    def __init__(self, client: Any, table: str = "llm_response_cache"):
+        self.client = client
+        self.table = table
+
+    def get(self, key: str) -> Optional[str]:
+        response = self.client.table(self.table).select("response, expires_at").eq(
+            "cache_key", key
+        ).limit(1).execute()
+        if not response.data:
+            return None
+        row = response.data[0]
+        expires_at = row.get("expires_at")
+        if expires_at and datetime.fromisoformat(expires_at) <= datetime.now(timezone.utc):
+            return None
+        return row.get("response")
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+        self.client.table(self.table).upsert({
+            "cache_key": key,
+            "response": value,
+            "expires_at": expires_at.isoformat()
+        }).execute()
+
+    def delete(self, key: str) -> None:
+        self.client.table(self.table).delete().eq("cache_key", key).execute()
+
+    def clear(self) -> None:
+        self.client.table(self.table).delete().neq("cache_key", "").execute()
+
+
+class LLMResponseCache:
+    """
+    Two-level response cache: in-process LRU with TTL, plus an optional
+    shared backend. Backend errors are logged and treated as misses.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, backend: Optional[Any] = None):
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.ttl = ttl
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self.local.get(key)
+        if value is None and self.backend is not None:
+            try:
+                value = await db.run(self.backend.get, key)
+            except Exception as e:
+                print(f"⚠️ LLM cache backend read error (non-critical): {e}")
+                value = None
+            if value is not None:
+                self.shared_hits += 1
+                self.local.set(key, value)
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        self.local.set(key, value)
+        if self.backend is not None:
+            try:
+                await db.run(self.backend.set, key, value, self.ttl)
+            except Exception as e:
+                print(f"⚠️ LLM cache backend write error (non-critical): {e}")
+
+    async def invalidate(self, key: str) -> bool:
+        removed = self.local.invalidate(key)
+        if self.backend is not None:
+            try:
+                await db.run(self.backend.delete, key)
+            except Exception as e:
+                print(f"⚠️ LLM cache backend delete error (non-critical): {e}")
+        return removed
+
+    async def clear(self) -> None:
+        self.local.clear()
+        if self.backend is not None:
+            try:
+                await db.run(self.backend.clear)
+            except Exception as e:
+                print(f"⚠️ LLM cache backend clear error (non-critical): {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared_hits": self.shared_hits,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size": len(self.local),
+            "maxsize": self.local.maxsize,
+            "ttl_seconds": self.ttl,
+            "backend": type(self.backend).__name__ if self.backend is not None else None
+        }
+
+
+response_cache = LLMResponseCache(
+    maxsize=LLM_CACHE_SIZE,
+    ttl=LLM_CACHE_TTL_SECONDS,
+    backend=SupabaseCacheBackend(supabase_client) if LLM_CACHE_BACKEND == "supabase" and supabase_client else None
+)
+
+
+async def _generate_cached(prompt: str) -> str:
+    """Generate text for a prompt, serving repeated prompts from the response cache."""
+    key = prompt_cache_key(prompt)
+    cached = await response_cache.get(key)
+    if cached is not None:
+        return cached
+
+    response = await call_model(gemini_model, prompt)
+    text = response.text.strip()
+    await response_cache.set(key, text)
+    return text
 
 
 async def generate_loan_summary(
@@ -39,7 +234,7 @@ async def generate_loan_summary(
 
         Keep it friendly and informative. Do not include any disclaimers."""
 
-        response = gemini_model.generate_content(prompt)
+        response = await call_model(gemini_model, prompt)
         return response.text.strip()
 
     except Exception as e:
@@ -76,8 +271,7 @@ async def generate_risk_explanation(
 
         Provide a helpful 2-3 sentence explanation. Be encouraging if score is good, and provide actionable advice if score needs improvement."""
 
-        response = gemini_model.generate_content(prompt)
-        return response.text.strip()
+        return await _generate_cached(prompt)
 
     except Exception as e:
         return f"Risk Status: {status} (Score: {score}). Factors: {', '.join(reasons)}"
@@ -112,7 +306,7 @@ async def generate_voice_response(
         - Be helpful and professional
         - Suitable for text-to-speech"""
 
-        response = gemini_model.generate_content(prompt)
+        response = await call_model(gemini_model, prompt)
         return response.text.strip()
 
     except Exception as e:
@@ -154,7 +348,7 @@ async def analyze_spending_patterns(transactions: list) -> dict:
 
         Return ONLY the JSON object."""
 
-        response = gemini_model.generate_content(prompt)
+        response = await call_model(gemini_model, prompt)
         response_text = response.text.strip()
 
         # Clean up response if wrapped in code blocks
@@ -171,6 +365,37 @@ async def analyze_spending_patterns(transactions: list) -> dict:
         return {"analysis": f"Error analyzing patterns: {str(e)}", "categories": {}}
 
 
+async def generate_financial_advice(spending_summary: str) -> str:
+    """
+    Generate short, practical financial advice from a spending summary.
+
+    Args:
+        spending_summary: Total spent and per-category breakdown
+
+    Returns:
+        Generated advice text
+    """
+    fallback = "Keep an eye on your spending in your largest categories and set aside a fixed amount for savings each month."
+    if not gemini_model:
+        return fallback
+
+    try:
+        prompt = f"""You are a friendly financial advisor for a fintech app. Based on this spending summary, give practical advice.
+
+        {spending_summary}
+
+        Requirements:
+        - 2-3 sentences
+        - Point out the largest spending category
+        - Suggest one concrete way to save"""
+
+        response = await call_model(gemini_model, prompt)
+        return response.text.strip()
+
+    except Exception as e:
+        return fallback
+
+
 async def generate_rejection_reason(reasons: list) -> str:
     """
     Generate a polite, human-readable rejection explanation using Gemini AI.
@@ -198,8 +423,7 @@ async def generate_rejection_reason(reasons: list) -> str:
         - Suggest they can reapply after improving their financial situation
         - Do not include any specific numbers or technical jargon"""
 
-        response = gemini_model.generate_content(prompt)
-        return response.text.strip()
+        return await _generate_cached(prompt)
 
     except Exception as e:
         return f"Unfortunately, your loan application could not be approved at this time. We encourage you to review your financial profile and apply again in the future."
@@ -233,8 +457,7 @@ async def generate_approval_message(amount: float, emi: float, tenure_months: in
         - Keep it under 2 sentences
         - Mention the key numbers"""
 
-        response = gemini_model.generate_content(prompt)
-        return response.text.strip()
+        return await _generate_cached(prompt)
 
     except Exception as e:
         return f"Congratulations! Your loan of ₹{amount:,.2f} has been approved. Your monthly EMI will be ₹{emi:,.2f} for {tenure_months} months."
@@ -334,7 +557,7 @@ USER QUERY: {sanitized_query}
 
 Respond in a conversational manner. If there's a clear next action the user should take, mention it briefly."""
 
-        response = gemini_model.generate_content(system_prompt)
+        response = await call_model(gemini_model, system_prompt)
         response_text = response.text.strip()
         
         # Determine if there's a suggested action based on context
@@ -392,12 +615,23 @@ class LLMService:
     async def generate_bank_chat_response(self, user_name: str, loan_details: dict, user_query: str) -> dict:
         return await generate_bank_chat_response(user_name, loan_details, user_query)
     
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and size of the response cache."""
+        return response_cache.stats()
+    
+    async def invalidate_cache(self, prompt: Optional[str] = None) -> bool:
+        """Drop the cached response for one prompt, or the whole cache if prompt is None."""
+        if prompt is None:
+            await response_cache.clear()
+            return True
+        return await response_cache.invalidate(prompt_cache_key(prompt))
+    
     async def generate_content(self, prompt: str) -> str:
         """Generic content generation using Gemini."""
         if not self.model:
             return "AI service unavailable"
         try:
-            response = self.model.generate_content(prompt)
+            response = await call_model(self.model, prompt)
             return response.text.strip()
         except Exception as e:
             return f"Error generating content: {str(e)}"
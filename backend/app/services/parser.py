@@ -4,13 +4,36 @@ Handles receipt image parsing and bank statement CSV parsing with auto-categoriz
 Includes identity verification for security.
 """
 
+import asyncio
 import io
 import json
+import multiprocessing
+import os
+import re
 import difflib
-from typing import List, Dict, Any, Optional
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Iterator, AsyncIterator, BinaryIO, Union
 from datetime import datetime
+import numpy as np
 import pandas as pd
-from app.config import gemini_model
+from app.config import (
+    gemini_model,
+    BANK_STATEMENT_CHUNK_ROWS,
+    MERCHANT_CACHE_SIZE,
+    MERCHANT_CATEGORY_FILE,
+    PARSER_PROCESSES,
+    PARALLEL_PARSE_BLOCK_BYTES,
+)
+from app.services.llm import call_model
+from app.utils.cache import TTLCache
+
+try:
+    import fcntl
+except ImportError:  # Windows: corrections are only locked within a process
+    fcntl = None
 
 
 # ============ Category Keywords ============
@@ -25,6 +48,183 @@ CATEGORY_KEYWORDS = {
 }
 
 
+# One alternation per category, compiled once. Categories are tried in
+# CATEGORY_KEYWORDS order, so the first matching category wins (not the
+# keyword that appears first in the text).
+CATEGORY_PATTERNS = {
+    category: re.compile("|".join(re.escape(keyword) for keyword in keywords))
+    for category, keywords in CATEGORY_KEYWORDS.items()
+}
+
+
+# Anything that is not a letter separates words in a normalized description.
+# Keywords are plain words, so normalizing never changes the matched category.
+_NON_LETTERS = re.compile(r"[\W\d_]+")
+
+
+def _match_category(description_lower: str) -> str:
+    """Return the first category whose pattern matches lowercased text."""
+    for category, pattern in CATEGORY_PATTERNS.items():
+        if pattern.search(description_lower):
+            return category
+    return "Misc"
+
+
+def normalize_description(description: Optional[str]) -> str:
+    """
+    Reduce a statement description to a merchant key.
+    
+    Lowercases and drops digits and punctuation, so "UPI/4021/SWIGGY/okaxis"
+    and "UPI/9977/SWIGGY/okaxis" share the key "upi swiggy okaxis".
+    """
+    if not description:
+        return ""
+    return _NON_LETTERS.sub(" ", description.lower()).strip()
+
+
+class MerchantCategoryCache:
+    """
+    Normalized description -> category lookups for statement imports.
+    
+    Keyword matches are kept in a bounded LRU. Admin corrections are kept
+    separately, are never evicted, take precedence over keyword matches and
+    are saved to a JSON file (when a path is configured) that is loaded
+    again on startup. Several workers can share the file: each change is
+    merged into the file's current contents under a file lock, so one
+    worker never overwrites another's corrections. Changes do blocking
+    file I/O; call them off the event loop.
+    """
+    
+    def __init__(self, maxsize: int = 50000, path: str = ""):
+        self.path = path
+        self._learned = TTLCache(maxsize=maxsize)
+        self._overrides: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.load()
+    
+    def load(self) -> None:
+        """Load persisted corrections, if a file is configured and present."""
+        try:
+            data = self._read()
+        except Exception as e:
+            print(f"⚠️ Could not load merchant categories from {self.path}: {e}")
+            return
+        if data is not None:
+            with self._lock:
+                self._overrides = data
+    
+    def _read(self) -> Optional[Dict[str, str]]:
+        """Corrections currently in the file, or None without a file."""
+        if not self.path or not os.path.exists(self.path):
+            return None
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return {str(k): str(v) for k, v in data.items()}
+    
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock on <path>.lock shared by every process using the file."""
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    @staticmethod
+    def _apply(overrides: Dict[str, str], key: str, category: Optional[str]) -> bool:
+        """Set or (category None) remove one correction; True unless removing a missing one."""
+        if category is None:
+            return overrides.pop(key, None) is not None
+        overrides[key] = category
+        return True
+    
+    def _update(self, key: str, category: Optional[str]) -> bool:
+        """
+        Set or (category None) remove one correction. With a file, the
+        change is merged into the file's current contents under the file
+        lock, and this process adopts the merged result. Caller holds the
+        lock.
+        
+        Returns:
+            False if the correction to remove did not exist
+        """
+        overrides = dict(self._overrides)
+        if not self.path:
+            existed = self._apply(overrides, key, category)
+        else:
+            try:
+                with self._file_lock():
+                    current = self._read()
+                    if current is not None:
+                        overrides = current
+                    existed = self._apply(overrides, key, category)
+                    tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                    with open(tmp_path, "w", encoding="utf-8") as f:
+                        json.dump(overrides, f, indent=2, sort_keys=True)
+                    os.replace(tmp_path, self.path)
+            except Exception as e:
+                print(f"⚠️ Could not save merchant categories to {self.path}: {e}")
+                overrides = dict(self._overrides)
+                existed = self._apply(overrides, key, category)
+        
+        if overrides != self._overrides:
+            # Other workers' corrections may have changed matches too
+            self._learned.clear()
+        self._overrides = overrides
+        return existed
+    
+    def lookup(self, key: str) -> str:
+        """Category for a normalized description, matching keywords on a miss."""
+        override = self._overrides.get(key)
+        if override is not None:
+            return override
+        category = self._learned.get(key)
+        if category is None:
+            category = _match_category(key)
+            self._learned.set(key, category)
+        return category
+    
+    def set_override(self, description: str, category: str) -> str:
+        """Pin a category for a description. Returns the normalized key."""
+        key = normalize_description(description)
+        with self._lock:
+            self._update(key, category)
+        self._learned.invalidate(key)
+        return key
+    
+    def remove_override(self, description: str) -> bool:
+        """Drop a correction. Returns True if one existed."""
+        key = normalize_description(description)
+        with self._lock:
+            return self._update(key, None)
+    
+    def replace_overrides(self, overrides: Dict[str, str]) -> None:
+        """Adopt another process's corrections (used by parser worker processes)."""
+        with self._lock:
+            if overrides == self._overrides:
+                return
+            self._overrides = dict(overrides)
+        self._learned.clear()
+    
+    def overrides(self) -> Dict[str, str]:
+        """Copy of all admin corrections."""
+        with self._lock:
+            return dict(self._overrides)
+    
+    def stats(self) -> Dict[str, Any]:
+        """LRU counters plus the number of corrections."""
+        stats = self._learned.stats()
+        stats["overrides"] = len(self._overrides)
+        return stats
+
+
+merchant_cache = MerchantCategoryCache(maxsize=MERCHANT_CACHE_SIZE, path=MERCHANT_CATEGORY_FILE)
+
+
 def categorize_transaction(description: str) -> str:
     """
     Auto-categorize a transaction based on keywords in the description.
@@ -38,14 +238,32 @@ def categorize_transaction(description: str) -> str:
     if not description:
         return "Misc"
     
-    description_lower = description.lower()
+    return merchant_cache.lookup(normalize_description(description))
+
+
+def categorize_transactions(descriptions: pd.Series) -> pd.Series:
+    """
+    Categorize a whole column of descriptions at once.
     
-    for category, keywords in CATEGORY_KEYWORDS.items():
-        for keyword in keywords:
-            if keyword in description_lower:
-                return category
+    Same result as categorize_transaction per row. The column is normalized
+    in one vectorized pass and factorized, so each distinct merchant key is
+    looked up once and the result is broadcast back by code.
     
-    return "Misc"
+    Args:
+        descriptions: Series of description text (NaN treated as empty)
+        
+    Returns:
+        Series of category strings aligned with the input index
+    """
+    normalized = descriptions.fillna("").astype(str).str.lower().str.replace(
+        _NON_LETTERS, " ", regex=True
+    ).str.strip()
+    codes, uniques = pd.factorize(normalized)
+    categories = np.array(
+        [merchant_cache.lookup(key) for key in np.asarray(uniques, dtype=object)],
+        dtype=object
+    )
+    return pd.Series(categories[codes], index=descriptions.index, dtype=object)
 
 
 # ============ Identity Verification ============
@@ -150,6 +368,239 @@ def verify_identity_in_file(file_content: bytes, user_full_name: str) -> bool:
         return True
 
 
+# Common column mappings
+COLUMN_MAPPINGS = {
+    "date": ["date", "transaction_date", "txn_date", "value_date", "posting_date"],
+    "description": ["description", "narration", "particulars", "remarks", "details", "transaction_details"],
+    "amount": ["amount", "transaction_amount", "txn_amount", "value"],
+    "type": ["type", "transaction_type", "txn_type", "dr/cr", "debit/credit"],
+    "debit": ["debit", "withdrawal", "dr", "debit_amount"],
+    "credit": ["credit", "deposit", "cr", "credit_amount"],
+    "balance": ["balance", "closing_balance", "available_balance", "running_balance"]
+}
+
+
+def _clean_transactions_frame(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Normalize columns, categorize and clean a frame of raw CSV rows.
+
+    All steps are column-wise, so the same code handles a whole file or
+    one chunk of a streamed file.
+    """
+    # Standardize column names (lowercase and strip whitespace)
+    df.columns = df.columns.str.lower().str.strip()
+
+    # Rename columns to standard names
+    for standard_name, possible_names in COLUMN_MAPPINGS.items():
+        for col_name in possible_names:
+            if col_name in df.columns:
+                df = df.rename(columns={col_name: standard_name})
+                break
+
+    # Handle amount calculation from debit/credit columns
+    if "amount" not in df.columns:
+        if "debit" in df.columns or "credit" in df.columns:
+            df["debit"] = pd.to_numeric(df.get("debit", 0), errors="coerce").fillna(0)
+            df["credit"] = pd.to_numeric(df.get("credit", 0), errors="coerce").fillna(0)
+            df["amount"] = df["credit"] - df["debit"]  # positive = income, negative = expense
+
+    # Clean and convert amount to float
+    if "amount" in df.columns:
+        # Remove currency symbols and commas
+        df["amount"] = df["amount"].astype(str).str.replace(r"[₹$,\s]", "", regex=True)
+        df["amount"] = pd.to_numeric(df["amount"], errors="coerce").fillna(0)
+
+    # Add category based on description
+    if "description" in df.columns:
+        df["category"] = categorize_transactions(df["description"])
+    else:
+        df["category"] = "Misc"
+
+    # Determine transaction type (Debit/Credit) if not present
+    if "type" not in df.columns and "amount" in df.columns:
+        df["type"] = np.where(df["amount"] > 0, "Credit", "Debit")
+
+    # Round float columns and turn NaN into None without a per-cell loop
+    float_columns = df.select_dtypes(include="float").columns
+    if len(float_columns):
+        df[float_columns] = df[float_columns].round(2)
+    df = df.astype(object).where(df.notna(), None)
+
+    return df.to_dict(orient="records")
+
+
+def _verify_stream_identity(source: BinaryIO, user_full_name: str) -> None:
+    """Run identity verification on the start of a file object, then rewind it."""
+    header_bytes = source.read(2048)
+    source.seek(0)
+    verify_identity_in_file(header_bytes, user_full_name)
+
+
+def iter_bank_statement_chunks(
+    source: Union[bytes, BinaryIO],
+    user_full_name: Optional[str] = None,
+    chunksize: int = BANK_STATEMENT_CHUNK_ROWS
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Stream a bank statement CSV as lists of cleaned, categorized transactions.
+
+    Only one chunk of rows is held in memory at a time, so callers can start
+    saving transactions before the whole file has been parsed.
+
+    Args:
+        source: Raw CSV bytes or a binary file object (e.g. UploadFile.file)
+        user_full_name: Optional user's full name for identity verification
+        chunksize: Rows per yielded chunk
+
+    Yields:
+        Lists of at most chunksize transaction dictionaries
+
+    Raises:
+        ValueError: If identity verification fails or parsing errors occur
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    # Step 1: Identity Verification (if user name provided)
+    if user_full_name:
+        _verify_stream_identity(source, user_full_name)
+
+    # Step 2: Parse CSV chunk by chunk
+    try:
+        with pd.read_csv(source, chunksize=max(1, chunksize)) as reader:
+            for df in reader:
+                yield _clean_transactions_frame(df)
+
+    except pd.errors.EmptyDataError:
+        raise ValueError("The CSV file is empty")
+    except pd.errors.ParserError as e:
+        raise ValueError(f"CSV parsing error: {e}")
+    except Exception as e:
+        raise ValueError(f"Error parsing bank statement: {e}")
+
+
+# ============ Parallel Parsing ============
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """Create the parser process pool on first use."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # spawn: forking a process that runs threads (event loop, executors) is unsafe
+            _process_pool = ProcessPoolExecutor(
+                max_workers=max(1, PARSER_PROCESSES),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_pool
+
+
+def _parse_csv_block(header: bytes, body: bytes, overrides: Dict[str, str]) -> List[Dict[str, Any]]:
+    """
+    Parse one block of CSV rows in a worker process.
+
+    Args:
+        header: The file's header line
+        body: Complete CSV records (cut on a line boundary outside quotes)
+        overrides: The parent's merchant category corrections
+    """
+    merchant_cache.replace_overrides(overrides)
+    try:
+        df = pd.read_csv(io.BytesIO(header + body))
+        return _clean_transactions_frame(df)
+    except pd.errors.ParserError as e:
+        raise ValueError(f"CSV parsing error: {e}")
+    except Exception as e:
+        raise ValueError(f"Error parsing bank statement: {e}")
+
+
+def _last_record_boundary(buffer: bytes) -> int:
+    """
+    Offset just past the last newline in buffer that ends a CSV record.
+
+    A newline inside a quoted field has an odd number of quote characters
+    before it (escaped quotes come in pairs), so it is skipped. buffer must
+    start at a record boundary. Returns 0 if no complete record is found.
+    """
+    newline = buffer.rfind(b"\n")
+    while newline != -1:
+        if buffer.count(b'"', 0, newline) % 2 == 0:
+            return newline + 1
+        newline = buffer.rfind(b"\n", 0, newline)
+    return 0
+
+
+async def iter_bank_statement_blocks(
+    source: Union[bytes, BinaryIO],
+    user_full_name: Optional[str] = None,
+    block_bytes: int = PARALLEL_PARSE_BLOCK_BYTES,
+    max_in_flight: Optional[int] = None
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Parse a bank statement CSV across processes, yielding blocks in file order.
+
+    The file is read in block_bytes pieces, each cut on the last record
+    boundary, and every block is parsed in the process pool. At most
+    max_in_flight blocks are pending at once, so memory stays bounded.
+
+    Args:
+        source: Raw CSV bytes or a binary file object
+        user_full_name: Optional user's full name for identity verification
+        block_bytes: Approximate bytes per block
+        max_in_flight: Pending block limit (default: twice the pool size)
+
+    Yields:
+        Lists of cleaned, categorized transactions, one per block
+
+    Raises:
+        ValueError: If identity verification fails or parsing errors occur
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    if user_full_name:
+        _verify_stream_identity(source, user_full_name)
+
+    header = source.readline()
+    if not header.strip():
+        raise ValueError("The CSV file is empty")
+    if not header.endswith(b"\n"):
+        header += b"\n"
+
+    loop = asyncio.get_running_loop()
+    pool = _get_process_pool()
+    overrides = merchant_cache.overrides()
+    limit = max_in_flight or 2 * max(1, PARSER_PROCESSES)
+    pending: deque = deque()
+    carry = b""
+
+    try:
+        while True:
+            data = await asyncio.to_thread(source.read, max(1, block_bytes))
+            buffer = carry + data
+            if data:
+                cut = _last_record_boundary(buffer)
+                block, carry = buffer[:cut], buffer[cut:]
+            else:
+                block, carry = buffer, b""
+
+            if block.strip():
+                pending.append(loop.run_in_executor(pool, _parse_csv_block, header, block, overrides))
+
+            # Yield finished blocks in order once enough are queued
+            while pending and (len(pending) >= limit or not data):
+                yield await pending.popleft()
+
+            if not data:
+                break
+    finally:
+        for future in pending:
+            future.cancel()
+
+
 def parse_bank_statement_csv(
     file_content: bytes,
     user_full_name: Optional[str] = None
@@ -176,68 +627,7 @@ def parse_bank_statement_csv(
     try:
         # Read CSV from bytes
         df = pd.read_csv(io.BytesIO(file_content))
-
-        # Standardize column names (lowercase and strip whitespace)
-        df.columns = df.columns.str.lower().str.strip()
-
-        # Common column mappings
-        column_mappings = {
-            "date": ["date", "transaction_date", "txn_date", "value_date", "posting_date"],
-            "description": ["description", "narration", "particulars", "remarks", "details", "transaction_details"],
-            "amount": ["amount", "transaction_amount", "txn_amount", "value"],
-            "type": ["type", "transaction_type", "txn_type", "dr/cr", "debit/credit"],
-            "debit": ["debit", "withdrawal", "dr", "debit_amount"],
-            "credit": ["credit", "deposit", "cr", "credit_amount"],
-            "balance": ["balance", "closing_balance", "available_balance", "running_balance"]
-        }
-
-        # Rename columns to standard names
-        for standard_name, possible_names in column_mappings.items():
-            for col_name in possible_names:
-                if col_name in df.columns:
-                    df = df.rename(columns={col_name: standard_name})
-                    break
-
-        # Handle amount calculation from debit/credit columns
-        if "amount" not in df.columns:
-            if "debit" in df.columns or "credit" in df.columns:
-                df["debit"] = pd.to_numeric(df.get("debit", 0), errors="coerce").fillna(0)
-                df["credit"] = pd.to_numeric(df.get("credit", 0), errors="coerce").fillna(0)
-                df["amount"] = df["credit"] - df["debit"]  # positive = income, negative = expense
-
-        # Clean and convert amount to float
-        if "amount" in df.columns:
-            # Remove currency symbols and commas
-            df["amount"] = df["amount"].astype(str).str.replace(r"[₹$,\s]", "", regex=True)
-            df["amount"] = pd.to_numeric(df["amount"], errors="coerce").fillna(0)
-
-        # Add category based on description
-        if "description" in df.columns:
-            df["category"] = df["description"].apply(categorize_transaction)
-        else:
-            df["category"] = "Misc"
-
-        # Determine transaction type (Debit/Credit) if not present
-        if "type" not in df.columns and "amount" in df.columns:
-            df["type"] = df["amount"].apply(lambda x: "Credit" if x > 0 else "Debit")
-
-        # Convert to list of dictionaries
-        transactions = df.to_dict(orient="records")
-
-        # Clean up NaN values and format data
-        cleaned_transactions = []
-        for txn in transactions:
-            cleaned_txn = {}
-            for key, value in txn.items():
-                if pd.isna(value):
-                    cleaned_txn[key] = None
-                elif isinstance(value, float):
-                    cleaned_txn[key] = round(value, 2)
-                else:
-                    cleaned_txn[key] = value
-            cleaned_transactions.append(cleaned_txn)
-
-        return cleaned_transactions
+        return _clean_transactions_frame(df)
 
     except pd.errors.EmptyDataError:
         raise ValueError("The CSV file is empty")
@@ -285,7 +675,7 @@ Rules:
 - Return ONLY the JSON object, no additional text or explanation."""
 
         # Generate response using Gemini
-        response = gemini_model.generate_content([prompt, image_part])
+        response = await call_model(gemini_model, [prompt, image_part])
 
         # Parse the response
         response_text = response.text.strip()
@@ -373,7 +763,7 @@ async def transcribe_audio(file_content: bytes, mime_type: str) -> str:
         prompt = "Transcribe this audio file exactly as spoken. Return only the transcribed text, no additional commentary or formatting."
         
         # Generate transcription using Gemini
-        response = gemini_model.generate_content([prompt, audio_part])
+        response = await call_model(gemini_model, [prompt, audio_part])
         
         if not response or not response.text:
             raise ValueError("Empty response from Gemini - audio may be too short or unclear")
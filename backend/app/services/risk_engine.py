@@ -4,15 +4,58 @@ Calculates risk scores for loan applications using EMI and DTI metrics.
 Uses Decimal for precise currency calculations.
 """
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Sequence
 from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+
+import numpy as np
+
+
+# Interest rate used for every new loan application (% per annum)
+DEFAULT_ANNUAL_RATE = 12.0
+
+# Longest tenure accepted by LoanCreate / LoanApplication
+MAX_TENURE_MONTHS = 360
+
+
+@lru_cache(maxsize=4096)
+def annuity_factor(annual_rate: float, tenure_months: int) -> Decimal:
+    """
+    Exact Decimal annuity factor: the EMI payable per unit of principal.
+    
+    factor = r * (1 + r)^n / ((1 + r)^n - 1), or 1 / n when r is zero
+    
+    Results are memoized per (annual_rate, tenure_months), and the whole
+    1-360 month range at the default rate is precomputed at import, so
+    calculate_emi is a single Decimal multiply on the hot path.
+    
+    Args:
+        annual_rate: Annual interest rate in percent
+        tenure_months: Loan tenure in months (must be positive)
+    
+    Returns:
+        Annuity factor as a Decimal
+    """
+    r = Decimal(str(annual_rate)) / Decimal("1200")  # Monthly rate as decimal
+    n = tenure_months
+
+    if r == 0:
+        return Decimal(1) / Decimal(n)
+
+    growth = (1 + r) ** n
+    return r * growth / (growth - 1)
+
+
+# Precompute the table for the rate every application uses
+for _tenure in range(1, MAX_TENURE_MONTHS + 1):
+    annuity_factor(DEFAULT_ANNUAL_RATE, _tenure)
 
 
 def calculate_emi(principal: float, tenure_months: int, annual_rate: float = 12.0) -> float:
     """
     Calculate EMI using standard formula with Decimal precision.
     
-    EMI = P * r * (1 + r)^n / ((1 + r)^n - 1)
+    EMI = P * r * (1 + r)^n / ((1 + r)^n - 1) = P * annuity_factor(rate, n)
     
     Args:
         principal: Loan principal amount
@@ -27,21 +70,81 @@ def calculate_emi(principal: float, tenure_months: int, annual_rate: float = 12.
     
     # SECURITY: Use Decimal for precise currency calculations
     P = Decimal(str(principal))
-    r = Decimal(str(annual_rate)) / Decimal("1200")  # Monthly rate as decimal
-    n = tenure_months
     
-    if r == 0:
-        emi = P / Decimal(str(n))
+    if annual_rate == 0:
+        # Divide directly so exact half-paisa results still round up
+        emi = P / Decimal(str(tenure_months))
     else:
-        # EMI formula: P * r * (1 + r)^n / ((1 + r)^n - 1)
-        factor = (1 + r) ** n
-        emi = P * r * factor / (factor - 1)
+        emi = P * annuity_factor(annual_rate, tenure_months)
     
     # Round to 2 decimal places using banker's rounding
     emi_rounded = float(emi.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
     return emi_rounded
 
 
+def generate_amortization_schedule(
+    principal: float,
+    tenure_months: int,
+    annual_rate: float = DEFAULT_ANNUAL_RATE
+) -> Dict[str, Any]:
+    """
+    Build a month-by-month amortization schedule with exact Decimal arithmetic.
+    
+    Each month's interest is charged on the outstanding balance and rounded
+    half-up to paise; the rest of the EMI repays principal. The final
+    instalment is adjusted so the balance closes at exactly zero.
+    
+    Args:
+        principal: Loan principal amount
+        tenure_months: Loan tenure in months
+        annual_rate: Annual interest rate (default 12%)
+    
+    Returns:
+        Dict with loan_amount, tenure_months, interest_rate, emi, total_payment,
+        total_interest and a schedule list of month, emi, principal, interest, balance
+    """
+    emi = calculate_emi(principal, tenure_months, annual_rate)
+    schedule: List[Dict[str, Any]] = []
+
+    if emi > 0:
+        cent = Decimal("0.01")
+        monthly_rate = Decimal(str(annual_rate)) / Decimal("1200")
+        balance = Decimal(str(principal)).quantize(cent, rounding=ROUND_HALF_UP)
+        emi_d = Decimal(str(emi))
+
+        for month in range(1, tenure_months + 1):
+            interest = (balance * monthly_rate).quantize(cent, rounding=ROUND_HALF_UP)
+            if month == tenure_months or emi_d - interest >= balance:
+                principal_part = balance
+            else:
+                principal_part = emi_d - interest
+            balance -= principal_part
+
+            schedule.append({
+                "month": month,
+                "emi": float(principal_part + interest),
+                "principal": float(principal_part),
+                "interest": float(interest),
+                "balance": float(balance)
+            })
+
+            if balance == 0:
+                break
+
+    total_payment = sum(Decimal(str(row["emi"])) for row in schedule)
+    total_interest = sum(Decimal(str(row["interest"])) for row in schedule)
+
+    return {
+        "loan_amount": principal,
+        "tenure_months": tenure_months,
+        "interest_rate": annual_rate,
+        "emi": emi,
+        "total_payment": float(total_payment),
+        "total_interest": float(total_interest),
+        "schedule": schedule
+    }
+
+
 def calculate_risk_score(
     amount: float,
     tenure_months: int,
@@ -85,7 +188,7 @@ def calculate_risk_score(
         }
     
     # Calculate EMI for new loan using proper formula (12% annual interest)
-    new_emi = calculate_emi(principal=amount, tenure_months=tenure_months, annual_rate=12.0)
+    new_emi = calculate_emi(principal=amount, tenure_months=tenure_months, annual_rate=DEFAULT_ANNUAL_RATE)
     
     # Total EMI burden = new loan EMI + existing approved loan EMIs
     total_emi = new_emi + existing_emi
@@ -176,3 +279,100 @@ def calculate_risk_score(
         "emi": new_emi,
         "reasons": reasons
     }
+
+
+def calculate_risk_scores_batch(
+    amounts: Sequence[float],
+    tenure_months: Sequence[int],
+    incomes: Sequence[float],
+    expenses: Sequence[float],
+    existing_emis: Optional[Sequence[float]] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Score many loan applications in one vectorized pass.
+    
+    Applies exactly the same rules as calculate_risk_score to columnar
+    inputs, so every row gets the same score, status and EMI the scalar
+    function would return. Reasons are not generated in batch mode.
+    
+    EMIs are computed in float64 from the cached annuity factors and
+    rounded half-up to paise. Rows whose
+    unrounded EMI lies too close to a half-paisa boundary for float64 to
+    decide the rounding are recomputed with the Decimal calculate_emi.
+    
+    Args:
+        amounts: Loan principal amounts
+        tenure_months: Loan tenures in months
+        incomes: Monthly incomes
+        expenses: Monthly expenses
+        existing_emis: Optional EMIs from existing approved loans (default 0)
+    
+    Returns:
+        Dict with "score" (float64), "status" (str) and "emi" (float64) arrays
+    
+    Raises:
+        ValueError: If the input columns have different lengths
+    """
+    amount = np.asarray(amounts, dtype=np.float64)
+    tenure = np.asarray(tenure_months, dtype=np.int64)
+    income = np.asarray(incomes, dtype=np.float64)
+    expense = np.asarray(expenses, dtype=np.float64)
+    if existing_emis is None:
+        existing = np.zeros_like(amount)
+    else:
+        existing = np.asarray(existing_emis, dtype=np.float64)
+
+    n = amount.shape[0]
+    if any(col.shape != (n,) for col in (tenure, income, expense, existing)):
+        raise ValueError("All input columns must be one-dimensional and of equal length")
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        # ---- EMI at the default rate (same factors as calculate_emi) ----
+        valid_loan = (amount > 0) & (tenure > 0)
+        unique_tenures, tenure_index = np.unique(np.where(valid_loan, tenure, 1), return_inverse=True)
+        factors = np.array(
+            [float(annuity_factor(DEFAULT_ANNUAL_RATE, int(t))) for t in unique_tenures],
+            dtype=np.float64
+        )
+        raw_emi = np.where(valid_loan, amount * factors[tenure_index], 0.0)
+
+        # Half-up rounding to 2 decimals, falling back to Decimal near ties
+        cents = raw_emi * 100
+        fraction = cents - np.floor(cents)
+        ambiguous = valid_loan & (np.abs(fraction - 0.5) <= 1e-6 + np.abs(cents) * 1e-12)
+        new_emi = np.floor(cents + 0.5) / 100
+        for i in np.flatnonzero(ambiguous):
+            new_emi[i] = calculate_emi(float(amount[i]), int(tenure[i]), DEFAULT_ANNUAL_RATE)
+
+        # ---- Ratios ----
+        total_emi = new_emi + existing
+        dti_ratio = total_emi / income
+        expense_ratio = expense / income
+        disposable_income = income - expense
+        emi_to_disposable = total_emi / disposable_income
+
+        # ---- Scoring rules ----
+        score = np.zeros(n, dtype=np.float64)
+        has_disposable = disposable_income > 0
+        score += np.where(
+            has_disposable & (emi_to_disposable > 0.70), 40.0,
+            np.where(has_disposable & (emi_to_disposable > 0.50), 25.0, 0.0)
+        )
+        score += np.where(dti_ratio > 0.60, 50.0, np.where(dti_ratio > 0.40, 30.0, 0.0))
+        score += np.where(expense_ratio > 0.70, 20.0, 0.0)
+        score = np.where((dti_ratio > 0.50) & (expense_ratio > 0.80), score * 1.5, score)
+        score = np.round(np.minimum(100.0, score), 2)
+
+    # ---- Hard rejections override the rule-based score ----
+    invalid_income = income <= 0
+    unaffordable = ~invalid_income & ((total_emi + expense) > income)
+    score[invalid_income | unaffordable] = 100.0
+    new_emi[invalid_income] = 0.0
+
+    status = np.where(score > 50, "REJECTED", "APPROVED")
+
+    return {
+        "score": score,
+        "status": status,
+        "emi": new_emi
+    }
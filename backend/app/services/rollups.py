@@ -0,0 +1,224 @@
+"""
+Spending rollup service for RISKOFF API.
+Keeps per-user, per-category, per-month spending and income totals up to
+date as transactions are saved, so analytics and the dashboard read a small
+summary instead of scanning every transaction (see sql/spending_rollups.sql).
+"""
+
+import re
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from app.config import supabase_client
+
+# Month bucket for transactions without a usable date
+UNKNOWN_MONTH = "unknown"
+
+# Same rules as spending_month() in sql/spending_rollups.sql
+_ISO_MONTH = re.compile(r"^(\d{4})-(\d{2})")
+_DAY_FIRST_MONTH = re.compile(r"^\d{1,2}[/-](\d{1,2})[/-](\d{4})")
+
+# (category, month) -> {"total_spent": float, "txn_count": int,
+#                       "total_income": float, "income_count": int}
+SpendingDeltas = Dict[Tuple[str, str], Dict[str, float]]
+
+
+def month_key(value: Any) -> str:
+    """
+    Month bucket (YYYY-MM) for a transaction date.
+
+    Accepts ISO dates and the day-first D/M/YYYY dates used by Indian bank
+    statements; anything else is bucketed as UNKNOWN_MONTH.
+    """
+    text = str(value or "").strip()
+    match = _ISO_MONTH.match(text)
+    if match:
+        return f"{match.group(1)}-{match.group(2)}"
+    match = _DAY_FIRST_MONTH.match(text)
+    if match:
+        return f"{match.group(2)}-{int(match.group(1)):02d}"
+    return UNKNOWN_MONTH
+
+
+def is_spend(txn: Dict[str, Any]) -> bool:
+    """Whether a transaction counts as spending (a debit or a negative amount)."""
+    txn_type = txn.get("type") or txn.get("transaction_type")
+    try:
+        amount = float(txn.get("amount") or 0)
+    except (TypeError, ValueError):
+        return False
+    return txn_type == "Debit" or (txn_type is None and amount < 0)
+
+
+def is_income(txn: Dict[str, Any]) -> bool:
+    """Whether a transaction counts as income (a credit or a positive amount)."""
+    txn_type = txn.get("type") or txn.get("transaction_type")
+    try:
+        amount = float(txn.get("amount") or 0)
+    except (TypeError, ValueError):
+        return False
+    return txn_type == "Credit" or (txn_type is None and amount > 0)
+
+
+def spending_deltas(
+    rows: Iterable[Dict[str, Any]],
+    deltas: Optional[SpendingDeltas] = None
+) -> SpendingDeltas:
+    """
+    Add the spending and income in saved transaction rows to a deltas dict.
+
+    Args:
+        rows: Transaction rows as stored (amount, category, transaction_date,
+            transaction_type)
+        deltas: Existing deltas to add to, updated in place
+
+    Returns:
+        The deltas dict
+    """
+    deltas = {} if deltas is None else deltas
+    for txn in rows:
+        if is_spend(txn):
+            total, count = "total_spent", "txn_count"
+        elif is_income(txn):
+            total, count = "total_income", "income_count"
+        else:
+            continue
+        category = txn.get("category") or "Uncategorized"
+        month = month_key(txn.get("transaction_date") or txn.get("date"))
+        entry = deltas.setdefault((category, month), {
+            "total_spent": 0.0, "txn_count": 0, "total_income": 0.0, "income_count": 0
+        })
+        entry[total] += abs(float(txn.get("amount") or 0))
+        entry[count] += 1
+    return deltas
+
+
+def record_spending(user_id: str, deltas: SpendingDeltas) -> bool:
+    """
+    Add spending deltas to a user's rollup.
+
+    Increments are applied atomically in the database. If they cannot be
+    applied, the user's rollup is rebuilt from their transactions so it
+    does not drift.
+
+    Returns:
+        True if the rollup was updated
+    """
+    if not deltas or not supabase_client:
+        return False
+
+    payload = [
+        {
+            "category": category,
+            "month": month,
+            "total_spent": round(entry.get("total_spent", 0), 2),
+            "txn_count": entry.get("txn_count", 0),
+            "total_income": round(entry.get("total_income", 0), 2),
+            "income_count": entry.get("income_count", 0)
+        }
+        for (category, month), entry in deltas.items()
+    ]
+    try:
+        supabase_client.rpc("increment_spending_rollups", {
+            "p_user_id": user_id,
+            "p_deltas": payload
+        }).execute()
+        return True
+    except Exception as e:
+        print(f"⚠️ Spending rollup increment failed, rebuilding: {e}")
+
+    try:
+        supabase_client.rpc("rebuild_spending_rollups", {"p_user_id": user_id}).execute()
+        return True
+    except Exception as e:
+        print(f"⚠️ Spending rollup rebuild failed: {e}")
+        return False
+
+
+def get_spending_rollup(user_id: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Fetch a user's rollup rows (category, month, total_spent, txn_count).
+
+    Returns:
+        Rollup rows, or None when the rollup table is unavailable
+    """
+    try:
+        response = supabase_client.table("spending_rollups").select(
+            "category, month, total_spent, txn_count"
+        ).eq("user_id", user_id).execute()
+        return response.data or []
+    except Exception as e:
+        print(f"⚠️ Spending rollup unavailable: {e}")
+        return None
+
+
+def summarize_spending(rows: List[Dict[str, Any]]) -> Tuple[float, Dict[str, float]]:
+    """
+    Total spend and per-category totals from rollup rows.
+
+    Returns:
+        Tuple of (total_spent, {category: amount}), amounts rounded to 2dp
+    """
+    category_totals: Dict[str, float] = {}
+    for row in rows:
+        if not row.get("txn_count") and not row.get("total_spent"):
+            continue  # income-only row
+        category = row.get("category") or "Uncategorized"
+        category_totals[category] = category_totals.get(category, 0) + float(row.get("total_spent") or 0)
+    category_totals = {category: round(total, 2) for category, total in category_totals.items()}
+    return round(sum(category_totals.values()), 2), category_totals
+
+
+def first_month(months: int, today: Optional[date] = None) -> str:
+    """First month (YYYY-MM) of the window of `months` months ending this month."""
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - (max(1, months) - 1)
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def summarize_cashflow(
+    rows: List[Dict[str, Any]]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Monthly income/expense series and category breakdown from rollup rows.
+
+    Months between the first and last dated month are all listed, with
+    zeros where there was no activity; undated rows are left out.
+
+    Returns:
+        Tuple of ([{month, income, expenses}, ...] oldest first,
+        [{category, amount}, ...] largest spend first), amounts rounded to 2dp
+    """
+    monthly: Dict[str, Dict[str, float]] = {}
+    categories: Dict[str, float] = {}
+    for row in rows:
+        month = row.get("month")
+        if not month or month == UNKNOWN_MONTH:
+            continue
+        spent = float(row.get("total_spent") or 0)
+        entry = monthly.setdefault(month, {"income": 0.0, "expenses": 0.0})
+        entry["income"] += float(row.get("total_income") or 0)
+        entry["expenses"] += spent
+        if spent:
+            category = row.get("category") or "Uncategorized"
+            categories[category] = categories.get(category, 0) + spent
+
+    series = []
+    if monthly:
+        start, end = min(monthly), max(monthly)
+        index = int(start[:4]) * 12 + int(start[5:7]) - 1
+        last = int(end[:4]) * 12 + int(end[5:7]) - 1
+        while index <= last:
+            month = f"{index // 12:04d}-{index % 12 + 1:02d}"
+            entry = monthly.get(month, {"income": 0.0, "expenses": 0.0})
+            series.append({
+                "month": month,
+                "income": round(entry["income"], 2),
+                "expenses": round(entry["expenses"], 2)
+            })
+            index += 1
+
+    breakdown = [
+        {"category": category, "amount": round(amount, 2)}
+        for category, amount in sorted(categories.items(), key=lambda item: item[1], reverse=True)
+    ]
+    return series, breakdown
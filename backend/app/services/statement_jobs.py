@@ -0,0 +1,261 @@
+"""
+Statement job service for RISKOFF API.
+Processes uploaded bank statements in the background so the upload request
+returns immediately. Progress is tracked on bank_statements and in-process.
+"""
+
+import asyncio
+import os
+import shutil
+import socket
+import weakref
+from datetime import datetime, timedelta, timezone
+from typing import Any, BinaryIO, Dict, List, Optional
+from app.config import (
+    supabase_client,
+    STATEMENT_JOB_WORKERS,
+    STATEMENT_UPLOAD_DIR,
+    STATEMENT_JOB_STALE_MINUTES
+)
+from app.services.ingestion import ingest_statement, mark_statement_failed, statement_error
+from app.utils.cache import TTLCache
+from app.utils import db
+
+# Latest progress per statement in this worker (survives briefly after completion)
+_job_progress = TTLCache(maxsize=1024, ttl=3600)
+
+# One job queue and worker pool per event loop
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+
+
+INTERRUPTED_ERROR = "Processing was interrupted by a server restart. Please upload the statement again."
+STALE_ERROR = (
+    "Processing did not finish, most likely because the server restarted during the upload. "
+    "Please upload the statement again."
+)
+
+# Claims record the host as well as the pid: liveness can only be checked
+# for processes on this host when STATEMENT_UPLOAD_DIR is shared
+_HOST = socket.gethostname().replace(".", "_")
+
+
+def store_upload(source: BinaryIO, user_id: str, statement_id: Any) -> str:
+    """
+    Copy an uploaded file to STATEMENT_UPLOAD_DIR without loading it in memory.
+    Blocking; call it through asyncio.to_thread from request handlers.
+    
+    The file is named after the statement so queued jobs can be resumed
+    after a restart (see recover_jobs).
+    
+    Returns:
+        Path of the stored file
+    """
+    directory = os.path.join(STATEMENT_UPLOAD_DIR, str(user_id))
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{statement_id}.csv")
+    source.seek(0)
+    with open(path, "wb") as target:
+        shutil.copyfileobj(source, target)
+    return path
+
+
+def _get_pool() -> Dict[str, Any]:
+    """Start (once per event loop) the queue and its worker tasks."""
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        queue: asyncio.Queue = asyncio.Queue()
+        workers: List[asyncio.Task] = [
+            loop.create_task(_worker(queue)) for _ in range(max(1, STATEMENT_JOB_WORKERS))
+        ]
+        pool = {"queue": queue, "workers": workers}
+        _pools[loop] = pool
+    return pool
+
+
+def submit_statement_job(
+    statement_id: Any,
+    path: str,
+    user_id: str,
+    user_full_name: Optional[str] = None
+) -> None:
+    """Queue a stored statement file for processing."""
+    _job_progress.set(str(statement_id), {
+        "status": "queued",
+        "transactions_parsed": 0
+    })
+    _get_pool()["queue"].put_nowait((statement_id, path, user_id, user_full_name))
+
+
+def get_job_progress(statement_id: Any) -> Optional[Dict[str, Any]]:
+    """In-process progress for a statement, if this worker ran it recently."""
+    progress = _job_progress.get(str(statement_id))
+    return dict(progress) if progress is not None else None
+
+
+async def _worker(queue: asyncio.Queue) -> None:
+    while True:
+        job = await queue.get()
+        try:
+            await _run_job(*job)
+        except Exception as e:
+            print(f"⚠️ Statement job crashed: {e}")
+        finally:
+            queue.task_done()
+
+
+def _claim(path: str) -> Optional[str]:
+    """
+    Rename a queued file to <path>.<host>.<pid>.running so only one process
+    runs it and recovery can tell started jobs from queued ones.
+    
+    Returns:
+        The claimed path, or None if another process already took the file
+    """
+    running_path = f"{path}.{_HOST}.{os.getpid()}.running"
+    try:
+        os.rename(path, running_path)
+    except FileNotFoundError:
+        return None
+    return running_path
+
+
+def _claim_alive(host: str, pid: str) -> bool:
+    """Whether the process holding a claim may still be running."""
+    if host != _HOST or not pid.isdigit():
+        return True  # Another host's process cannot be checked from here
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+async def _run_job(statement_id: Any, path: str, user_id: str, user_full_name: Optional[str]) -> None:
+    key = str(statement_id)
+    path = _claim(path)
+    if path is None:
+        return
+    progress = _job_progress.get(key) or {}
+    progress["status"] = "processing"
+    _job_progress.set(key, progress)
+    
+    try:
+        try:
+            source = open(path, "rb")
+        except OSError as e:
+            progress.update({"status": "failed", "error": str(e)})
+            await mark_statement_failed(statement_id, str(e))
+            return
+        
+        # ingest_statement records failures on the statement itself
+        with source:
+            result = await ingest_statement(source, user_id, user_full_name, statement_id, progress)
+        progress.update({
+            "status": result["status"],
+            "transactions_saved": result["transactions_saved"],
+            "transactions_failed": result["transactions_failed"],
+            "transactions_duplicate": result["transactions_duplicate"]
+        })
+        if result.get("error"):
+            progress["error"] = result["error"]
+    except Exception as e:
+        progress.update({"status": "failed", "error": statement_error(e)})
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _scan_upload_dir() -> Dict[str, List[Any]]:
+    """
+    Sort leftover files in STATEMENT_UPLOAD_DIR into jobs that never started,
+    jobs a live process is running and jobs whose process died mid-run.
+    
+    Returns:
+        Dict with "queued" as (statement_id, path, user_id) tuples,
+        "running" as statement ids and "interrupted" as (statement_id, path)
+        tuples
+    """
+    found: Dict[str, List[Any]] = {"queued": [], "running": [], "interrupted": []}
+    if not os.path.isdir(STATEMENT_UPLOAD_DIR):
+        return found
+    
+    for user_id in os.listdir(STATEMENT_UPLOAD_DIR):
+        directory = os.path.join(STATEMENT_UPLOAD_DIR, user_id)
+        if not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith(".csv"):
+                found["queued"].append((name[:-len(".csv")], path, user_id))
+            elif name.endswith(".running"):
+                # <statement_id>.csv.<host>.<pid>.running
+                statement_id, _, rest = name.partition(".csv.")
+                host, _, pid = rest[:-len(".running")].rpartition(".")
+                if _claim_alive(host, pid):
+                    found["running"].append(statement_id)
+                else:
+                    found["interrupted"].append((statement_id, path))
+    return found
+
+
+async def recover_jobs() -> Dict[str, int]:
+    """
+    Resume or fail statement jobs left behind by a previous process.
+    Called once on startup.
+    
+    Queued files are re-submitted (identity was already checked when they
+    were uploaded). Jobs that were cut off mid-run are marked failed, since
+    part of the statement may already be saved. Jobs claimed by a live
+    process, here or on another host, are left alone. Statements still
+    "processing" after STATEMENT_JOB_STALE_MINUTES with no file left, such
+    as synchronous uploads cut off by a restart, are marked failed too.
+    
+    Returns:
+        Counts of requeued and failed statements
+    """
+    summary = {"requeued": 0, "failed": 0}
+    if not supabase_client:
+        return summary
+    
+    try:
+        found = await asyncio.to_thread(_scan_upload_dir)
+    except OSError as e:
+        print(f"⚠️ Could not scan statement upload dir: {e}")
+        return summary
+    
+    # Statements with a file in the spool are handled here, not by the sweep
+    accounted = set(found["running"])
+    for statement_id, path, user_id in found["queued"]:
+        submit_statement_job(statement_id, path, user_id)
+        accounted.add(statement_id)
+        summary["requeued"] += 1
+    
+    for statement_id, path in found["interrupted"]:
+        accounted.add(statement_id)
+        await mark_statement_failed(statement_id, INTERRUPTED_ERROR)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        summary["failed"] += 1
+    
+    cutoff = datetime.now(timezone.utc) - timedelta(minutes=STATEMENT_JOB_STALE_MINUTES)
+    try:
+        response = await db.execute(
+            supabase_client.table("bank_statements").select("id")
+            .eq("status", "processing").lt("created_at", cutoff.isoformat())
+        )
+        for row in response.data or []:
+            if str(row["id"]) in accounted:
+                continue
+            await mark_statement_failed(row["id"], STALE_ERROR)
+            summary["failed"] += 1
+    except Exception as e:
+        print(f"⚠️ Could not check for stale statement jobs: {e}")
+    
+    return summary
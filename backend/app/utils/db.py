@@ -0,0 +1,75 @@
+"""
+Database access layer for RISKOFF API.
+The Supabase client is synchronous, so every query is executed on a
+bounded thread pool instead of on the event loop. One slow round trip no
+longer stalls other requests, and up to DB_MAX_WORKERS queries per worker
+are in flight at once over the client's shared keep-alive connection pool.
+
+Usage:
+    response = await db.execute(supabase_client.table("loans").select("*"))
+    profile, loans = await db.gather(profile_query, loans_query)
+    role = await db.run(get_user_role, user_id)
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, TypeVar
+from app.config import DB_MAX_WORKERS, DB_QUERY_TIMEOUT_SECONDS
+
+T = TypeVar("T")
+
+_executor = ThreadPoolExecutor(max_workers=max(1, DB_MAX_WORKERS), thread_name_prefix="db")
+
+
+async def run(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run a blocking database call (auth, RPC, service helper) on the DB pool.
+
+    Args:
+        func: Callable that performs blocking I/O
+        *args, **kwargs: Arguments for func
+
+    Returns:
+        func's return value (exceptions propagate unchanged)
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+async def execute(query: Any) -> Any:
+    """
+    Execute a built Supabase query (table/rpc request builder) on the DB pool.
+
+    Args:
+        query: Query builder, e.g. supabase_client.table("loans").select("*")
+
+    Returns:
+        The query's APIResponse
+    """
+    return await run(query.execute)
+
+
+async def gather(*queries: Any, timeout: Optional[float] = DB_QUERY_TIMEOUT_SECONDS) -> List[Any]:
+    """
+    Execute independent queries concurrently.
+
+    The call takes as long as the slowest query rather than the sum. Each
+    query has its own timeout, and a query that fails or times out yields
+    its exception in place of a response, so callers can serve a partial
+    result.
+
+    Args:
+        *queries: Query builders
+        timeout: Seconds allowed per query (None for no limit)
+
+    Returns:
+        APIResponse or exception per query, in argument order
+    """
+    async def execute_with_timeout(query: Any) -> Any:
+        return await asyncio.wait_for(execute(query), timeout)
+
+    return await asyncio.gather(
+        *(execute_with_timeout(query) for query in queries),
+        return_exceptions=True
+    )
@@ -0,0 +1,164 @@
+"""
+Local JWT verification for RISKOFF API.
+Validates Supabase access tokens in-process using the project JWT secret
+(HS256) or the project's JWKS (asymmetric keys), refreshed in the background.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+import jwt
+
+from app.config import (
+    SUPABASE_URL,
+    SUPABASE_JWT_SECRET,
+    JWT_AUDIENCE,
+    JWKS_REFRESH_SECONDS,
+)
+from app.utils import db
+
+ASYMMETRIC_ALGORITHMS = {"RS256", "ES256", "EdDSA"}
+
+# Minimum gap between on-demand refreshes triggered by an unknown key ID
+_MIN_FORCED_REFRESH_SECONDS = 30.0
+
+
+class JWKSCache:
+    """
+    Signing keys fetched from a JWKS endpoint.
+
+    Keys are loaded on first use and refreshed by a daemon thread every
+    refresh_seconds, so request handling never waits on the network except
+    when a token carries a key ID that has not been seen yet. Those
+    on-demand fetches are limited to one per _MIN_FORCED_REFRESH_SECONDS,
+    however many unknown key IDs arrive.
+    """
+
+    def __init__(self, url: str, refresh_seconds: float = 600.0, timeout: float = 5.0):
+        self.url = url
+        self.refresh_seconds = refresh_seconds
+        self.timeout = timeout
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        self._lock = threading.Lock()
+        self._started = False
+        self._last_fetch = float("-inf")
+
+    def refresh(self) -> bool:
+        """Fetch the key set. Returns True on success; old keys are kept on failure."""
+        with self._lock:
+            self._last_fetch = time.monotonic()
+        return self._fetch()
+
+    def _claim_forced_refresh(self) -> bool:
+        """Reserve the next on-demand refresh, unless one ran too recently."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_fetch < _MIN_FORCED_REFRESH_SECONDS:
+                return False
+            self._last_fetch = now
+            return True
+
+    def _fetch(self) -> bool:
+        try:
+            response = httpx.get(self.url, timeout=self.timeout)
+            response.raise_for_status()
+            key_set = jwt.PyJWKSet.from_dict(response.json())
+            keys = {key.key_id: key for key in key_set.keys if key.key_id}
+        except Exception as e:
+            print(f"⚠️ JWKS refresh failed: {e}")
+            return False
+
+        with self._lock:
+            self._keys = keys
+        return True
+
+    def _refresh_loop(self) -> None:
+        while True:
+            time.sleep(self.refresh_seconds)
+            self.refresh()
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.refresh()
+        threading.Thread(target=self._refresh_loop, name="jwks-refresh", daemon=True).start()
+
+    def lookup(self, kid: Optional[str]) -> Optional[jwt.PyJWK]:
+        """Return an already-loaded key for a key ID, without any network access."""
+        with self._lock:
+            return self._keys.get(kid) if self._started else None
+
+    def get_key(self, kid: Optional[str]) -> Optional[jwt.PyJWK]:
+        """
+        Return the key for a key ID, or None if it is unknown.
+        Blocks on the network on first use and for unseen key IDs.
+        """
+        self._ensure_started()
+        with self._lock:
+            key = self._keys.get(kid)
+        if key is None and self._claim_forced_refresh():
+            # Key rotation: pick up the new key without waiting for the timer
+            self._fetch()
+            with self._lock:
+                key = self._keys.get(kid)
+        return key
+
+
+_jwks_cache = JWKSCache(
+    f"{SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json",
+    refresh_seconds=JWKS_REFRESH_SECONDS
+) if SUPABASE_URL else None
+
+
+async def verify_token(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Verify an access token's signature, expiry and audience locally.
+
+    Asymmetric tokens must name the algorithm of the JWKS key they point
+    at. Any key fetch runs on the DB pool, never on the event loop.
+
+    Args:
+        token: Encoded JWT from the Authorization header
+
+    Returns:
+        Decoded claims, or None when no signing key is available locally
+        (the caller should fall back to remote verification)
+
+    Raises:
+        jwt.ExpiredSignatureError: If the token has expired
+        jwt.InvalidTokenError: If the token is malformed, the signature is
+            wrong or the algorithm does not match the key
+    """
+    header = jwt.get_unverified_header(token)
+    algorithm = header.get("alg")
+
+    if algorithm == "HS256":
+        if not SUPABASE_JWT_SECRET:
+            return None
+        key = SUPABASE_JWT_SECRET
+    elif algorithm in ASYMMETRIC_ALGORITHMS:
+        if _jwks_cache is None:
+            return None
+        kid = header.get("kid")
+        jwk = _jwks_cache.lookup(kid) or await db.run(_jwks_cache.get_key, kid)
+        if jwk is None:
+            return None
+        if jwk.algorithm_name != algorithm:
+            raise jwt.InvalidAlgorithmError(
+                f"Token algorithm {algorithm} does not match key algorithm {jwk.algorithm_name}"
+            )
+        key = jwk.key
+    else:
+        raise jwt.InvalidAlgorithmError(f"Unsupported token algorithm: {algorithm}")
+
+    return jwt.decode(
+        token,
+        key,
+        algorithms=[algorithm],
+        audience=JWT_AUDIENCE,
+        options={"require": ["exp", "sub"]}
+    )
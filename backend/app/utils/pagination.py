@@ -0,0 +1,153 @@
+"""
+Keyset pagination utilities for RISKOFF API.
+List endpoints page on (created_at, id) newest first and accept an optional
+column projection, so each request reads one bounded slice of the table.
+Requests without cursor or page_size get the full, unpaged list, as before
+pagination was added, so existing clients keep seeing every row.
+"""
+
+import base64
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from fastapi import HTTPException, status
+from app.config import LIST_DEFAULT_PAGE_SIZE
+
+# Columns every page needs to build the next cursor
+CURSOR_FIELDS = ("id", "created_at")
+
+# Columns clients may request with ?fields=
+LOAN_FIELDS = (
+    "id", "user_id", "amount", "tenure_months", "interest_rate", "emi", "status",
+    "risk_score", "risk_category", "risk_reason", "ai_explanation", "admin_remarks",
+    "created_at",
+)
+GRIEVANCE_FIELDS = (
+    "id", "user_id", "grievance_type", "subject", "description", "status",
+    "admin_response", "created_at", "resolved_at",
+)
+
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """Build an opaque cursor pointing just after the given row."""
+    payload = json.dumps([row.get("created_at"), row.get("id")], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, Any]:
+    """
+    Decode a cursor produced by encode_cursor.
+    
+    Raises:
+        HTTPException: 400 if the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(created_at, str) or row_id is None:
+            raise ValueError("incomplete cursor")
+        return created_at, row_id
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+
+def select_fields(fields: Optional[str], allowed: Sequence[str]) -> str:
+    """
+    Build a select() clause from a comma-separated fields parameter.
+    
+    Args:
+        fields: Requested columns, or None for all columns
+        allowed: Columns clients may request
+        
+    Returns:
+        Column list for supabase select(), always including the cursor columns
+        
+    Raises:
+        HTTPException: 400 if an unknown column is requested
+    """
+    if not fields:
+        return "*"
+    
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {unknown}. Allowed: {list(allowed)}"
+        )
+    
+    columns = list(dict.fromkeys(list(CURSOR_FIELDS) + requested))
+    return ", ".join(columns)
+
+
+def page_limit(cursor: Optional[str], page_size: Optional[int]) -> Optional[int]:
+    """
+    Rows per page for a request, or None for the unpaged list (neither
+    cursor nor page_size given).
+    """
+    if page_size is None and not cursor:
+        return None
+    return page_size or LIST_DEFAULT_PAGE_SIZE
+
+
+def select_page(table: Any, columns: str, page_size: Optional[int], include_total: bool = False) -> Any:
+    """
+    select() for a list query. Paged requests ask for the exact total only
+    when include_total is set, since counting reads every matching row.
+    """
+    if page_size is None or not include_total:
+        return table.select(columns)
+    return table.select(columns, count="exact")
+
+
+def page_total(response: Any, rows: List[Dict[str, Any]], page_size: Optional[int]) -> Optional[int]:
+    """
+    Total matching rows: the row count for unpaged requests, the exact count
+    for paged ones that asked for it (see select_page), else None.
+    """
+    if page_size is None:
+        return len(rows)
+    count = getattr(response, "count", None)
+    return count if isinstance(count, int) else None
+
+
+def _quote(value: Any) -> str:
+    """Quote a value for a PostgREST or=() filter (timestamps contain ':' and '+')."""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def paginate(query: Any, cursor: Optional[str], page_size: Optional[int]) -> Any:
+    """
+    Apply newest-first keyset ordering, the cursor filter and the page limit.
+    
+    One extra row is requested so build_page can tell whether more remain.
+    With page_size None (see page_limit) only the ordering is applied.
+    """
+    query = query.order("created_at", desc=True).order("id", desc=True)
+    if page_size is None:
+        return query
+    
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.or_(
+            f"created_at.lt.{_quote(created_at)},"
+            f"and(created_at.eq.{_quote(created_at)},id.lt.{_quote(row_id)})"
+        )
+    
+    return query.limit(page_size + 1)
+
+
+def build_page(rows: Optional[List[Dict[str, Any]]], page_size: Optional[int]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Trim the look-ahead row and compute the next cursor.
+    
+    Returns:
+        (rows for this page, cursor for the next page or None on the last page)
+    """
+    rows = rows or []
+    if page_size is None or len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(rows[-1])
@@ -4,16 +4,64 @@ Provides JWT verification and user authentication via Supabase.
 """
 
 from typing import Optional
+import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
 
-from app.config import supabase_client
+from app.config import (
+    supabase_client,
+    JWT_VERIFICATION,
+    ROLE_CACHE_SIZE,
+    ROLE_CACHE_TTL_SECONDS,
+)
+from app.utils import db, jwt_verifier
+from app.utils.cache import TTLCache
 
 # OAuth2 scheme for token extraction from Authorization header
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login/form", auto_error=False)
 
 
+# profiles.role by user ID, shared by every auth dependency in this worker
+_role_cache = TTLCache(maxsize=ROLE_CACHE_SIZE, ttl=ROLE_CACHE_TTL_SECONDS)
+
+
+def get_user_role(user_id: str) -> Optional[str]:
+    """
+    Get a user's role from the profiles table, via the role cache.
+    
+    Args:
+        user_id: User ID
+        
+    Returns:
+        The role, or None if the user has no profile (not cached)
+        
+    Raises:
+        Exception: If the profiles query fails
+    """
+    role = _role_cache.get(user_id)
+    if role is not None:
+        return role
+    
+    profile_response = supabase_client.table("profiles").select("role").eq(
+        "id", user_id
+    ).execute()
+    if profile_response.data and profile_response.data[0].get("role"):
+        role = profile_response.data[0].get("role")
+        _role_cache.set(user_id, role)
+    return role
+
+
+def invalidate_user_role(user_id: Optional[str] = None) -> None:
+    """
+    Drop a cached role after it changes (or every cached role if user_id is None).
+    """
+    if user_id is None:
+        _role_cache.clear()
+    else:
+        _role_cache.invalidate(user_id)
+
+
 class CurrentUser(BaseModel):
     """Model representing the authenticated user."""
     id: str
@@ -29,7 +77,8 @@ async def get_current_user(
     """
     Dependency to get the current authenticated user.
     
-    Verifies the JWT token with Supabase and returns user details.
+    Verifies the JWT locally (signature, expiry, audience) when a signing key
+    is configured, otherwise with Supabase, and returns user details.
     SECURITY: Role is fetched from profiles table, not JWT metadata.
     
     Args:
@@ -48,6 +97,25 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Verify signature and expiry locally when a signing key is available
+    claims = None
+    if JWT_VERIFICATION == "local":
+        try:
+            claims = await jwt_verifier.verify_token(token)
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has expired",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        except (jwt.PyJWTError, TypeError, ValueError):
+            # TypeError/ValueError: key material PyJWT could not use for this token
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid or expired token",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+    
     if not supabase_client:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -55,28 +123,33 @@ async def get_current_user(
         )
     
     try:
-        # Verify token with Supabase
-        user_response = supabase_client.auth.get_user(token)
-        
-        if not user_response or not user_response.user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid or expired token",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        user = user_response.user
-        user_metadata = user.user_metadata or {}
+        if claims is not None:
+            user_id = claims["sub"]
+            email = claims.get("email", "")
+            user_metadata = claims.get("user_metadata") or {}
+        else:
+            # Fallback: verify token with Supabase
+            user_response = await db.run(supabase_client.auth.get_user, token)
+            
+            if not user_response or not user_response.user:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Invalid or expired token",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+            
+            user = user_response.user
+            user_id = user.id
+            email = user.email
+            user_metadata = user.user_metadata or {}
         
         # SECURITY: Fetch role from profiles table, not from JWT metadata
         # This prevents users from spoofing admin role
+        # Cached for ROLE_CACHE_TTL_SECONDS; FastAPI resolves this dependency
+        # once per request, so require_admin/verify_admin reuse the result
         role = "user"  # Default role
         try:
-            profile_response = supabase_client.table("profiles").select("role").eq(
-                "id", user.id
-            ).execute()
-            if profile_response.data and profile_response.data[0].get("role"):
-                role = profile_response.data[0].get("role")
+            role = _role_cache.get(user_id) or await db.run(get_user_role, user_id) or "user"
         except Exception as profile_error:
             # SECURITY: If profiles table query fails, default to "user" role
             # NEVER fall back to JWT metadata as it can be spoofed
@@ -85,8 +158,8 @@ async def get_current_user(
             role = "user"  # Always default to lowest privilege
         
         return CurrentUser(
-            id=user.id,
-            email=user.email,
+            id=user_id,
+            email=email,
             full_name=user_metadata.get("full_name"),
             phone=user_metadata.get("phone"),
             role=role
@@ -0,0 +1,34 @@
+-- ============================================
+-- RISKOFF - Bank Statement Ingestion Jobs
+-- Run this in Supabase SQL Editor
+-- ============================================
+
+-- Create statements table (status: processing, completed, failed)
+CREATE TABLE IF NOT EXISTS bank_statements (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    file_name TEXT NOT NULL,
+    file_url TEXT,
+    status TEXT DEFAULT 'processing' CHECK (status IN ('processing', 'completed', 'failed')),
+    transactions_count INTEGER DEFAULT 0,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Reason shown to the user when a background job fails
+ALTER TABLE bank_statements ADD COLUMN IF NOT EXISTS error_message TEXT;
+
+-- Create indexes for status polling
+CREATE INDEX IF NOT EXISTS idx_bank_statements_user_id ON bank_statements(user_id);
+CREATE INDEX IF NOT EXISTS idx_bank_statements_status ON bank_statements(status);
+
+-- Enable Row Level Security
+ALTER TABLE bank_statements ENABLE ROW LEVEL SECURITY;
+
+-- Policy: Users can view their own statements
+DROP POLICY IF EXISTS "Users can view own statements" ON bank_statements;
+CREATE POLICY "Users can view own statements" ON bank_statements
+    FOR SELECT USING (auth.uid() = user_id);
+
+-- Grant permissions
+GRANT ALL ON bank_statements TO authenticated;
+GRANT ALL ON bank_statements TO service_role;
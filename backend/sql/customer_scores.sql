@@ -0,0 +1,61 @@
+-- ============================================
+-- RISKOFF - Persisted Customer Scores
+-- Run this in Supabase SQL Editor
+-- Stores the 300-900 customer score on each profile together with the
+-- scoring rules version it was computed with (see app/services/customer_score.py)
+-- ============================================
+
+-- Score columns; customer_score_version is NULL while the score is stale
+ALTER TABLE profiles ADD COLUMN IF NOT EXISTS customer_score INTEGER;
+ALTER TABLE profiles ADD COLUMN IF NOT EXISTS customer_score_version INTEGER;
+ALTER TABLE profiles ADD COLUMN IF NOT EXISTS customer_score_updated_at TIMESTAMPTZ;
+ALTER TABLE profiles ADD COLUMN IF NOT EXISTS score_inputs_changed_at TIMESTAMPTZ DEFAULT NOW();
+
+-- Mark the score stale whenever one of its inputs changes
+CREATE OR REPLACE FUNCTION mark_customer_score_stale()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT'
+       OR NEW.annual_income IS DISTINCT FROM OLD.annual_income
+       OR NEW.monthly_expenses IS DISTINCT FROM OLD.monthly_expenses
+       OR NEW.account_balance IS DISTINCT FROM OLD.account_balance
+       OR NEW.mutual_funds IS DISTINCT FROM OLD.mutual_funds
+       OR NEW.stocks IS DISTINCT FROM OLD.stocks
+       OR NEW.fixed_deposits IS DISTINCT FROM OLD.fixed_deposits
+       OR NEW.existing_loans IS DISTINCT FROM OLD.existing_loans THEN
+        NEW.customer_score_version := NULL;
+        NEW.score_inputs_changed_at := NOW();
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_customer_score_stale ON profiles;
+CREATE TRIGGER trg_customer_score_stale
+    BEFORE INSERT OR UPDATE OF annual_income, monthly_expenses, account_balance, mutual_funds,
+        stocks, fixed_deposits, existing_loans ON profiles
+    FOR EACH ROW EXECUTE FUNCTION mark_customer_score_stale();
+
+-- Write a batch of scores ([{id, customer_score, score_inputs_changed_at}, ...])
+-- computed with rules version p_version. A profile whose inputs changed after
+-- it was read is left stale for the next run. Returns the number updated.
+CREATE OR REPLACE FUNCTION apply_customer_scores(p_scores JSONB, p_version INTEGER)
+RETURNS INTEGER AS $$
+    WITH updated AS (
+        UPDATE profiles p SET
+            customer_score = s.customer_score,
+            customer_score_version = p_version,
+            customer_score_updated_at = NOW()
+        FROM jsonb_to_recordset(p_scores) AS s(id UUID, customer_score INTEGER, score_inputs_changed_at TIMESTAMPTZ)
+        WHERE p.id = s.id
+          AND p.score_inputs_changed_at IS NOT DISTINCT FROM s.score_inputs_changed_at
+        RETURNING 1
+    )
+    SELECT COUNT(*)::INTEGER FROM updated;
+$$ LANGUAGE sql;
+
+-- Stale profiles are found by version, so index the rows that need work
+CREATE INDEX IF NOT EXISTS idx_profiles_customer_score_version ON profiles(customer_score_version, id);
+
+-- Grant permissions
+GRANT EXECUTE ON FUNCTION apply_customer_scores(JSONB, INTEGER) TO service_role;
@@ -0,0 +1,22 @@
+-- ============================================
+-- RISKOFF - Shared LLM Response Cache
+-- Run this in Supabase SQL Editor
+-- Enable with LLM_CACHE_BACKEND=supabase
+-- ============================================
+
+-- Create cache table (keyed by SHA-256 of the normalized prompt)
+CREATE TABLE IF NOT EXISTS llm_response_cache (
+    cache_key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Create index for expiry cleanup
+CREATE INDEX IF NOT EXISTS idx_llm_response_cache_expires_at ON llm_response_cache(expires_at);
+
+-- Enable Row Level Security (backend uses service role key which bypasses RLS)
+ALTER TABLE llm_response_cache ENABLE ROW LEVEL SECURITY;
+
+-- Grant permissions
+GRANT ALL ON llm_response_cache TO service_role;
@@ -0,0 +1,63 @@
+-- ============================================
+-- RISKOFF - Loan Status Summary
+-- Run this in Supabase SQL Editor
+-- Backs GET /admin/stats with a per-status summary kept up to date by trigger
+-- ============================================
+
+-- Create summary table (one row per loan status)
+CREATE TABLE IF NOT EXISTS loan_status_summary (
+    status TEXT PRIMARY KEY,
+    loan_count BIGINT NOT NULL DEFAULT 0,
+    total_volume NUMERIC NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Add a count/volume delta to one status row
+CREATE OR REPLACE FUNCTION apply_loan_summary_delta(p_status TEXT, p_count BIGINT, p_volume NUMERIC)
+RETURNS VOID AS $$
+    INSERT INTO loan_status_summary (status, loan_count, total_volume)
+    VALUES (COALESCE(p_status, 'UNKNOWN'), p_count, p_volume)
+    ON CONFLICT (status) DO UPDATE SET
+        loan_count = loan_status_summary.loan_count + EXCLUDED.loan_count,
+        total_volume = loan_status_summary.total_volume + EXCLUDED.total_volume,
+        updated_at = NOW();
+$$ LANGUAGE sql;
+
+-- Keep the summary in step with inserts, status/amount changes and deletes
+CREATE OR REPLACE FUNCTION maintain_loan_status_summary()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_loan_summary_delta(OLD.status, -1, -COALESCE(OLD.amount, 0));
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_loan_summary_delta(NEW.status, 1, COALESCE(NEW.amount, 0));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_loan_status_summary ON loans;
+CREATE TRIGGER trg_loan_status_summary
+    AFTER INSERT OR DELETE OR UPDATE OF status, amount ON loans
+    FOR EACH ROW EXECUTE FUNCTION maintain_loan_status_summary();
+
+-- Backfill from existing loans
+TRUNCATE loan_status_summary;
+INSERT INTO loan_status_summary (status, loan_count, total_volume)
+SELECT COALESCE(status, 'UNKNOWN'), COUNT(*), COALESCE(SUM(amount), 0)
+FROM loans
+GROUP BY COALESCE(status, 'UNKNOWN');
+
+-- Read the summary (called via supabase_client.rpc("get_loan_stats"))
+CREATE OR REPLACE FUNCTION get_loan_stats()
+RETURNS TABLE (status TEXT, loan_count BIGINT, total_volume NUMERIC) AS $$
+    SELECT s.status, s.loan_count, s.total_volume FROM loan_status_summary s;
+$$ LANGUAGE sql STABLE;
+
+-- Enable Row Level Security (backend uses service role key which bypasses RLS)
+ALTER TABLE loan_status_summary ENABLE ROW LEVEL SECURITY;
+
+-- Grant permissions
+GRANT ALL ON loan_status_summary TO service_role;
+GRANT EXECUTE ON FUNCTION get_loan_stats() TO service_role;
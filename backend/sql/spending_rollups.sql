@@ -0,0 +1,99 @@
+-- ============================================
+-- RISKOFF - Spending Rollups
+-- Run this in Supabase SQL Editor
+-- Backs GET /analytics/spending and the /user/dashboard monthly series with
+-- per-user, per-category, per-month spending and income totals that the API
+-- increments as transactions are saved
+-- ============================================
+
+-- Create rollup table (month is YYYY-MM, or 'unknown' for undated rows)
+CREATE TABLE IF NOT EXISTS spending_rollups (
+    user_id UUID NOT NULL,
+    category TEXT NOT NULL,
+    month TEXT NOT NULL,
+    total_spent NUMERIC NOT NULL DEFAULT 0,
+    txn_count BIGINT NOT NULL DEFAULT 0,
+    total_income NUMERIC NOT NULL DEFAULT 0,
+    income_count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (user_id, category, month)
+);
+
+-- Income columns for rollups created before they were added
+ALTER TABLE spending_rollups ADD COLUMN IF NOT EXISTS total_income NUMERIC NOT NULL DEFAULT 0;
+ALTER TABLE spending_rollups ADD COLUMN IF NOT EXISTS income_count BIGINT NOT NULL DEFAULT 0;
+
+-- Month bucket for a transaction date: ISO dates and day-first D/M/Y dates,
+-- matching app/services/rollups.month_key
+CREATE OR REPLACE FUNCTION spending_month(p_date TEXT)
+RETURNS TEXT AS $$
+    SELECT CASE
+        WHEN p_date ~ '^\d{4}-\d{2}' THEN substr(p_date, 1, 7)
+        WHEN p_date ~ '^\d{1,2}[/-]\d{1,2}[/-]\d{4}' THEN
+            substring(p_date FROM '^\d{1,2}[/-]\d{1,2}[/-](\d{4})') || '-' ||
+            lpad(substring(p_date FROM '^\d{1,2}[/-](\d{1,2})[/-]'), 2, '0')
+        ELSE 'unknown'
+    END;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Add a batch of deltas ([{category, month, total_spent, txn_count,
+-- total_income, income_count}, ...]) to one user's rollup (called via
+-- supabase_client.rpc); missing income fields count as 0
+CREATE OR REPLACE FUNCTION increment_spending_rollups(p_user_id UUID, p_deltas JSONB)
+RETURNS VOID AS $$
+    INSERT INTO spending_rollups (user_id, category, month, total_spent, txn_count, total_income, income_count)
+    SELECT p_user_id, d.category, d.month, d.total_spent, d.txn_count,
+           COALESCE(d.total_income, 0), COALESCE(d.income_count, 0)
+    FROM jsonb_to_recordset(p_deltas) AS d(
+        category TEXT, month TEXT, total_spent NUMERIC, txn_count BIGINT, total_income NUMERIC, income_count BIGINT
+    )
+    ON CONFLICT (user_id, category, month) DO UPDATE SET
+        total_spent = spending_rollups.total_spent + EXCLUDED.total_spent,
+        txn_count = spending_rollups.txn_count + EXCLUDED.txn_count,
+        total_income = spending_rollups.total_income + EXCLUDED.total_income,
+        income_count = spending_rollups.income_count + EXCLUDED.income_count,
+        updated_at = NOW();
+$$ LANGUAGE sql;
+
+-- Recompute one user's rollup (or every user's when p_user_id is NULL) from
+-- their transactions
+CREATE OR REPLACE FUNCTION rebuild_spending_rollups(p_user_id UUID DEFAULT NULL)
+RETURNS VOID AS $$
+BEGIN
+    DELETE FROM spending_rollups WHERE p_user_id IS NULL OR user_id = p_user_id;
+    INSERT INTO spending_rollups (user_id, category, month, total_spent, txn_count, total_income, income_count)
+    SELECT
+        r.user_id, r.category, r.month,
+        COALESCE(SUM(r.amount) FILTER (WHERE r.is_spend), 0),
+        COUNT(*) FILTER (WHERE r.is_spend),
+        COALESCE(SUM(r.amount) FILTER (WHERE r.is_income), 0),
+        COUNT(*) FILTER (WHERE r.is_income)
+    FROM (
+        SELECT
+            t.user_id,
+            COALESCE(NULLIF(t.category, ''), 'Uncategorized') AS category,
+            spending_month(t.transaction_date::TEXT) AS month,
+            ABS(COALESCE(t.amount, 0)) AS amount,
+            t.transaction_type = 'Debit' OR (t.transaction_type IS NULL AND t.amount < 0) AS is_spend,
+            t.transaction_type = 'Credit' OR (t.transaction_type IS NULL AND t.amount > 0) AS is_income
+        FROM transactions t
+        WHERE p_user_id IS NULL OR t.user_id = p_user_id
+    ) r
+    WHERE r.is_spend OR r.is_income
+    GROUP BY 1, 2, 3;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Backfill from existing transactions
+SELECT rebuild_spending_rollups();
+
+-- Create index for the per-user analytics read
+CREATE INDEX IF NOT EXISTS idx_spending_rollups_user_month ON spending_rollups(user_id, month);
+
+-- Enable Row Level Security (backend uses service role key which bypasses RLS)
+ALTER TABLE spending_rollups ENABLE ROW LEVEL SECURITY;
+
+-- Grant permissions
+GRANT ALL ON spending_rollups TO service_role;
+GRANT EXECUTE ON FUNCTION increment_spending_rollups(UUID, JSONB) TO service_role;
+GRANT EXECUTE ON FUNCTION rebuild_spending_rollups(UUID) TO service_role;
@@ -0,0 +1,13 @@
+-- ============================================
+-- RISKOFF - Duplicate Transaction Detection
+-- Run this in Supabase SQL Editor
+-- ============================================
+
+-- Content hash of (user, date, amount, description, balance) set on import
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+-- Per-user hash index: lookups during upload and the conflict target that
+-- drops duplicates from concurrent uploads. Rows imported before this
+-- migration have no hash and are not affected.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_user_content_hash
+    ON transactions(user_id, content_hash);
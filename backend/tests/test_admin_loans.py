@@ -0,0 +1,263 @@
+"""
+Tests for the admin loan listing, dashboard stats and keyset pagination.
+"""
+
+import pytest
+from unittest.mock import MagicMock, patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routers import admin, grievances
+from app.utils.security import CurrentUser, get_current_user
+
+
+def _query(data):
+    """Chainable query builder mock whose execute() returns data."""
+    query = MagicMock()
+    for method in ("select", "eq", "in_", "order", "or_", "limit"):
+        getattr(query, method).return_value = query
+    query.execute.return_value.data = data
+    return query
+
+
+def _mock_supabase(loans, profiles):
+    """Supabase mock returning fixed loans and profile rows."""
+    loans_table = _query(loans)
+    profiles_table = _query(profiles)
+
+    supabase = MagicMock()
+    supabase.table.side_effect = lambda name: {"loans": loans_table, "profiles": profiles_table}[name]
+    return supabase, loans_table, profiles_table
+
+
+class TestAdminLoans:
+    """Tests for GET /admin/loans."""
+
+    def setup_method(self):
+        app.dependency_overrides[admin.verify_admin] = lambda: CurrentUser(
+            id="admin-1", email="admin@example.com", role="admin"
+        )
+
+    def teardown_method(self):
+        app.dependency_overrides.pop(admin.verify_admin, None)
+
+    def test_profiles_fetched_in_one_batch(self):
+        """Borrower info for many loans comes from a single profiles query."""
+        loans = [
+            {"id": i, "user_id": f"user-{i % 3}", "risk_score": score}
+            for i, score in enumerate([10, 45, 80, 30, 61, 0])
+        ]
+        loans.append({"id": 99, "user_id": None, "risk_score": None})
+        profiles = [
+            {"id": "user-0", "full_name": "Asha", "email": "asha@example.com"},
+            {"id": "user-1", "full_name": "Ravi", "email": "ravi@example.com"},
+        ]
+        supabase, _, profiles_table = _mock_supabase(loans, profiles)
+
+        with patch.object(admin, "supabase_client", supabase):
+            response = TestClient(app).get("/admin/loans")
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["total"] == 7
+
+        profiles_table.in_.assert_called_once_with(
+            "id", ["user-0", "user-1", "user-2"]
+        )
+
+        by_id = {loan["id"]: loan for loan in body["loans"]}
+        assert by_id[0]["user_name"] == "Asha"
+        assert by_id[1]["user_email"] == "ravi@example.com"
+        assert by_id[2]["user_name"] == "Unknown"  # No profile row
+        assert by_id[99]["user_name"] == "Unknown"
+        assert [by_id[i]["risk_category"] for i in range(6)] == [
+            "LOW", "MEDIUM", "HIGH", "LOW", "HIGH", "LOW"
+        ]
+        assert "risk_category" not in by_id[99]
+
+    def test_page_size_and_cursor(self):
+        """A full page returns a cursor that resumes after its last row."""
+        loans = [
+            {"id": i, "user_id": None, "created_at": f"2024-01-0{9 - i}T10:00:00+00:00"}
+            for i in range(3)
+        ]
+        supabase, loans_table, _ = _mock_supabase(loans, [])
+
+        with patch.object(admin, "supabase_client", supabase):
+            first = TestClient(app).get("/admin/loans?page_size=2").json()
+            cursor = first["next_cursor"]
+            TestClient(app).get(f"/admin/loans?page_size=2&cursor={cursor}")
+
+        assert [loan["id"] for loan in first["loans"]] == [0, 1]
+        loans_table.limit.assert_called_with(3)  # One look-ahead row
+        loans_table.or_.assert_called_once_with(
+            'created_at.lt."2024-01-08T10:00:00+00:00",'
+            'and(created_at.eq."2024-01-08T10:00:00+00:00",id.lt."1")'
+        )
+
+    def test_unpaged_without_cursor_or_page_size(self):
+        """Clients that send neither parameter still get every loan."""
+        loans = [{"id": i, "user_id": None, "created_at": f"2024-01-01T00:00:{i:02d}+00:00"} for i in range(60)]
+        supabase, loans_table, _ = _mock_supabase(loans, [])
+
+        with patch.object(admin, "supabase_client", supabase):
+            body = TestClient(app).get("/admin/loans").json()
+
+        assert len(body["loans"]) == 60
+        assert body["total"] == 60
+        assert body["next_cursor"] is None
+        loans_table.limit.assert_not_called()
+
+    def test_paged_total_is_opt_in(self):
+        """Pages skip the full count unless include_total asks for it."""
+        supabase, loans_table, _ = _mock_supabase([{"id": 1, "created_at": "x"}, {"id": 2, "created_at": "y"}], [])
+
+        with patch.object(admin, "supabase_client", supabase):
+            body = TestClient(app).get("/admin/loans?page_size=1").json()
+
+        assert len(body["loans"]) == 1
+        assert body["total"] is None
+        loans_table.select.assert_called_with("*")
+
+    def test_paged_total_is_real_count(self):
+        """With include_total, total is the exact row count, not the page length."""
+        supabase, loans_table, _ = _mock_supabase([{"id": 1, "created_at": "x"}, {"id": 2, "created_at": "y"}], [])
+        loans_table.execute.return_value.count = 240
+
+        with patch.object(admin, "supabase_client", supabase):
+            body = TestClient(app).get("/admin/loans?page_size=1&include_total=true").json()
+
+        assert len(body["loans"]) == 1
+        assert body["total"] == 240
+        loans_table.select.assert_called_with("*", count="exact")
+
+    def test_fields_projection(self):
+        """?fields= selects only the requested columns plus the cursor keys."""
+        supabase, loans_table, _ = _mock_supabase([{"id": 1, "created_at": "x", "amount": 5}], [])
+
+        with patch.object(admin, "supabase_client", supabase):
+            response = TestClient(app).get("/admin/loans?fields=amount,status")
+            bad = TestClient(app).get("/admin/loans?fields=password")
+
+        assert response.status_code == 200
+        loans_table.select.assert_called_with("id, created_at, amount, status")
+        assert "user_name" not in response.json()["loans"][0]
+        assert response.json()["next_cursor"] is None
+        assert bad.status_code == 400
+
+
+class TestDashboardStats:
+    """Tests for GET /admin/stats."""
+
+    def setup_method(self):
+        app.dependency_overrides[admin.verify_admin] = lambda: CurrentUser(
+            id="admin-1", email="admin@example.com", role="admin"
+        )
+
+    def teardown_method(self):
+        app.dependency_overrides.pop(admin.verify_admin, None)
+
+    def test_reads_summary_rows(self):
+        """Stats come from the summary RPC without reading the loans table."""
+        supabase = MagicMock()
+        supabase.rpc.return_value.execute.return_value.data = [
+            {"status": "PENDING", "loan_count": 4, "total_volume": "400000"},
+            {"status": "APPROVED", "loan_count": 10, "total_volume": 1250000.5},
+            {"status": "REJECTED", "loan_count": 3, "total_volume": 90000},
+        ]
+
+        with patch.object(admin, "supabase_client", supabase):
+            body = TestClient(app).get("/admin/stats").json()
+
+        assert body == {
+            "total_loans": 17,
+            "pending_count": 4,
+            "approved_count": 10,
+            "rejected_count": 3,
+            "total_volume": 1740000.5,
+        }
+        supabase.rpc.assert_called_once_with("get_loan_stats")
+        supabase.table.assert_not_called()
+
+    def test_falls_back_without_rpc(self):
+        """Without the SQL function, loans are aggregated in one pass."""
+        supabase = MagicMock()
+        supabase.rpc.side_effect = Exception("function get_loan_stats() does not exist")
+        supabase.table.return_value = _query([
+            {"status": "APPROVED", "amount": 1000},
+            {"status": "APPROVED", "amount": 500.25},
+            {"status": "PENDING", "amount": 200},
+        ])
+
+        with patch.object(admin, "supabase_client", supabase):
+            body = TestClient(app).get("/admin/stats").json()
+
+        assert body["total_loans"] == 3
+        assert body["approved_count"] == 2
+        assert body["rejected_count"] == 0
+        assert body["total_volume"] == 1700.25
+
+
+class TestGrievanceList:
+    """GET /grievances/admin/all uses the same envelope as the loan lists."""
+
+    def setup_method(self):
+        app.dependency_overrides[get_current_user] = lambda: CurrentUser(
+            id="admin-1", email="admin@example.com", role="admin"
+        )
+
+    def teardown_method(self):
+        app.dependency_overrides.pop(get_current_user, None)
+
+    def test_paged_envelope(self):
+        """The next cursor is in the body, with every grievance field."""
+        rows = [
+            {"id": i, "user_id": "u1", "grievance_type": "loan", "subject": "s", "description": "d",
+             "status": "open", "admin_response": None, "created_at": f"2024-01-0{9 - i}", "resolved_at": None}
+            for i in range(3)
+        ]
+        supabase = MagicMock()
+        supabase.table.return_value = _query(rows)
+
+        with patch.object(grievances, "supabase_client", supabase):
+            response = TestClient(app).get("/grievances/admin/all?page_size=2")
+
+        body = response.json()
+        assert "x-next-cursor" not in response.headers
+        assert [g["id"] for g in body["grievances"]] == ["0", "1"]
+        assert body["grievances"][0]["admin_response"] is None
+        assert body["total"] is None
+        assert body["next_cursor"] is not None
+
+    def test_projection_keeps_response_model(self):
+        """?fields= returns only the requested columns inside the envelope."""
+        supabase = MagicMock()
+        supabase.table.return_value = _query([{"id": 7, "created_at": "2024-01-01", "status": "open"}])
+
+        with patch.object(grievances, "supabase_client", supabase):
+            body = TestClient(app).get("/grievances/admin/all?fields=status").json()
+
+        assert body == {
+            "grievances": [{"id": "7", "created_at": "2024-01-01", "status": "open"}],
+            "total": 1,
+            "next_cursor": None,
+        }
+
+
+class TestCursor:
+    """Tests for cursor encoding."""
+
+    def test_round_trip(self):
+        """Cursors decode to the (created_at, id) they were built from."""
+        from app.utils.pagination import encode_cursor, decode_cursor
+
+        cursor = encode_cursor({"id": "abc-123", "created_at": "2024-05-01T12:00:00.123+00:00"})
+        assert decode_cursor(cursor) == ("2024-05-01T12:00:00.123+00:00", "abc-123")
+
+    def test_malformed_cursor_rejected(self):
+        """Garbage cursors are a 400, not a server error."""
+        from fastapi import HTTPException
+        from app.utils.pagination import decode_cursor
+
+        with pytest.raises(HTTPException) as exc:
+            decode_cursor("not-a-cursor")
+        assert exc.value.status_code == 400
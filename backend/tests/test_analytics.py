@@ -387,3 +387,81 @@ class TestRounding:
         # Classic floating point issue: 0.1 + 0.2 != 0.3
         total_spent_rounded = round(total_spent, 2)
         assert total_spent_rounded == 0.3
+
+
+# ============ Tests for the Columnar Aggregation Engine ============
+
+def _loop_aggregate(txns):
+    """Reference per-row aggregation used by the endpoint before the engine."""
+    category_totals = {}
+    total_spent = 0
+
+    for t in txns:
+        t_type = t.get('type') or t.get('transaction_type')
+        amount = float(t.get('amount', 0))
+
+        if t_type == 'Debit' or (t_type is None and amount < 0):
+            cat = t.get('category', 'Uncategorized') or 'Uncategorized'
+            abs_amt = abs(amount)
+            category_totals[cat] = category_totals.get(cat, 0) + abs_amt
+            total_spent += abs_amt
+
+    return round(total_spent, 2), {cat: round(total, 2) for cat, total in category_totals.items()}
+
+
+class TestColumnarAggregation:
+    """The vectorized engine matches the per-row semantics above."""
+
+    @pytest.mark.parametrize("txns", [
+        [{"type": "Debit", "amount": -100.50, "category": "Food"}],
+        [{"type": "Credit", "amount": 5000.00, "category": "Salary"},
+         {"type": "Debit", "amount": -100.00, "category": "Food"},
+         {"type": "Credit", "amount": 200.00, "category": "Refund"}],
+        [{"type": "Debit", "amount": -50.00, "category": None},
+         {"type": "Debit", "amount": -30.00}],
+        [],
+        [{"transaction_type": "Debit", "amount": -100.00, "category": "Food"},
+         {"type": "Debit", "amount": -50.00, "category": "Transport"}],
+        [{"type": "Debit", "amount": 100.00, "category": "Food"}],
+        [{"amount": -75.00, "category": "Utilities"}],
+        [{"type": "Debit", "amount": 0, "category": "Food"},
+         {"type": "Debit", "amount": -50.00, "category": "Transport"}],
+        [{"type": "Debit", "amount": "-100.50", "category": "Food"}],
+        [{"type": "", "transaction_type": "Debit", "amount": 20, "category": "Fees"},
+         {"type": "", "transaction_type": "", "amount": -20, "category": "Fees"},
+         {"type": None, "amount": -5, "category": ""}],
+        [{"type": "Debit", "amount": -10.333, "category": "Food"},
+         {"type": "Debit", "amount": -20.666, "category": "Food"}],
+        [{"type": "Debit", "amount": -1.00, "category": f"Category_{i % 10}"} for i in range(1000)],
+    ])
+    def test_matches_per_row_semantics(self, txns):
+        """Totals and category breakdown equal the per-row loop."""
+        from app.services.aggregation import aggregate_spending
+
+        result = aggregate_spending(txns)
+
+        assert (result["total_spent"], result["category_totals"]) == _loop_aggregate(txns)
+
+    def test_columns_input(self):
+        """A dict of columns gives the same result as row dicts."""
+        from app.services.aggregation import aggregate_spending
+
+        rows = [
+            {"amount": -120.0, "category": "Food", "transaction_type": "Debit",
+             "transaction_date": "2024-01-05", "description": "UPI/101/SWIGGY"},
+            {"amount": -80.0, "category": "Food", "transaction_type": "Debit",
+             "transaction_date": "12/02/2024", "description": "UPI/202/Swiggy"},
+            {"amount": -400.0, "category": "Transport", "transaction_type": "Debit",
+             "transaction_date": "2024-02-09", "description": "Uber trip"},
+            {"amount": 50000.0, "category": "Income", "transaction_type": "Credit",
+             "transaction_date": "2024-02-01", "description": "Salary"},
+        ]
+        columns = {key: [row[key] for row in rows] for key in rows[0]}
+
+        result = aggregate_spending(columns, top_merchants=1)
+
+        assert result == aggregate_spending(rows, top_merchants=1)
+        assert result["txn_count"] == 3
+        assert result["monthly"] == {"2024-01": 120.0, "2024-02": 480.0}
+        assert result["top_merchants"] == [{"merchant": "uber trip", "total_spent": 400.0, "txn_count": 1}]
+        assert result["percentiles"]["p50"] == 120.0
@@ -0,0 +1,168 @@
+"""
+Tests for customer score computation, the recompute job and its use in
+admin risk analysis.
+"""
+
+import asyncio
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routers import admin
+from app.services import customer_score
+from app.utils.security import CurrentUser
+
+RISK_REQUEST = {
+    "age": 30, "annual_income": 600000, "employment_years": 4, "monthly_expenses": 25000,
+    "loan_amount_requested": 200000, "loan_tenure_months": 36
+}
+
+
+def _profiles(n, seed=7):
+    """Random profiles, including values exactly on the tier boundaries."""
+    rng = np.random.default_rng(seed)
+    incomes = rng.choice([0, 299999, 300000, 500000, 999999, 1000000, 2400000], n)
+    balances = rng.choice([0, 99999, 100000, 500000, 1000000], n)
+    return [
+        {
+            "id": f"user-{i}",
+            "annual_income": float(incomes[i]),
+            "monthly_expenses": float(rng.choice([0, 0.3, 0.5, 0.8, 0.81, 1.2]) * incomes[i] / 12),
+            "account_balance": float(balances[i]),
+            "mutual_funds": float(rng.integers(0, 200000)) if i % 2 else None,
+            "stocks": float(rng.integers(0, 200000)),
+            "fixed_deposits": None,
+            "existing_loans": int(rng.integers(0, 5)),
+        }
+        for i in range(n)
+    ]
+
+
+class TestCustomerScore:
+    """Scalar and batch scoring."""
+
+    def test_scalar_rules(self):
+        """Income, assets, expense ratio and loans adjust the 500 base."""
+        assert customer_score.calculate_customer_score({}) == 550
+        assert customer_score.calculate_customer_score({
+            "annual_income": 1200000, "monthly_expenses": 20000, "account_balance": 1000000,
+            "existing_loans": 0
+        }) == 900
+        assert customer_score.calculate_customer_score({
+            "annual_income": 120000, "monthly_expenses": 9000, "existing_loans": 4
+        }) == 420
+
+    def test_batch_matches_scalar(self):
+        """Every profile gets the score the scalar function would give."""
+        profiles = _profiles(2000)
+
+        scores = customer_score.score_profiles(profiles)
+
+        assert scores.dtype == np.int64
+        assert scores.tolist() == [customer_score.calculate_customer_score(p) for p in profiles]
+
+    def test_batch_rejects_mismatched_columns(self):
+        """Columns of different lengths are an error."""
+        with pytest.raises(ValueError):
+            customer_score.calculate_customer_scores_batch([500000, 600000], [10000], [0, 0], [0, 0])
+
+    def test_stored_score_used_only_when_current(self):
+        """A persisted score from an older rules version is recomputed."""
+        profile = {"annual_income": 1200000, "customer_score": 610}
+
+        assert customer_score.get_customer_score(
+            {**profile, "customer_score_version": customer_score.SCORE_VERSION}
+        ) == 610
+        assert customer_score.get_customer_score({**profile, "customer_score_version": None}) == 800
+
+
+class TestRecomputeJob:
+    """Tests for recompute_customer_scores."""
+
+    def test_scores_stale_profiles_in_batches(self):
+        """Stale profiles are read by keyset and written back per batch."""
+        profiles = _profiles(5)
+        query = MagicMock()
+        for method in ("select", "or_", "gt", "order"):
+            getattr(query, method).return_value = query
+        pages = [profiles[:2], profiles[2:4], profiles[4:]]
+        query.limit.side_effect = lambda n: MagicMock(execute=MagicMock(return_value=MagicMock(
+            data=pages[query.gt.call_count]
+        )))
+        supabase = MagicMock()
+        supabase.table.return_value = query
+        supabase.rpc.return_value.execute.side_effect = [MagicMock(data=2), MagicMock(data=2), MagicMock(data=1)]
+
+        with patch.object(customer_score, "supabase_client", supabase):
+            summary = asyncio.run(customer_score.recompute_customer_scores(batch_size=2))
+
+        assert summary == {"scanned": 5, "updated": 5, "version": customer_score.SCORE_VERSION}
+        query.or_.assert_called_with(
+            f"customer_score_version.is.null,customer_score_version.neq.{customer_score.SCORE_VERSION}"
+        )
+        assert [c.args[1] for c in query.gt.call_args_list] == ["user-1", "user-3"]
+        name, params = supabase.rpc.call_args_list[0].args
+        assert name == "apply_customer_scores"
+        assert params["p_version"] == customer_score.SCORE_VERSION
+        assert params["p_scores"] == [
+            {"id": p["id"], "customer_score": customer_score.calculate_customer_score(p),
+             "score_inputs_changed_at": None}
+            for p in profiles[:2]
+        ]
+
+
+class TestAdminCustomerScores:
+    """Admin risk analysis lookup and the recompute endpoint."""
+
+    def setup_method(self):
+        app.dependency_overrides[admin.verify_admin] = lambda: CurrentUser(
+            id="admin-1", email="admin@example.com", role="admin"
+        )
+
+    def teardown_method(self):
+        app.dependency_overrides.pop(admin.verify_admin, None)
+
+    def test_risk_analysis_looks_up_score(self):
+        """With only user_id, the customer's stored score is used."""
+        supabase = MagicMock()
+        supabase.table.return_value.select.return_value.eq.return_value.limit.return_value.execute.return_value.data = [
+            {"id": "user-1", "customer_score": 420, "customer_score_version": customer_score.SCORE_VERSION}
+        ]
+
+        with patch.object(admin, "supabase_client", supabase):
+            response = TestClient(app).post("/admin/risk-analysis", json={**RISK_REQUEST, "user_id": "user-1"})
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["customer_score"] == 420
+        assert "Low customer score (< 500)" in body["risk_factors"]
+
+    def test_risk_analysis_unknown_user(self):
+        """An unknown user_id is a 404; no score and no user_id is a 400."""
+        supabase = MagicMock()
+        supabase.table.return_value.select.return_value.eq.return_value.limit.return_value.execute.return_value.data = []
+
+        with patch.object(admin, "supabase_client", supabase):
+            client = TestClient(app)
+            missing = client.post("/admin/risk-analysis", json={**RISK_REQUEST, "user_id": "nobody"})
+            neither = client.post("/admin/risk-analysis", json=RISK_REQUEST)
+            given = client.post("/admin/risk-analysis", json={**RISK_REQUEST, "customer_score": 800})
+
+        assert missing.status_code == 404
+        assert neither.status_code == 400
+        assert given.json()["customer_score"] == 800
+        supabase.table.assert_called_once_with("profiles")
+
+    def test_recompute_endpoint(self):
+        """The endpoint runs the job and returns its summary."""
+        summary = {"scanned": 3, "updated": 3, "version": customer_score.SCORE_VERSION}
+
+        with patch.object(admin, "supabase_client", MagicMock()), \
+                patch.object(customer_score, "recompute_customer_scores", AsyncMock(return_value=summary)), \
+                patch.object(admin.audit, "log_action", AsyncMock()) as log_action:
+            response = TestClient(app).post("/admin/customer-scores/recompute")
+
+        assert response.status_code == 200
+        assert response.json() == summary
+        assert log_action.call_args.kwargs["action"] == "ADMIN_CUSTOMER_SCORE_RECOMPUTE"
@@ -0,0 +1,307 @@
+"""
+Tests for concurrent queries and caching in the user dashboard, and agent chat.
+"""
+
+import time
+from datetime import date
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routers import agent, loans, user
+from app.services import dashboard_cache, rollups
+from app.utils.security import get_current_user, CurrentUser
+
+PROFILE = {"id": "user-1", "full_name": "Priya Sharma", "annual_income": 1200000,
+           "monthly_expenses": 30000, "account_balance": 200000}
+LOANS = [{"id": 1, "status": "APPROVED", "amount": 50000, "emi": 4442.44,
+          "risk_score": 20, "tenure_months": 12}]
+
+
+def _result(delay=0.0, data=None, error=None):
+    """Query whose execute() blocks for `delay` then returns data or raises."""
+    def execute():
+        time.sleep(delay)
+        if error:
+            raise error
+        return MagicMock(data=data)
+
+    query = MagicMock()
+    query.execute.side_effect = execute
+    return query
+
+
+def _supabase(profiles, loans, rollup=None):
+    """Route table() to per-table query mocks (any filter chain)."""
+    tables = {"profiles": profiles, "loans": loans, "spending_rollups": rollup or _result(0, [])}
+
+    def table(name):
+        chain = MagicMock()
+        query = tables[name]
+        chain.select.return_value.eq.return_value = query
+        query.eq.return_value = query
+        query.order.return_value = query
+        query.gte.return_value = query
+        query.limit.return_value = query
+        return chain
+
+    supabase = MagicMock()
+    supabase.table.side_effect = table
+    return supabase
+
+
+class TestConcurrentQueries:
+    """Dashboard and chat take as long as the slowest query."""
+
+    def setup_method(self):
+        dashboard_cache.invalidate_dashboard()
+        app.dependency_overrides[get_current_user] = lambda: CurrentUser(
+            id="user-1", email="user@example.com"
+        )
+
+    def teardown_method(self):
+        app.dependency_overrides.pop(get_current_user, None)
+
+    def test_dashboard_queries_overlap(self):
+        """Profile and loans load in parallel."""
+        supabase = _supabase(_result(0.3, [PROFILE]), _result(0.3, LOANS))
+
+        with patch.object(user, "supabase_client", supabase):
+            start = time.perf_counter()
+            response = TestClient(app).get("/user/dashboard")
+            elapsed = time.perf_counter() - start
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["loan_summary"]["approved"] == 1
+        assert body["monthly_income"] == 100000
+        assert body["unavailable"] == []
+        assert elapsed < 0.55
+
+    def test_dashboard_partial_failure(self):
+        """A failed loans query still returns the profile-based dashboard."""
+        supabase = _supabase(_result(0, [PROFILE]), _result(error=ConnectionError("reset")))
+
+        with patch.object(user, "supabase_client", supabase):
+            response = TestClient(app).get("/user/dashboard")
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["unavailable"] == ["loans"]
+        assert body["loan_summary"]["total"] == 0
+        assert body["profile_completed"] is True
+
+    def test_dashboard_series_from_rollup(self):
+        """Income vs expense and the breakdown come from the monthly rollup."""
+        rollup = [
+            {"category": "Food", "month": "2024-01", "total_spent": 3000, "total_income": 0},
+            {"category": "Income", "month": "2024-01", "total_spent": 0, "total_income": 90000},
+            {"category": "Transport", "month": "2024-03", "total_spent": 1200.5, "total_income": 0},
+            {"category": "Food", "month": "2024-03", "total_spent": 800, "total_income": 0},
+            {"category": "Food", "month": "unknown", "total_spent": 99, "total_income": 0},
+        ]
+        supabase = _supabase(_result(0, [PROFILE]), _result(0, LOANS), _result(0, rollup))
+
+        with patch.object(user, "supabase_client", supabase):
+            body = TestClient(app).get("/user/dashboard").json()
+
+        assert body["income_vs_expense"] == [
+            {"month": "2024-01", "income": 90000.0, "expenses": 3000.0},
+            {"month": "2024-02", "income": 0.0, "expenses": 0.0},
+            {"month": "2024-03", "income": 0.0, "expenses": 2000.5},
+        ]
+        assert body["spending_breakdown"] == [
+            {"category": "Food", "amount": 3800.0},
+            {"category": "Transport", "amount": 1200.5},
+        ]
+
+    def test_dashboard_rollup_without_income_column(self):
+        """Rollups from before total_income was added still load."""
+        rollup = [{"category": "Food", "month": "2024-01", "total_spent": 3000, "txn_count": 4}]
+        supabase = _supabase(_result(0, [PROFILE]), _result(0, LOANS), _result(0, rollup))
+
+        with patch.object(user, "supabase_client", supabase), \
+                patch.object(rollups, "first_month", return_value="2024-01"):
+            body = TestClient(app).get("/user/dashboard").json()
+
+        assert body["unavailable"] == []
+        assert body["income_vs_expense"][0] == {"month": "2024-01", "income": 0.0, "expenses": 3000.0}
+        assert body["spending_breakdown"] == [{"category": "Food", "amount": 3000.0}]
+
+    def test_dashboard_without_rollup(self):
+        """A failed rollup query leaves the series empty and is reported."""
+        supabase = _supabase(_result(0, [PROFILE]), _result(0, LOANS), _result(error=ConnectionError("reset")))
+
+        with patch.object(user, "supabase_client", supabase):
+            body = TestClient(app).get("/user/dashboard").json()
+
+        assert body["unavailable"] == ["transactions"]
+        assert body["income_vs_expense"] == []
+        assert body["spending_breakdown"] == []
+        assert body["customer_score"] > 0
+
+    def test_series_window_start(self):
+        """The rollup is read from the first month of the window."""
+        assert rollups.first_month(12, date(2025, 3, 15)) == "2024-04"
+        assert rollups.first_month(1, date(2025, 3, 15)) == "2025-03"
+        assert rollups.first_month(3, date(2025, 1, 1)) == "2024-11"
+
+    def test_dashboard_fails_when_nothing_loads(self):
+        """All queries failing is an error."""
+        supabase = _supabase(
+            _result(error=ConnectionError("reset")),
+            _result(error=ConnectionError("reset")),
+            _result(error=ConnectionError("reset"))
+        )
+
+        with patch.object(user, "supabase_client", supabase):
+            response = TestClient(app).get("/user/dashboard")
+
+        assert response.status_code == 400
+
+    def test_chat_context_queries_overlap(self):
+        """Name and latest loan load in parallel and reach the model."""
+        supabase = _supabase(_result(0.3, [{"full_name": "Priya Sharma"}]), _result(0.3, LOANS))
+        chat = AsyncMock(return_value={"response": "Your loan is approved.", "suggested_action": None})
+
+        with patch.object(agent, "supabase_client", supabase), \
+                patch.object(agent, "generate_bank_chat_response", chat):
+            start = time.perf_counter()
+            response = TestClient(app).post("/agent/chat", json={"query": "What is my loan status?"})
+            elapsed = time.perf_counter() - start
+
+        assert response.status_code == 200
+        assert elapsed < 0.55
+        kwargs = chat.call_args.kwargs
+        assert kwargs["user_name"] == "Priya Sharma"
+        assert kwargs["loan_details"]["status"] == "APPROVED"
+
+
+class TestDashboardCache:
+    """Dashboard snapshots, ETags and invalidation."""
+
+    def setup_method(self):
+        dashboard_cache.invalidate_dashboard()
+        app.dependency_overrides[get_current_user] = lambda: CurrentUser(
+            id="user-1", email="user@example.com"
+        )
+
+    def teardown_method(self):
+        app.dependency_overrides.pop(get_current_user, None)
+
+    def test_repeat_visit_served_from_cache(self):
+        """The second request does not query the database."""
+        supabase = _supabase(_result(0, [PROFILE]), _result(0, LOANS))
+
+        with patch.object(user, "supabase_client", supabase):
+            client = TestClient(app)
+            first = client.get("/user/dashboard")
+            second = client.get("/user/dashboard")
+
+        assert first.json() == second.json()
+        assert first.headers["etag"] == second.headers["etag"]
+        assert first.headers["cache-control"] == "private, no-cache"
+        assert supabase.table.call_count == 3
+
+    def test_if_none_match_returns_304(self):
+        """A matching ETag gets 304 with no body; a stale one gets the dashboard."""
+        supabase = _supabase(_result(0, [PROFILE]), _result(0, LOANS))
+
+        with patch.object(user, "supabase_client", supabase):
+            client = TestClient(app)
+            etag = client.get("/user/dashboard").headers["etag"]
+            not_modified = client.get("/user/dashboard", headers={"If-None-Match": f'W/{etag}, "other"'})
+            modified = client.get("/user/dashboard", headers={"If-None-Match": '"stale"'})
+
+        assert not_modified.status_code == 304
+        assert not_modified.content == b""
+        assert not_modified.headers["etag"] == etag
+        assert modified.status_code == 200
+        assert modified.json()["customer_score"] > 0
+
+    def test_partial_dashboard_not_cached(self):
+        """A dashboard with unavailable sections is recomputed next time."""
+        supabase = _supabase(_result(0, [PROFILE]), _result(error=ConnectionError("reset")))
+
+        with patch.object(user, "supabase_client", supabase):
+            client = TestClient(app)
+            client.get("/user/dashboard")
+            client.get("/user/dashboard")
+
+        assert supabase.table.call_count == 6
+        assert dashboard_cache.get("user-1") is None
+
+    def test_invalidation_during_build_not_cached(self):
+        """A dashboard built while the user's data changed is not cached."""
+        profiles = _result(0, [PROFILE])
+
+        def execute():
+            # e.g. a loan application landing while the queries run
+            dashboard_cache.invalidate_dashboard("user-1")
+            return MagicMock(data=[PROFILE])
+
+        profiles.execute.side_effect = execute
+        supabase = _supabase(profiles, _result(0, LOANS))
+
+        with patch.object(user, "supabase_client", supabase):
+            response = TestClient(app).get("/user/dashboard")
+
+        assert response.status_code == 200
+        assert "etag" in response.headers
+        assert dashboard_cache.get("user-1") is None
+
+    def test_store_after_build_without_changes(self):
+        """An unchanged generation caches; an invalidated one does not."""
+        built_at = dashboard_cache.generation("user-2")
+        dashboard_cache.store("user-2", {"customer_score": 700}, built_at)
+        assert dashboard_cache.get("user-2") is not None
+
+        built_at = dashboard_cache.generation("user-2")
+        dashboard_cache.invalidate_dashboard()
+        dashboard_cache.store("user-2", {"customer_score": 710}, built_at)
+        assert dashboard_cache.get("user-2") is None
+
+    def test_profile_update_invalidates(self):
+        """Updating the profile changes the next dashboard and its ETag."""
+        updated = {**PROFILE, "monthly_expenses": 90000}
+        profiles = _result(0, [PROFILE])
+        supabase = _supabase(profiles, _result(0, LOANS))
+        tables = supabase.table.side_effect
+
+        def table(name):
+            chain = tables(name)
+            chain.update.return_value.eq.return_value.execute.return_value.data = [updated]
+            return chain
+
+        supabase.table.side_effect = table
+
+        with patch.object(user, "supabase_client", supabase):
+            client = TestClient(app)
+            before = client.get("/user/dashboard")
+            profiles.execute.side_effect = lambda: MagicMock(data=[updated])
+            assert client.put("/user/profile", json={"monthly_expenses": 90000}).status_code == 200
+            after = client.get("/user/dashboard", headers={"If-None-Match": before.headers["etag"]})
+
+        assert after.status_code == 200
+        assert after.json()["monthly_expenses"] == 90000
+        assert after.headers["etag"] != before.headers["etag"]
+
+    def test_loan_application_invalidates(self):
+        """Applying for a loan evicts the applicant's cached dashboard."""
+        dashboard_cache.store("user-1", {"customer_score": 700})
+        supabase = MagicMock()
+        supabase.table.return_value.insert.return_value.execute.return_value.data = [
+            {"id": 7, "status": "APPROVED"}
+        ]
+        risk = {"score": 20, "status": "APPROVED", "reasons": [], "emi": 4442.44}
+
+        with patch.object(loans, "supabase_client", supabase), \
+                patch.object(loans, "calculate_risk_score", return_value=risk), \
+                patch.object(loans.audit, "log_action", AsyncMock()), \
+                patch.object(loans.explanations, "schedule_explanation"):
+            response = TestClient(app).post("/loans/apply?defer_explanation=true", json={
+                "amount": 50000, "tenure_months": 12, "monthly_income": 100000,
+                "monthly_expenses": 30000, "purpose": "Education"
+            })
+
+        assert response.status_code == 200
+        assert dashboard_cache.get("user-1") is None
@@ -0,0 +1,123 @@
+"""
+Tests for the non-blocking database access layer.
+"""
+
+import asyncio
+import threading
+import time
+from unittest.mock import MagicMock, patch
+from app.utils import db
+
+
+def _slow_query(delay: float, data=None) -> MagicMock:
+    """Mock query builder whose execute() blocks for `delay` seconds."""
+    def execute():
+        time.sleep(delay)
+        return MagicMock(data=data)
+
+    query = MagicMock()
+    query.execute.side_effect = execute
+    return query
+
+
+class TestExecute:
+    """Tests for db.execute and db.run."""
+
+    def test_queries_overlap(self):
+        """Concurrent slow queries take about one round trip, not N."""
+        delay, calls = 0.2, 20
+
+        async def run():
+            start = time.perf_counter()
+            responses = await asyncio.gather(*[
+                db.execute(_slow_query(delay, data=[i])) for i in range(calls)
+            ])
+            return responses, time.perf_counter() - start
+
+        responses, elapsed = asyncio.run(run())
+
+        assert [r.data for r in responses] == [[i] for i in range(calls)]
+        assert elapsed < delay * calls / 4, f"Queries did not overlap ({elapsed:.2f}s)"
+
+    def test_event_loop_stays_responsive(self):
+        """Other coroutines keep running while a query is in flight."""
+        async def run():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            task = asyncio.create_task(ticker())
+            await db.execute(_slow_query(0.3))
+            task.cancel()
+            return ticks
+
+        assert asyncio.run(run()) >= 10
+
+    def test_runs_off_loop_thread_and_propagates_errors(self):
+        """Calls run on the DB pool and exceptions reach the caller."""
+        def failing():
+            assert threading.current_thread().name.startswith("db")
+            raise ValueError("relation does not exist")
+
+        async def run():
+            try:
+                await db.run(failing)
+            except ValueError as e:
+                return str(e)
+
+        assert asyncio.run(run()) == "relation does not exist"
+
+
+class TestProfileLookup:
+    """Admin profile enrichment issues its batches concurrently."""
+
+    def test_batches_run_concurrently(self):
+        from app.routers import admin
+
+        def in_(column, batch):
+            return _slow_query(0.2, data=[{"id": uid, "full_name": uid.upper()} for uid in batch])
+
+        supabase = MagicMock()
+        supabase.table.return_value.select.return_value.in_.side_effect = in_
+        user_ids = [f"u{i}" for i in range(admin.PROFILE_BATCH_SIZE * 4)]
+
+        with patch.object(admin, "supabase_client", supabase):
+            start = time.perf_counter()
+            profiles = asyncio.run(admin._fetch_profile_map(user_ids))
+            elapsed = time.perf_counter() - start
+
+        assert len(profiles) == len(user_ids)
+        assert elapsed < 0.6
+
+
+class TestGather:
+    """Tests for db.gather fan-out."""
+
+    def test_takes_slowest_not_sum(self):
+        """Independent queries complete in about the slowest one's time."""
+        async def run():
+            start = time.perf_counter()
+            results = await db.gather(_slow_query(0.3, "a"), _slow_query(0.3, "b"), _slow_query(0.1, "c"))
+            return results, time.perf_counter() - start
+
+        results, elapsed = asyncio.run(run())
+
+        assert [r.data for r in results] == ["a", "b", "c"]
+        assert elapsed < 0.5
+
+    def test_timeout_and_failure_are_per_query(self):
+        """A slow or failing query yields its exception; the others still return."""
+        failing = MagicMock()
+        failing.execute.side_effect = ConnectionError("reset")
+
+        results = asyncio.run(db.gather(
+            _slow_query(1.0), failing, _slow_query(0, "ok"), timeout=0.1
+        ))
+
+        assert isinstance(results[0], asyncio.TimeoutError)
+        assert isinstance(results[1], ConnectionError)
+        assert results[2].data == "ok"
@@ -0,0 +1,47 @@
+"""
+Tests for deferred loan explanation generation.
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+
+RISK_RESULT = {"score": 70, "status": "REJECTED", "emi": 4442.44, "reasons": ["High DTI ratio"]}
+
+
+class TestDeferredExplanation:
+    """Tests for the background explanation task."""
+
+    def test_scheduled_explanation_is_stored_and_awaitable(self):
+        """A scheduled task saves the message and can be awaited by loan ID."""
+        from app.services import explanations
+
+        supabase = MagicMock()
+
+        async def run():
+            explanations.schedule_explanation(42, RISK_RESULT, 50000, 12)
+            assert explanations.is_pending(42)
+            text = await explanations.wait_for_explanation(42, timeout=1)
+            await asyncio.sleep(0)
+            return text
+
+        with patch.object(explanations, "supabase_client", supabase), \
+                patch.object(explanations, "generate_rejection_reason",
+                             AsyncMock(return_value="Please reduce your EMI burden.")):
+            text = asyncio.run(run())
+
+        assert text == "Please reduce your EMI burden."
+        assert not explanations.is_pending(42)
+        supabase.table.return_value.update.assert_called_once_with(
+            {"ai_explanation": "Please reduce your EMI burden."}
+        )
+        # Never overwrite an explanation an admin has already written
+        supabase.table.return_value.update.return_value.eq.return_value.is_.assert_called_once_with(
+            "ai_explanation", "null"
+        )
+
+    def test_wait_without_pending_task_returns_none(self):
+        """Loans with nothing in flight return None immediately."""
+        from app.services import explanations
+
+        assert asyncio.run(explanations.wait_for_explanation(999, timeout=1)) is None
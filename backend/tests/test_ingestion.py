@@ -0,0 +1,278 @@
+"""
+Tests for batched statement ingestion.
+"""
+
+import asyncio
+import threading
+import time
+from collections import Counter
+import httpx
+from postgrest.exceptions import APIError
+from unittest.mock import MagicMock, patch
+from app.services import ingestion
+
+
+def _rows(n):
+    return [{"description": f"txn {i}", "amount": -i} for i in range(n)]
+
+
+def _mock_supabase(fail_times=0, delay=0.0, error=None):
+    """Supabase mock whose transactions insert echoes rows after optional failures."""
+    state = {"calls": 0, "in_flight": 0, "max_in_flight": 0}
+    lock = threading.Lock()
+
+    def insert(rows):
+        query = MagicMock()
+
+        def execute():
+            with lock:
+                state["calls"] += 1
+                call = state["calls"]
+                state["in_flight"] += 1
+                state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+            try:
+                time.sleep(delay)
+                if call <= fail_times:
+                    raise error or Exception("statement timeout")
+                return MagicMock(data=rows)
+            finally:
+                with lock:
+                    state["in_flight"] -= 1
+
+        query.execute.side_effect = execute
+        return query
+
+    supabase = MagicMock()
+    supabase.table.return_value.insert.side_effect = insert
+    return supabase, state
+
+
+class TestTransactionWriter:
+    """Tests for TransactionWriter."""
+
+    def test_rows_split_into_batches(self):
+        """Rows are written in batch_size groups and fully counted."""
+        supabase, state = _mock_supabase()
+
+        async def run():
+            writer = ingestion.TransactionWriter(batch_size=100, max_concurrency=2)
+            await writer.add(_rows(250))
+            await writer.add(_rows(10))
+            return await writer.close()
+
+        with patch.object(ingestion, "supabase_client", supabase):
+            summary = asyncio.run(run())
+
+        assert summary == {"saved": 260, "failed": 0, "skipped": 0, "batches": 3, "failed_batches": []}
+        assert state["calls"] == 3
+
+    def test_concurrency_is_bounded(self):
+        """No more than max_concurrency inserts run at once."""
+        supabase, state = _mock_supabase(delay=0.05)
+
+        async def run():
+            writer = ingestion.TransactionWriter(batch_size=10, max_concurrency=2)
+            await writer.add(_rows(100))
+            return await writer.close()
+
+        with patch.object(ingestion, "supabase_client", supabase):
+            summary = asyncio.run(run())
+
+        assert summary["saved"] == 100
+        assert state["max_in_flight"] == 2
+
+    def test_failed_batch_is_retried(self):
+        """A connection failure is retried and the batch is still saved."""
+        supabase, state = _mock_supabase(fail_times=1, error=httpx.ConnectError("connection refused"))
+
+        async def run():
+            writer = ingestion.TransactionWriter(batch_size=50, max_retries=2, retry_backoff=0)
+            await writer.add(_rows(50))
+            await writer.close()
+            return writer.outcomes
+
+        with patch.object(ingestion, "supabase_client", supabase):
+            outcomes = asyncio.run(run())
+
+        assert outcomes == [{"batch": 1, "rows": 50, "saved": 50, "attempts": 2, "status": "saved"}]
+
+    def test_insert_not_resent_after_ambiguous_failure(self):
+        """A timed-out insert may have committed, so it is not inserted twice."""
+        supabase, state = _mock_supabase(fail_times=1, error=httpx.ReadTimeout("timed out"))
+
+        async def run():
+            writer = ingestion.TransactionWriter(batch_size=50, max_retries=3, retry_backoff=0)
+            await writer.add(_rows(50))
+            return await writer.close()
+
+        with patch.object(ingestion, "supabase_client", supabase):
+            summary = asyncio.run(run())
+
+        assert state["calls"] == 1
+        assert summary["failed_batches"][0]["attempts"] == 1
+
+    def test_upsert_retried_after_ambiguous_failure(self):
+        """Upserts skip rows that already landed, so any failure is retried."""
+        calls = []
+
+        def upsert(rows, **kwargs):
+            def execute():
+                calls.append(len(rows))
+                if len(calls) == 1:
+                    raise httpx.ReadTimeout("timed out")
+                return MagicMock(data=rows)
+            return MagicMock(execute=MagicMock(side_effect=execute))
+
+        supabase = MagicMock()
+        supabase.table.return_value.upsert.side_effect = upsert
+
+        async def run():
+            writer = ingestion.TransactionWriter(
+                batch_size=50, max_retries=2, retry_backoff=0, on_conflict="user_id,content_hash"
+            )
+            await writer.add(_rows(50))
+            return await writer.close()
+
+        with patch.object(ingestion, "supabase_client", supabase):
+            summary = asyncio.run(run())
+
+        assert calls == [50, 50]
+        assert summary["saved"] == 50
+
+    def test_exhausted_retries_reported(self):
+        """A batch that keeps failing is reported, not silently dropped."""
+        supabase, _ = _mock_supabase(fail_times=99, error=httpx.ConnectError("connection refused"))
+
+        async def run():
+            writer = ingestion.TransactionWriter(batch_size=50, max_retries=1, retry_backoff=0)
+            await writer.add(_rows(60))
+            return await writer.close()
+
+        with patch.object(ingestion, "supabase_client", supabase):
+            summary = asyncio.run(run())
+
+        assert summary["saved"] == 0
+        assert summary["failed"] == 60
+        assert [b["rows"] for b in summary["failed_batches"]] == [50, 10]
+        assert summary["failed_batches"][0]["error"] == "connection refused"
+        assert summary["failed_batches"][0]["attempts"] == 2
+
+    def test_statement_progress_updated(self):
+        """transactions_count is updated after each saved batch."""
+        supabase, _ = _mock_supabase()
+
+        async def run():
+            writer = ingestion.TransactionWriter(statement_id=7, batch_size=10, max_concurrency=1)
+            await writer.add(_rows(30))
+            return await writer.close()
+
+        with patch.object(ingestion, "supabase_client", supabase):
+            asyncio.run(run())
+
+        counts = [c.args[0]["transactions_count"] for c in supabase.table.return_value.update.call_args_list]
+        assert counts == [10, 20, 30]
+
+
+STATEMENT = (
+    b"Date,Narration,Debit,Credit,Balance\n"
+    b"2024-01-01,Swiggy order,250,,9750\n"
+    b"2024-01-02,Chai,20,,\n"
+    b"2024-01-02,Chai,20,,\n"
+    b"2024-01-03,Salary January,,50000,59710\n"
+)
+
+
+def _mock_saved_hashes(saved):
+    """Supabase mock backed by a set of saved content hashes."""
+    supabase = MagicMock()
+
+    def lookup(column, hashes):
+        found = [{"content_hash": h} for h in hashes if h in saved]
+        return MagicMock(execute=MagicMock(return_value=MagicMock(data=found)))
+
+    def upsert(rows, on_conflict=None, ignore_duplicates=False):
+        new = [row for row in rows if row["content_hash"] not in saved]
+        saved.update(row["content_hash"] for row in new)
+        return MagicMock(execute=MagicMock(return_value=MagicMock(data=new)))
+
+    table = supabase.table.return_value
+    table.select.return_value.eq.return_value.in_.side_effect = lookup
+    table.upsert.side_effect = upsert
+    return supabase
+
+
+class TestDeduplication:
+    """Tests for content-hash duplicate detection."""
+
+    def test_hash_is_stable_and_normalized(self):
+        """Formatting differences hash alike; any field change does not."""
+        txn = {"date": "2024-01-01", "description": "UPI/123/Swiggy", "amount": -250, "balance": 9750}
+
+        assert ingestion.transaction_hash("u1", txn) == ingestion.transaction_hash(
+            "u1", {**txn, "description": "  upi/123/SWIGGY ", "amount": -250.0}
+        )
+        assert ingestion.transaction_hash("u1", txn) != ingestion.transaction_hash("u2", txn)
+        assert ingestion.transaction_hash("u1", txn) != ingestion.transaction_hash(
+            "u1", {**txn, "description": "UPI/124/Swiggy"}
+        )
+
+    def test_repeated_rows_numbered_across_chunks(self):
+        """Identical rows in one statement get distinct hashes."""
+        txn = {"date": "2024-01-02", "description": "Chai", "amount": -20, "balance": None}
+        occurrences = Counter()
+
+        first = ingestion.to_transaction_rows([txn], "u1", occurrences)
+        second = ingestion.to_transaction_rows([txn], "u1", occurrences)
+
+        assert first[0]["content_hash"] != second[0]["content_hash"]
+
+    def test_reupload_saves_only_new_rows(self):
+        """A second upload of an overlapping statement reports duplicates."""
+        saved = set()
+        supabase = _mock_saved_hashes(saved)
+
+        with patch.object(ingestion, "supabase_client", supabase):
+            first = asyncio.run(ingestion.ingest_statement(STATEMENT, "user-1"))
+            overlap = STATEMENT + b"2024-01-04,Uber trip,310,,59400\n"
+            second = asyncio.run(ingestion.ingest_statement(overlap, "user-1"))
+
+        assert (first["transactions_new"], first["transactions_duplicate"]) == (4, 0)
+        assert (second["transactions_new"], second["transactions_duplicate"]) == (1, 4)
+        assert len(saved) == 5
+
+    def test_conflicts_at_write_counted_as_duplicates(self):
+        """Rows missed by the lookup are skipped by the unique index."""
+        saved = set()
+        supabase = _mock_saved_hashes(saved)
+        supabase.table.return_value.select.return_value.eq.return_value.in_.side_effect = \
+            Exception("column transactions.content_hash does not exist")
+
+        with patch.object(ingestion, "supabase_client", supabase):
+            asyncio.run(ingestion.ingest_statement(STATEMENT, "user-1"))
+            result = asyncio.run(ingestion.ingest_statement(STATEMENT, "user-1"))
+
+        assert result["status"] == "completed"
+        assert (result["transactions_new"], result["transactions_duplicate"]) == (0, 4)
+
+    def test_missing_dedup_schema_falls_back_to_insert(self):
+        """Without sql/transaction_dedup.sql, rows are inserted without hashes."""
+        supabase = MagicMock()
+        supabase.table.return_value.upsert.return_value.execute.side_effect = APIError({
+            "code": "42P10",
+            "message": "there is no unique or exclusion constraint matching the ON CONFLICT specification"
+        })
+        supabase.table.return_value.insert.side_effect = lambda rows: MagicMock(
+            execute=MagicMock(return_value=MagicMock(data=rows))
+        )
+
+        with patch.object(ingestion, "supabase_client", supabase), \
+                patch.object(ingestion, "_dedup_available", True):
+            first = asyncio.run(ingestion.ingest_statement(STATEMENT, "user-1"))
+            assert ingestion._dedup_available is False
+            second = asyncio.run(ingestion.ingest_statement(STATEMENT, "user-1"))
+
+        assert (first["status"], first["transactions_saved"]) == ("completed", 4)
+        assert (second["status"], second["transactions_saved"]) == ("completed", 4)
+        assert supabase.table.return_value.upsert.call_count == 1
+        inserted = [c.args[0] for c in supabase.table.return_value.insert.call_args_list]
+        assert all("content_hash" not in row for rows in inserted for row in rows)
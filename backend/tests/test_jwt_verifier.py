@@ -0,0 +1,168 @@
+"""
+Tests for local JWT verification in get_current_user.
+"""
+
+import asyncio
+import base64
+import json
+import time
+import jwt
+import pytest
+from unittest.mock import MagicMock, patch
+from fastapi import HTTPException
+
+SECRET = "test-jwt-secret-with-enough-entropy-0123456789"
+
+
+def _token(exp_offset: int = 3600, secret: str = SECRET, **claims) -> str:
+    payload = {
+        "sub": "user-123",
+        "email": "user@example.com",
+        "aud": "authenticated",
+        "exp": int(time.time()) + exp_offset,
+        "user_metadata": {"full_name": "Test User"},
+    }
+    payload.update(claims)
+    return jwt.encode(payload, secret, algorithm="HS256")
+
+
+def _supabase_with_role(role: str) -> MagicMock:
+    supabase = MagicMock()
+    supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [
+        {"role": role}
+    ]
+    return supabase
+
+
+@pytest.fixture(autouse=True)
+def clear_role_cache():
+    """Start every test without cached roles."""
+    from app.utils import security
+    security.invalidate_user_role()
+    yield
+    security.invalidate_user_role()
+
+
+class TestLocalVerification:
+    """Tests for in-process token verification."""
+
+    def test_valid_token_skips_remote_call(self):
+        """A valid HS256 token is verified without calling Supabase auth."""
+        from app.utils import security, jwt_verifier
+
+        supabase = _supabase_with_role("admin")
+        with patch.object(jwt_verifier, "SUPABASE_JWT_SECRET", SECRET), \
+                patch.object(security, "supabase_client", supabase):
+            user = asyncio.run(security.get_current_user(_token()))
+
+        assert user.id == "user-123"
+        assert user.email == "user@example.com"
+        assert user.full_name == "Test User"
+        assert user.role == "admin"
+        supabase.auth.get_user.assert_not_called()
+
+    def test_expired_token_rejected(self):
+        """Expired tokens return 401."""
+        from app.utils import security, jwt_verifier
+
+        with patch.object(jwt_verifier, "SUPABASE_JWT_SECRET", SECRET), \
+                patch.object(security, "supabase_client", MagicMock()):
+            with pytest.raises(HTTPException) as exc:
+                asyncio.run(security.get_current_user(_token(exp_offset=-60)))
+
+        assert exc.value.status_code == 401
+        assert "expired" in exc.value.detail.lower()
+
+    @pytest.mark.parametrize("token", [
+        _token(secret="some-other-secret-with-enough-entropy-987"),
+        _token(aud="anon"),
+        "not-a-jwt",
+    ])
+    def test_invalid_tokens_rejected(self, token):
+        """Wrong signature, wrong audience and malformed tokens return 401."""
+        from app.utils import security, jwt_verifier
+
+        supabase = MagicMock()
+        with patch.object(jwt_verifier, "SUPABASE_JWT_SECRET", SECRET), \
+                patch.object(security, "supabase_client", supabase):
+            with pytest.raises(HTTPException) as exc:
+                asyncio.run(security.get_current_user(token))
+
+        assert exc.value.status_code == 401
+        supabase.auth.get_user.assert_not_called()
+
+    def test_falls_back_to_remote_without_key(self):
+        """With no signing key configured, Supabase auth verifies the token."""
+        from app.utils import security, jwt_verifier
+
+        supabase = _supabase_with_role("user")
+        remote_user = MagicMock(id="user-456", email="remote@example.com", user_metadata={})
+        supabase.auth.get_user.return_value = MagicMock(user=remote_user)
+
+        with patch.object(jwt_verifier, "SUPABASE_JWT_SECRET", ""), \
+                patch.object(security, "supabase_client", supabase):
+            user = asyncio.run(security.get_current_user(_token()))
+
+        assert user.id == "user-456"
+        supabase.auth.get_user.assert_called_once()
+
+
+class TestJWKSVerification:
+    """Tests for asymmetric tokens verified against the JWKS."""
+
+    @staticmethod
+    def _cache(keys):
+        """JWKSCache already loaded with the given public keys, no network."""
+        from app.utils import jwt_verifier
+
+        cache = jwt_verifier.JWKSCache("https://example.test/jwks.json")
+        cache._keys = {kid: jwt.PyJWK(jwk) for kid, jwk in keys.items()}
+        cache._started = True
+        return cache
+
+    def test_algorithm_must_match_key(self):
+        """An ES256 token pointing at an RSA key is a 401, not a 500."""
+        from cryptography.hazmat.primitives.asymmetric import ec, rsa
+        from app.utils import security, jwt_verifier
+
+        rsa_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        rsa_jwk = jwt.algorithms.RSAAlgorithm.to_jwk(rsa_key.public_key(), as_dict=True)
+        payload = {"sub": "user-123", "aud": "authenticated", "exp": int(time.time()) + 3600}
+        forged = jwt.encode(payload, ec.generate_private_key(ec.SECP256R1()), algorithm="ES256",
+                            headers={"kid": "rsa-1"})
+        valid = jwt.encode(payload, rsa_key, algorithm="RS256", headers={"kid": "rsa-1"})
+
+        supabase = _supabase_with_role("user")
+        with patch.object(jwt_verifier, "_jwks_cache", self._cache({"rsa-1": rsa_jwk})), \
+                patch.object(security, "supabase_client", supabase):
+            with pytest.raises(HTTPException) as exc:
+                asyncio.run(security.get_current_user(forged))
+            user = asyncio.run(security.get_current_user(valid))
+
+        assert exc.value.status_code == 401
+        assert user.id == "user-123"
+        supabase.auth.get_user.assert_not_called()
+
+    def test_unknown_kids_refresh_at_most_once(self):
+        """Random key IDs trigger one JWKS fetch per interval, off the event loop."""
+        import threading
+        from app.utils import jwt_verifier
+
+        cache = self._cache({})
+        fetch_threads = []
+
+        def fetch():
+            fetch_threads.append(threading.current_thread().name)
+            return False
+
+        with patch.object(cache, "_fetch", side_effect=fetch), \
+                patch.object(jwt_verifier, "_jwks_cache", cache):
+            for i in range(20):
+                header = base64.urlsafe_b64encode(
+                    json.dumps({"alg": "RS256", "kid": f"random-{i}"}).encode()
+                ).rstrip(b"=").decode()
+                token = f"{header}.e30.c2ln"
+                assert asyncio.run(jwt_verifier.verify_token(token)) is None
+
+        assert len(fetch_threads) == 1
+        assert fetch_threads[0].startswith("db")
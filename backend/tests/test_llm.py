@@ -0,0 +1,178 @@
+"""
+Tests for the LLM service execution path.
+Verifies that blocking Gemini calls run off the event loop.
+"""
+
+import asyncio
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+
+
+def _slow_model(delay: float, text: str = "ok") -> MagicMock:
+    """Mock Gemini model whose generate_content blocks for `delay` seconds."""
+    def generate_content(prompt):
+        time.sleep(delay)
+        response = MagicMock()
+        response.text = f"  {text}  "
+        return response
+
+    model = MagicMock()
+    model.generate_content.side_effect = generate_content
+    return model
+
+
+@pytest.fixture(autouse=True)
+def clear_response_cache():
+    """Start every test with an empty LLM response cache."""
+    from app.services import llm
+    asyncio.run(llm.response_cache.clear())
+    yield
+    asyncio.run(llm.response_cache.clear())
+
+
+class TestAsyncExecution:
+    """Tests that slow model calls overlap instead of serializing."""
+
+    def test_slow_calls_overlap(self):
+        """N concurrent slow calls should take about one call's time, not N."""
+        from app.services import llm
+
+        delay = 0.3
+        calls = 5
+
+        async def run():
+            start = time.perf_counter()
+            results = await asyncio.gather(*[
+                llm.generate_risk_explanation(score=10, status="APPROVED", reasons=[f"Reason {i}"])
+                for i in range(calls)
+            ])
+            return results, time.perf_counter() - start
+
+        with patch.object(llm, "gemini_model", _slow_model(delay)):
+            results, elapsed = asyncio.run(run())
+
+        assert results == ["ok"] * calls
+        assert elapsed < delay * calls / 2, f"Calls did not overlap ({elapsed:.2f}s)"
+
+    def test_event_loop_stays_responsive(self):
+        """Other coroutines keep running while a model call is in flight."""
+        from app.services import llm
+
+        async def run():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            task = asyncio.create_task(ticker())
+            await llm.generate_loan_summary(50000, 12, 20.0, "LOW")
+            task.cancel()
+            return ticks
+
+        with patch.object(llm, "gemini_model", _slow_model(0.3)):
+            ticks = asyncio.run(run())
+
+        assert ticks >= 10
+
+    def test_timeout_falls_back(self):
+        """A call exceeding the timeout returns the fallback text."""
+        from app.services import llm
+
+        with patch.object(llm, "gemini_model", _slow_model(1.0)), \
+                patch.object(llm, "LLM_TIMEOUT_SECONDS", 0.05):
+            start = time.perf_counter()
+            result = asyncio.run(llm.generate_rejection_reason(["High DTI ratio"]))
+            elapsed = time.perf_counter() - start
+
+        assert "could not be approved" in result
+        assert elapsed < 0.5
+
+
+class TestResponseCache:
+    """Tests for the prompt-hash response cache."""
+
+    def test_repeated_prompt_hits_cache(self):
+        """Identical inputs call the model once."""
+        from app.services import llm
+
+        model = _slow_model(0, "Please reapply later.")
+        with patch.object(llm, "gemini_model", model):
+            first = asyncio.run(llm.generate_rejection_reason(["High DTI ratio"]))
+            second = asyncio.run(llm.generate_rejection_reason(["High DTI ratio"]))
+
+        assert first == second == "Please reapply later."
+        assert model.generate_content.call_count == 1
+        stats = llm.llm_service.cache_stats()
+        assert stats["hits"] >= 1 and stats["misses"] >= 1
+
+    def test_key_ignores_whitespace(self):
+        """Prompts differing only in whitespace share a key."""
+        from app.services.llm import prompt_cache_key
+
+        assert prompt_cache_key("Risk  Score:\n 10") == prompt_cache_key("Risk Score: 10")
+        assert prompt_cache_key("Risk Score: 10") != prompt_cache_key("Risk Score: 11")
+
+    def test_invalidation_forces_regeneration(self):
+        """Clearing the cache sends the next request to the model."""
+        from app.services import llm
+
+        model = _slow_model(0)
+        with patch.object(llm, "gemini_model", model):
+            asyncio.run(llm.generate_approval_message(50000, 4442.44, 12))
+            asyncio.run(llm.llm_service.invalidate_cache())
+            asyncio.run(llm.generate_approval_message(50000, 4442.44, 12))
+
+        assert model.generate_content.call_count == 2
+
+    def test_fallback_text_not_cached(self):
+        """Model errors are not cached, so the next call retries the model."""
+        from app.services import llm
+
+        model = MagicMock()
+        model.generate_content.side_effect = Exception("API rate limit")
+        with patch.object(llm, "gemini_model", model):
+            asyncio.run(llm.generate_risk_explanation(80, "REJECTED", ["High DTI"]))
+            asyncio.run(llm.generate_risk_explanation(80, "REJECTED", ["High DTI"]))
+
+        assert model.generate_content.call_count == 2
+
+    def test_shared_backend_populates_local_cache(self):
+        """A shared-backend hit is served without calling the model."""
+        from app.services import llm
+
+        backend = MagicMock()
+        backend.get.return_value = "Shared explanation"
+        cache = llm.LLMResponseCache(maxsize=8, ttl=60, backend=backend)
+        model = _slow_model(0)
+
+        with patch.object(llm, "response_cache", cache), patch.object(llm, "gemini_model", model):
+            first = asyncio.run(llm.generate_risk_explanation(10, "APPROVED", ["Healthy DTI"]))
+            second = asyncio.run(llm.generate_risk_explanation(10, "APPROVED", ["Healthy DTI"]))
+
+        assert first == second == "Shared explanation"
+        assert model.generate_content.call_count == 0
+        assert backend.get.call_count == 1
+        assert cache.stats()["shared_hits"] == 1
+
+    def test_backend_invalidation_runs_off_the_loop(self):
+        """Shared-backend deletes run on the DB pool, like reads and writes."""
+        from app.services import llm
+
+        threads = []
+        backend = MagicMock()
+        backend.delete.side_effect = lambda key: threads.append(threading.current_thread().name)
+        backend.clear.side_effect = lambda: threads.append(threading.current_thread().name)
+        cache = llm.LLMResponseCache(maxsize=8, ttl=60, backend=backend)
+
+        with patch.object(llm, "response_cache", cache):
+            asyncio.run(llm.llm_service.invalidate_cache("Risk Score: 10"))
+            asyncio.run(llm.llm_service.invalidate_cache())
+
+        backend.delete.assert_called_once_with(llm.prompt_cache_key("Risk Score: 10"))
+        assert len(threads) == 2
+        assert all(name.startswith("db") for name in threads)
@@ -3,6 +3,7 @@ Comprehensive tests for Loan Amortization Schedule Endpoint.
 Tests cover edge cases for amortization calculation, PDF generation, and authorization.
 """
 
+import asyncio
 import pytest
 from unittest.mock import MagicMock, patch
 from fastapi.testclient import TestClient
@@ -206,6 +207,49 @@ class TestAmortizationCalculation:
             assert rounded_principal == float(f"{principal_payment:.2f}")
 
 
+# ============ Tests for the Decimal Schedule Engine ============
+
+class TestScheduleEngine:
+    """Tests for risk_engine.generate_amortization_schedule."""
+
+    def test_schedule_closes_at_zero(self):
+        """Principal repaid sums exactly to the loan amount."""
+        from decimal import Decimal
+        from app.services.risk_engine import generate_amortization_schedule
+
+        data = generate_amortization_schedule(100000, 12, 12.0)
+
+        assert len(data["schedule"]) == 12
+        assert data["schedule"][-1]["balance"] == 0.0
+        total_principal = sum(Decimal(str(row["principal"])) for row in data["schedule"])
+        assert total_principal == Decimal("100000")
+
+    def test_schedule_totals_are_consistent(self):
+        """Total payment equals principal plus total interest."""
+        from app.services.risk_engine import generate_amortization_schedule
+
+        data = generate_amortization_schedule(500000, 360, 10.0)
+
+        assert len(data["schedule"]) == 360
+        assert round(data["loan_amount"] + data["total_interest"], 2) == data["total_payment"]
+        assert all(row["emi"] == data["emi"] for row in data["schedule"][:-1])
+
+    def test_schedule_zero_interest(self):
+        """Zero interest splits the principal evenly."""
+        from app.services.risk_engine import generate_amortization_schedule
+
+        data = generate_amortization_schedule(12000, 12, 0.0)
+
+        assert all(row["interest"] == 0.0 for row in data["schedule"])
+        assert all(row["principal"] == 1000.0 for row in data["schedule"])
+
+    def test_schedule_invalid_loan_is_empty(self):
+        """Non-positive principal produces no schedule."""
+        from app.services.risk_engine import generate_amortization_schedule
+
+        assert generate_amortization_schedule(0, 12)["schedule"] == []
+
+
 # ============ Integration Tests for Schedule Endpoint ============
 
 class TestScheduleEndpoint:
@@ -229,6 +273,32 @@ class TestScheduleEndpoint:
         # Should return 401/403 (auth fails first) or 404 if auth passes
         assert response.status_code in [401, 403, 404, 422]
 
+    @pytest.mark.parametrize("stored_rate, expected_rate, expected_interest", [
+        (0, 0.0, 0.0),
+        (None, 12.0, 6618.53),
+    ])
+    def test_schedule_uses_stored_rate(self, stored_rate, expected_rate, expected_interest):
+        """A 0% loan stays interest-free; only a missing rate uses the default."""
+        from app.routers import loans
+        from app.utils.security import get_current_user, CurrentUser
+
+        supabase = MagicMock()
+        supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [{
+            "id": "loan-1", "user_id": "user-1", "status": "APPROVED",
+            "amount": 100000, "tenure_months": 12, "interest_rate": stored_rate
+        }]
+        app.dependency_overrides[get_current_user] = lambda: CurrentUser(id="user-1", email="user@example.com")
+        try:
+            with patch.object(loans, "supabase_client", supabase):
+                response = TestClient(app).get("/loans/loan-1/schedule")
+        finally:
+            app.dependency_overrides.pop(get_current_user, None)
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["interest_rate"] == expected_rate
+        assert body["total_interest"] == expected_interest
+
 
 # ============ Tests for PDF Generation ============
 
@@ -256,7 +326,7 @@ class TestPdfGeneration:
         # Import and test the function
         try:
             from app.routers.loans import generate_schedule_pdf
-            response = generate_schedule_pdf(schedule_data, "Test User")
+            response = asyncio.run(generate_schedule_pdf(schedule_data, "Test User"))
             
             # Should return a StreamingResponse
             assert response is not None
@@ -266,6 +336,32 @@ class TestPdfGeneration:
             pytest.skip("Could not import generate_schedule_pdf")
 
 
+    def test_pdf_is_cached_and_streamed(self):
+        """Test that repeated downloads reuse the rendered PDF."""
+        from app.routers import loans
+        from app.services.risk_engine import generate_amortization_schedule
+
+        schedule_data = generate_amortization_schedule(250000, 360, 12.0)
+        schedule_data["loan_id"] = "cache-test-loan"
+
+        async def run():
+            first = await loans.generate_schedule_pdf(schedule_data, "Test User")
+            second = await loans.generate_schedule_pdf(schedule_data, "Test User")
+            other = await loans.generate_schedule_pdf(schedule_data, "Other Borrower")
+            return [chunk async for chunk in first.body_iterator], second, other
+
+        with patch.object(loans, "_render_schedule_pdf", wraps=loans._render_schedule_pdf) as render, \
+                patch.object(loans, "PDF_STREAM_CHUNK_SIZE", 4096):
+            first_chunks, second, other = asyncio.run(run())
+
+        # The borrower name is printed in the PDF, so it is part of the key
+        assert render.call_count == 2
+        assert render.call_args.args[1] == "Other Borrower"
+        assert len(first_chunks) > 1
+        assert b"".join(first_chunks).startswith(b"%PDF")
+        assert int(second.headers["content-length"]) == sum(len(c) for c in first_chunks)
+
+
 # ============ Edge Case Tests for Schedule Data ============
 
 class TestScheduleEdgeCases:
@@ -0,0 +1,173 @@
+"""
+Tests for bank statement parsing.
+"""
+
+import asyncio
+import io
+import pytest
+from app.services import parser
+
+
+STATEMENT = (
+    b"Date,Narration,Debit,Credit,Balance\n"
+    b"2024-01-01,Swiggy order,250.456,,1000\n"
+    b"2024-01-02,Salary January,,50000,51000\n"
+    b"2024-01-03,,10,,\n"
+    b"2024-01-04,Netflix subscription,649,,50341\n"
+    b"2024-01-05,Uber trip,310.5,,50030.5\n"
+)
+
+
+class TestStreamingParser:
+    """Tests for chunked bank statement parsing."""
+
+    def test_chunks_match_full_parse(self):
+        """Streaming yields the same transactions as the one-shot parser."""
+        full = parser.parse_bank_statement_csv(STATEMENT)
+        chunks = list(parser.iter_bank_statement_chunks(io.BytesIO(STATEMENT), chunksize=2))
+
+        assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+        streamed = [txn for chunk in chunks for txn in chunk]
+        assert streamed == full
+
+    def test_rows_are_cleaned_and_categorized(self):
+        """Amounts are signed and rounded, blanks become None."""
+        rows = parser.parse_bank_statement_csv(STATEMENT)
+
+        assert rows[0]["amount"] == -250.46
+        assert rows[0]["category"] == "Food"
+        assert rows[0]["type"] == "Debit"
+        assert rows[1]["type"] == "Credit"
+        assert rows[2]["description"] is None
+        assert rows[2]["balance"] is None
+        assert rows[2]["category"] == "Misc"
+
+    def test_identity_checked_before_first_chunk(self):
+        """A name mismatch fails before any rows are yielded."""
+        source = io.BytesIO(b"Account Holder: Someone Else\n" + STATEMENT)
+        chunks = parser.iter_bank_statement_chunks(source, user_full_name="Priya Sharma")
+
+        with pytest.raises(ValueError, match="Identity Mismatch"):
+            next(chunks)
+
+    def test_empty_file(self):
+        """Empty input raises the same error as the one-shot parser."""
+        with pytest.raises(ValueError, match="empty"):
+            list(parser.iter_bank_statement_chunks(b""))
+
+
+class TestParallelParser:
+    """Tests for process-pool block parsing."""
+
+    def test_record_boundary_skips_quoted_newlines(self):
+        """Blocks are only cut at newlines outside quoted fields."""
+        buffer = b'2024-01-01,"Apollo\nPharmacy",10,,90\n2024-01-02,"Open\nquote'
+
+        cut = parser._last_record_boundary(buffer)
+
+        assert buffer[:cut].endswith(b"90\n")
+        assert parser._last_record_boundary(b'2024-01-01,"Apollo\nPhar') == 0
+
+    def test_blocks_match_full_parse(self):
+        """Small blocks across the pool reassemble in file order."""
+        statement = STATEMENT + b'2024-01-06,"Apollo\nPharmacy, Indiranagar",120,,49910.5\n'
+        full = parser.parse_bank_statement_csv(statement)
+
+        async def run():
+            rows = []
+            async for block in parser.iter_bank_statement_blocks(
+                io.BytesIO(statement), block_bytes=48
+            ):
+                rows.extend(block)
+            return rows
+
+        assert asyncio.run(run()) == full
+        assert full[-1]["category"] == "Healthcare"
+
+
+class TestCategorization:
+    """Tests for keyword categorization."""
+
+    def test_category_precedence(self):
+        """The first category in CATEGORY_KEYWORDS order wins, not the first keyword in the text."""
+        assert parser.categorize_transaction("SALARY credit via UBER") == "Transport"
+        assert parser.categorize_transaction("Zomato refund") == "Food"
+        assert parser.categorize_transaction("") == "Misc"
+        assert parser.categorize_transaction("ATM withdrawal") == "Misc"
+
+    def test_vectorized_matches_scalar(self):
+        """Column categorization agrees with the per-row function, including blanks."""
+        import pandas as pd
+
+        descriptions = pd.Series([
+            "UPI/1234/SWIGGY/okaxis", "NEFT SALARY ACME", None, "",
+            "Netflix.com", "Apollo Pharmacy", "UPI/1234/SWIGGY/okaxis",
+            "BESCOM electricity bill", "Cinema tickets", "unknown merchant",
+        ], index=range(10, 20))
+
+        result = parser.categorize_transactions(descriptions)
+
+        assert list(result.index) == list(descriptions.index)
+        assert result.tolist() == [parser.categorize_transaction(d) for d in descriptions.fillna("")]
+
+
+class TestMerchantCache:
+    """Tests for the normalized description -> category cache."""
+
+    def test_normalization_ignores_references(self):
+        """Reference numbers and punctuation do not change the merchant key."""
+        key = parser.normalize_description("UPI/402112345678/SWIGGY/okaxis")
+        assert key == "upi swiggy okaxis"
+        assert parser.normalize_description("UPI-9977-Swiggy-OKAXIS ") == key
+
+    def test_repeated_merchants_hit_cache(self):
+        """Distinct references for one merchant share a cache entry."""
+        cache = parser.MerchantCategoryCache(maxsize=10)
+
+        assert cache.lookup("upi swiggy okaxis") == "Food"
+        assert cache.lookup("upi swiggy okaxis") == "Food"
+        assert cache.stats()["hits"] == 1
+
+    def test_override_persists_and_reloads(self, tmp_path):
+        """Admin corrections win over keywords and survive a restart."""
+        path = str(tmp_path / "merchants.json")
+        cache = parser.MerchantCategoryCache(maxsize=10, path=path)
+        assert cache.lookup(parser.normalize_description("NEFT ACME PVT LTD")) == "Misc"
+
+        cache.set_override("NEFT/123/ACME PVT LTD", "Income")
+        assert cache.lookup(parser.normalize_description("NEFT 456 ACME PVT LTD")) == "Income"
+
+        reloaded = parser.MerchantCategoryCache(maxsize=10, path=path)
+        assert reloaded.overrides() == {"neft acme pvt ltd": "Income"}
+
+        assert reloaded.remove_override("NEFT ACME PVT LTD")
+        assert reloaded.lookup("neft acme pvt ltd") == "Misc"
+
+    def test_workers_sharing_a_file_keep_each_others_corrections(self, tmp_path):
+        """Each change merges into the file rather than overwriting it."""
+        path = str(tmp_path / "merchants.json")
+        first = parser.MerchantCategoryCache(maxsize=10, path=path)
+        second = parser.MerchantCategoryCache(maxsize=10, path=path)
+
+        first.set_override("NEFT ACME PVT LTD", "Income")
+        second.set_override("POS Reliance Smart", "Shopping")
+        first.remove_override("NEFT ACME PVT LTD")
+
+        expected = {"pos reliance smart": "Shopping"}
+        assert parser.MerchantCategoryCache(maxsize=10, path=path).overrides() == expected
+        assert first.overrides() == expected
+        assert first.lookup("pos reliance smart") == "Shopping"
+
+    def test_column_categorization_uses_overrides(self, monkeypatch):
+        """Bulk categorization applies corrections to every matching row."""
+        import pandas as pd
+
+        cache = parser.MerchantCategoryCache(maxsize=10)
+        cache.set_override("POS Reliance Smart", "Shopping")
+        monkeypatch.setattr(parser, "merchant_cache", cache)
+
+        result = parser.categorize_transactions(pd.Series([
+            "POS/001/RELIANCE SMART", "POS/002/Reliance Smart", "Uber trip"
+        ]))
+
+        assert result.tolist() == ["Shopping", "Shopping", "Transport"]
@@ -71,3 +71,37 @@ def test_risk_engine_extreme_values():
     assert isinstance(result, dict)
     assert "score" in result
     assert "status" in result
+
+def test_batch_matches_scalar_decisions():
+    """
+    Batch scoring must return exactly what the scalar engine returns,
+    including rejected, zero-income and existing-EMI rows.
+    """
+    from app.services.risk_engine import calculate_risk_scores_batch
+
+    cases = [
+        (5000, 12, 50000, 10000, 0),
+        (100000, 12, 5000, 4000, 0),
+        (5000, 12, 0, 1000, 0),
+        (-5000, 12, 50000, 10000, 0),
+        (100000, 12, 20000, 5000, 0),
+        (100000, 12, 15000, 13000, 0),
+        (250000, 36, 60000, 20000, 15000),
+        (1_000_000_000, 12, 50000, 10000, 0),
+        (0.5, 1, 50000, 10000, 0),
+    ]
+    amounts, tenures, incomes, expenses, existing = zip(*cases)
+    batch = calculate_risk_scores_batch(amounts, tenures, incomes, expenses, existing)
+
+    for i, (amount, tenure, income, expense, emi) in enumerate(cases):
+        scalar = calculate_risk_score(amount, tenure, income, expense, emi)
+        assert batch["score"][i] == scalar["score"]
+        assert batch["status"][i] == scalar["status"]
+        assert batch["emi"][i] == scalar["emi"]
+
+def test_batch_rejects_mismatched_columns():
+    """Columns of different lengths are a caller error."""
+    from app.services.risk_engine import calculate_risk_scores_batch
+
+    with pytest.raises(ValueError):
+        calculate_risk_scores_batch([5000, 6000], [12], [50000, 50000], [10000, 10000])
@@ -44,6 +44,22 @@ class TestEMICalculation:
         emi_long = calculate_emi(principal=100000, tenure_months=36)
         # Longer tenure should have lower EMI
         assert emi_long < emi_short, "Longer tenure should have lower EMI"
+    
+    def test_emi_matches_closed_form(self):
+        """Test that the cached annuity factor gives the closed-form Decimal EMI."""
+        from decimal import Decimal, ROUND_HALF_UP
+        for principal, tenure in [(100000, 12), (250000.5, 360), (0.5, 1), (99999.99, 37)]:
+            P = Decimal(str(principal))
+            r = Decimal("12.0") / Decimal("1200")
+            factor = (1 + r) ** tenure
+            expected = P * r * factor / (factor - 1)
+            expected = float(expected.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
+            assert calculate_emi(principal, tenure, 12.0) == expected
+    
+    def test_emi_zero_rate(self):
+        """Test that zero interest splits the principal evenly."""
+        assert calculate_emi(principal=12000, tenure_months=12, annual_rate=0.0) == 1000.0
+        assert calculate_emi(principal=0.045, tenure_months=3, annual_rate=0.0) == 0.02
 
 
 class TestRiskScoreCalculation:
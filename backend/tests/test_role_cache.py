@@ -0,0 +1,91 @@
+"""
+Tests for the profiles.role cache used by the auth dependencies.
+"""
+
+from unittest.mock import MagicMock, patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routers import admin
+from app.utils import security
+from app.utils.security import CurrentUser
+
+
+def _supabase_with_role(role: str) -> MagicMock:
+    supabase = MagicMock()
+    supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [
+        {"role": role}
+    ]
+    return supabase
+
+
+class TestRoleCache:
+    """Tests for get_user_role caching and invalidation."""
+
+    def setup_method(self):
+        security.invalidate_user_role()
+
+    def test_repeated_lookups_query_once(self):
+        """The profiles table is queried once per user within the TTL."""
+        supabase = _supabase_with_role("admin")
+        with patch.object(security, "supabase_client", supabase):
+            roles = [security.get_user_role("user-1") for _ in range(20)]
+
+        assert roles == ["admin"] * 20
+        assert supabase.table.return_value.select.return_value.eq.return_value.execute.call_count == 1
+
+    def test_invalidation_forces_lookup(self):
+        """Invalidating a user re-reads their role."""
+        supabase = _supabase_with_role("user")
+        with patch.object(security, "supabase_client", supabase):
+            assert security.get_user_role("user-1") == "user"
+            supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [
+                {"role": "admin"}
+            ]
+            assert security.get_user_role("user-1") == "user"
+            security.invalidate_user_role("user-1")
+            assert security.get_user_role("user-1") == "admin"
+
+    def test_missing_profile_not_cached(self):
+        """Users without a profile are looked up again next time."""
+        supabase = MagicMock()
+        supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = []
+        with patch.object(security, "supabase_client", supabase):
+            assert security.get_user_role("user-2") is None
+            assert security.get_user_role("user-2") is None
+
+        assert supabase.table.return_value.select.return_value.eq.return_value.execute.call_count == 2
+
+
+class TestRoleUpdateEndpoint:
+    """Tests for PATCH /admin/users/{user_id}/role."""
+
+    def setup_method(self):
+        app.dependency_overrides[admin.verify_admin] = lambda: CurrentUser(
+            id="admin-1", email="admin@example.com", role="admin"
+        )
+
+    def teardown_method(self):
+        app.dependency_overrides.pop(admin.verify_admin, None)
+
+    def test_role_change_invalidates_cache(self):
+        """Changing a role evicts the user's cached role."""
+        supabase = MagicMock()
+        supabase.table.return_value.update.return_value.eq.return_value.execute.return_value.data = [
+            {"id": "user-1", "role": "admin"}
+        ]
+
+        with patch.object(admin, "supabase_client", supabase), \
+                patch.object(admin, "invalidate_user_role") as invalidate:
+            response = TestClient(app).patch("/admin/users/user-1/role", json={"role": "ADMIN"})
+
+        assert response.status_code == 200
+        assert response.json()["role"] == "admin"
+        supabase.table.return_value.update.assert_called_once_with({"role": "admin"})
+        invalidate.assert_called_once_with("user-1")
+
+    def test_invalid_role_rejected(self):
+        """Unknown roles are rejected with 400."""
+        with patch.object(admin, "supabase_client", MagicMock()):
+            response = TestClient(app).patch("/admin/users/user-1/role", json={"role": "superuser"})
+
+        assert response.status_code == 400
@@ -0,0 +1,163 @@
+"""
+Tests for per-user spending rollups.
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routers import analytics, upload
+from app.services import ingestion, llm, rollups
+from app.utils.security import get_current_user, CurrentUser
+
+
+class TestSpendingDeltas:
+    """Tests for rollup delta computation."""
+
+    def test_month_key_formats(self):
+        """ISO and day-first dates bucket by month; others are unknown."""
+        assert rollups.month_key("2024-03-15") == "2024-03"
+        assert rollups.month_key("2024-03-15T10:00:00+00:00") == "2024-03"
+        assert rollups.month_key("5/3/2024") == "2024-03"
+        assert rollups.month_key("15-11-2024") == "2024-11"
+        assert rollups.month_key("Mar 15") == rollups.UNKNOWN_MONTH
+        assert rollups.month_key(None) == rollups.UNKNOWN_MONTH
+
+    def test_spending_and_income_are_split(self):
+        """Debits and untyped negative amounts are spending; credits are income."""
+        deltas = rollups.spending_deltas([
+            {"amount": -250, "category": "Food", "transaction_date": "2024-01-01", "transaction_type": "Debit"},
+            {"amount": -100.5, "category": "Food", "transaction_date": "2024-01-20"},
+            {"amount": 50000, "category": "Income", "transaction_date": "2024-01-01", "transaction_type": "Credit"},
+            {"amount": -40, "category": None, "transaction_date": "2024-02-02", "transaction_type": "Debit"},
+        ])
+
+        assert deltas == {
+            ("Food", "2024-01"): {"total_spent": 350.5, "txn_count": 2, "total_income": 0.0, "income_count": 0},
+            ("Income", "2024-01"): {"total_spent": 0.0, "txn_count": 0, "total_income": 50000.0, "income_count": 1},
+            ("Uncategorized", "2024-02"): {"total_spent": 40.0, "txn_count": 1, "total_income": 0.0, "income_count": 0},
+        }
+
+    def test_failed_increment_rebuilds(self):
+        """A failed increment falls back to rebuilding the user's rollup."""
+        supabase = MagicMock()
+        supabase.rpc.return_value.execute.side_effect = [Exception("timeout"), MagicMock()]
+
+        with patch.object(rollups, "supabase_client", supabase):
+            assert rollups.record_spending("user-1", {("Food", "2024-01"): {"total_spent": 10.0, "txn_count": 1}})
+
+        assert [c.args[0] for c in supabase.rpc.call_args_list] == [
+            "increment_spending_rollups", "rebuild_spending_rollups"
+        ]
+
+    def test_ingestion_records_saved_spending(self):
+        """Statement imports add the saved rows' spending to the rollup."""
+        supabase = MagicMock()
+        supabase.table.return_value.insert.side_effect = lambda rows: MagicMock(
+            execute=MagicMock(return_value=MagicMock(data=rows))
+        )
+        statement = (
+            b"Date,Narration,Debit,Credit\n"
+            b"2024-01-01,Swiggy order,250,\n"
+            b"2024-01-02,Salary January,,50000\n"
+            b"2024-02-03,Uber trip,310,\n"
+        )
+
+        with patch.object(ingestion, "supabase_client", supabase), \
+                patch.object(ingestion, "DEDUP_TRANSACTIONS", False), \
+                patch.object(rollups, "supabase_client", supabase):
+            asyncio.run(ingestion.ingest_statement(statement, "user-1"))
+
+        name, params = supabase.rpc.call_args.args
+        assert name == "increment_spending_rollups"
+        assert sorted(params["p_deltas"], key=lambda d: (d["month"], d["category"])) == [
+            {"category": "Food", "month": "2024-01", "total_spent": 250.0, "txn_count": 1,
+             "total_income": 0.0, "income_count": 0},
+            {"category": "Income", "month": "2024-01", "total_spent": 0.0, "txn_count": 0,
+             "total_income": 50000.0, "income_count": 1},
+            {"category": "Transport", "month": "2024-02", "total_spent": 310.0, "txn_count": 1,
+             "total_income": 0.0, "income_count": 0},
+        ]
+
+
+class TestSpendingEndpointRollup:
+    """Tests for GET /analytics/spending reading the rollup."""
+
+    def setup_method(self):
+        app.dependency_overrides[get_current_user] = lambda: CurrentUser(
+            id="user-1", email="user@example.com"
+        )
+
+    def teardown_method(self):
+        app.dependency_overrides.pop(get_current_user, None)
+
+    def test_reads_rollup_without_scanning(self):
+        """Category totals are summed across months from the rollup."""
+        supabase = MagicMock()
+        supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [
+            {"category": "Food", "month": "2024-01", "total_spent": 350.5, "txn_count": 2},
+            {"category": "Food", "month": "2024-02", "total_spent": 100, "txn_count": 1},
+            {"category": "Transport", "month": "2024-02", "total_spent": 310, "txn_count": 1},
+            {"category": "Income", "month": "2024-02", "total_spent": 0, "txn_count": 0, "total_income": 90000},
+        ]
+
+        with patch.object(rollups, "supabase_client", supabase), \
+                patch.object(analytics, "supabase_client", supabase), \
+                patch.object(llm, "generate_financial_advice", AsyncMock(return_value="Spend less")):
+            response = TestClient(app).get("/analytics/spending")
+
+        assert response.status_code == 200
+        assert response.json() == {
+            "total_spent": 760.5,
+            "breakdown": {"Food": 450.5, "Transport": 310.0},
+            "ai_advisor_feedback": "Spend less"
+        }
+        assert [c.args[0] for c in supabase.table.call_args_list] == ["spending_rollups"]
+
+    def test_falls_back_to_transactions(self):
+        """Without the rollup table the transactions are aggregated directly."""
+        def table(name):
+            query = MagicMock()
+            if name == "spending_rollups":
+                query.select.side_effect = Exception("relation does not exist")
+            else:
+                query.select.return_value.eq.return_value.execute.return_value.data = [
+                    {"amount": -200, "category": "Shopping", "transaction_date": "2024-01-01",
+                     "transaction_type": "Debit"},
+                    {"amount": 1000, "category": "Income", "transaction_date": "2024-01-01",
+                     "transaction_type": "Credit"},
+                ]
+            return query
+
+        supabase = MagicMock()
+        supabase.table.side_effect = table
+
+        with patch.object(rollups, "supabase_client", supabase), \
+                patch.object(analytics, "supabase_client", supabase), \
+                patch.object(llm, "generate_financial_advice", AsyncMock(return_value="ok")):
+            response = TestClient(app).get("/analytics/spending")
+
+        assert response.json()["breakdown"] == {"Shopping": 200.0}
+
+    def test_receipt_updates_rollup(self):
+        """Saving a receipt adds it to the user's rollup."""
+        supabase = MagicMock()
+        supabase.table.return_value.insert.return_value.execute.return_value.data = [{
+            "id": 1, "user_id": "user-1", "description": "Cafe", "amount": -120.0,
+            "category": "Food", "transaction_date": "2024-03-02", "transaction_type": "Debit"
+        }]
+
+        with patch.object(upload, "supabase_client", supabase), \
+                patch.object(rollups, "supabase_client", supabase):
+            response = TestClient(app).post(
+                "/upload/receipt/save",
+                params={"merchant_name": "Cafe", "total_amount": 120, "transaction_date": "2024-03-02",
+                        "category": "Food"}
+            )
+
+        assert response.status_code == 200
+        supabase.rpc.assert_called_once_with("increment_spending_rollups", {
+            "p_user_id": "user-1",
+            "p_deltas": [{"category": "Food", "month": "2024-03", "total_spent": 120.0, "txn_count": 1,
+                          "total_income": 0.0, "income_count": 0}]
+        })
@@ -51,3 +51,55 @@ def test_simulator_missing_field(client: TestClient):
     }
     response = client.post("/simulator/calculate", json=payload)
     assert response.status_code == 422
+
+def test_simulator_batch_matches_single(client: TestClient):
+    """Batch endpoint returns the same decision as the single endpoint per row."""
+    rows = [
+        {"amount": 5000, "tenure_months": 12, "income": 50000, "expenses": 10000},
+        {"amount": 100000, "tenure_months": 12, "income": 5000, "expenses": 4000},
+    ]
+    payload = {key: [row[key] for row in rows] for key in rows[0]}
+    response = client.post("/simulator/calculate-batch", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["count"] == 2
+
+    for i, row in enumerate(rows):
+        single = client.post("/simulator/calculate", json=row).json()
+        assert data["scores"][i] == single["score"]
+        assert data["statuses"][i] == single["status"]
+        assert data["emis"][i] == single["emi"]
+
+def test_simulator_batch_length_mismatch(client: TestClient):
+    """Columns of different lengths are rejected."""
+    payload = {
+        "amount": [5000, 6000],
+        "tenure_months": [12],
+        "income": [50000, 50000],
+        "expenses": [10000, 10000]
+    }
+    response = client.post("/simulator/calculate-batch", json=payload)
+    assert response.status_code == 400
+
+def test_simulator_batch_rejects_out_of_range_tenure(client: TestClient):
+    """Tenures outside 1-360 months are rejected instead of overflowing the EMI math."""
+    payload = {
+        "amount": [5000, 5000],
+        "tenure_months": [12, 10**12],
+        "income": [50000, 50000],
+        "expenses": [10000, 10000],
+    }
+    response = client.post("/simulator/calculate-batch", json=payload)
+    assert response.status_code == 422
+
+def test_simulator_batch_accepts_full_tenure_range(client: TestClient):
+    """Short and long loans the application schema allows score in one batch."""
+    payload = {
+        "amount": [5000, 500000, 5000],
+        "tenure_months": [1, 300, 360],
+        "income": [50000, 150000, 50000],
+        "expenses": [10000, 20000, 10000],
+    }
+    response = client.post("/simulator/calculate-batch", json=payload)
+    assert response.status_code == 200
+    assert response.json()["count"] == 3
@@ -0,0 +1,263 @@
+"""
+Tests for background bank statement ingestion jobs.
+"""
+
+import asyncio
+import os
+from unittest.mock import MagicMock, patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routers import upload
+from app.services import ingestion, statement_jobs
+from app.utils.security import get_current_user, CurrentUser
+
+STATEMENT = (
+    b"Date,Narration,Debit,Credit\n"
+    b"2024-01-01,Swiggy order,250,\n"
+    b"2024-01-02,Salary January,,50000\n"
+    b"2024-01-03,Uber trip,310,\n"
+)
+
+
+def _mock_supabase():
+    supabase = MagicMock()
+    supabase.table.return_value.upsert.side_effect = lambda rows, **kwargs: MagicMock(
+        execute=MagicMock(return_value=MagicMock(data=rows))
+    )
+    return supabase
+
+
+def _run_job(tmp_path, content, user_full_name=None):
+    """Store a file, queue it and wait for the worker to finish."""
+    source = tmp_path / "upload.csv"
+    source.write_bytes(content)
+
+    async def run():
+        with open(source, "rb") as f:
+            path = statement_jobs.store_upload(f, "user-1", "stmt-1")
+        statement_jobs.submit_statement_job("stmt-1", path, "user-1", user_full_name)
+        await statement_jobs._get_pool()["queue"].join()
+        return path
+
+    with patch.object(statement_jobs, "STATEMENT_UPLOAD_DIR", str(tmp_path / "jobs")):
+        return asyncio.run(run())
+
+
+class TestStatementJobs:
+    """Tests for the job queue and workers."""
+
+    def test_job_completes_and_cleans_up(self, tmp_path):
+        """A queued statement is saved, marked completed and its file removed."""
+        supabase = _mock_supabase()
+        with patch.object(ingestion, "supabase_client", supabase), \
+                patch.object(statement_jobs, "supabase_client", supabase):
+            path = _run_job(tmp_path, STATEMENT)
+
+        progress = statement_jobs.get_job_progress("stmt-1")
+        assert progress["status"] == "completed"
+        assert progress["transactions_parsed"] == 3
+        assert progress["transactions_saved"] == 3
+        assert not os.path.exists(path)
+
+        final_update = supabase.table.return_value.update.call_args_list[-1].args[0]
+        assert final_update == {"status": "completed", "transactions_count": 3}
+
+    def test_identity_mismatch_marks_failed(self, tmp_path):
+        """A failing job records the reason on the statement."""
+        supabase = _mock_supabase()
+        with patch.object(ingestion, "supabase_client", supabase), \
+                patch.object(statement_jobs, "supabase_client", supabase):
+            _run_job(tmp_path, b"Account: Someone Else\n" + STATEMENT, user_full_name="Priya Sharma")
+
+        progress = statement_jobs.get_job_progress("stmt-1")
+        assert progress["status"] == "failed"
+        assert "Identity Verification Failed" in progress["error"]
+        updates = [c.args[0] for c in supabase.table.return_value.update.call_args_list]
+        assert {"status": "failed"} in updates
+        supabase.table.return_value.upsert.assert_not_called()
+
+
+class TestRecoverJobs:
+    """Tests for resuming jobs left behind by a previous process."""
+
+    def _recover(self, tmp_path, supabase):
+        with patch.object(ingestion, "supabase_client", supabase), \
+                patch.object(statement_jobs, "supabase_client", supabase), \
+                patch.object(statement_jobs, "STATEMENT_UPLOAD_DIR", str(tmp_path)):
+            async def run():
+                summary = await statement_jobs.recover_jobs()
+                await statement_jobs._get_pool()["queue"].join()
+                return summary
+            return asyncio.run(run())
+
+    def test_queued_file_is_requeued(self, tmp_path):
+        """A stored upload that never started is processed on startup."""
+        (tmp_path / "user-1").mkdir()
+        (tmp_path / "user-1" / "stmt-7.csv").write_bytes(STATEMENT)
+        supabase = _mock_supabase()
+        supabase.table.return_value.select.return_value.eq.return_value.lt.return_value \
+            .execute.return_value.data = [{"id": "stmt-7"}]
+
+        summary = self._recover(tmp_path, supabase)
+
+        assert summary == {"requeued": 1, "failed": 0}
+        assert statement_jobs.get_job_progress("stmt-7")["status"] == "completed"
+        assert not os.listdir(tmp_path / "user-1")
+
+    def test_interrupted_and_stale_jobs_marked_failed(self, tmp_path):
+        """Jobs cut off mid-run, or with no file left, are failed."""
+        (tmp_path / "user-1").mkdir()
+        running = tmp_path / "user-1" / f"stmt-8.csv.{statement_jobs._HOST}.999999999.running"
+        running.write_bytes(STATEMENT)
+        supabase = _mock_supabase()
+        supabase.table.return_value.select.return_value.eq.return_value.lt.return_value \
+            .execute.return_value.data = [{"id": "stmt-9"}]
+
+        summary = self._recover(tmp_path, supabase)
+
+        assert summary == {"requeued": 0, "failed": 2}
+        assert not running.exists()
+        failed = [
+            c.args[0] for c in supabase.table.return_value.update.call_args_list
+            if c.args[0].get("error_message")
+        ]
+        assert failed == [
+            {"error_message": statement_jobs.INTERRUPTED_ERROR},
+            {"error_message": statement_jobs.STALE_ERROR},
+        ]
+        supabase.table.return_value.upsert.assert_not_called()
+
+    def test_live_claims_left_alone(self, tmp_path):
+        """Jobs a live process (here or on another host) is running are not failed."""
+        (tmp_path / "user-1").mkdir()
+        here = tmp_path / "user-1" / f"stmt-8.csv.{statement_jobs._HOST}.{os.getpid()}.running"
+        elsewhere = tmp_path / "user-1" / "stmt-9.csv.other-host.1.running"
+        for running in (here, elsewhere):
+            running.write_bytes(STATEMENT)
+        supabase = _mock_supabase()
+        # Both statements are old enough for the stale sweep
+        supabase.table.return_value.select.return_value.eq.return_value.lt.return_value \
+            .execute.return_value.data = [{"id": "stmt-8"}, {"id": "stmt-9"}]
+
+        summary = self._recover(tmp_path, supabase)
+
+        assert summary == {"requeued": 0, "failed": 0}
+        assert here.exists() and elsewhere.exists()
+        supabase.table.return_value.update.assert_not_called()
+
+
+class TestSyncUploadParseError:
+    """A parse error late in the file after earlier chunks were saved."""
+
+    def setup_method(self):
+        app.dependency_overrides[get_current_user] = lambda: CurrentUser(
+            id="user-1", email="user@example.com"
+        )
+
+    def teardown_method(self):
+        app.dependency_overrides.pop(get_current_user, None)
+
+    def test_partial_save_reported_and_statement_failed(self):
+        """Saved rows are reported and the statement is not left processing."""
+        rows = b"".join(b"2024-01-01,Shop %d,10,\n" % i for i in range(6000))
+        content = b"Date,Narration,Debit,Credit\n" + rows + b'2024-01-02,"Broken,5,\n'
+
+        supabase = MagicMock()
+        supabase.table.return_value.select.return_value.eq.return_value.limit.return_value \
+            .execute.return_value.data = []
+        supabase.table.return_value.insert.side_effect = lambda rows: MagicMock(execute=MagicMock(
+            return_value=MagicMock(data=rows if isinstance(rows, list) else [{"id": "stmt-5"}])
+        ))
+
+        with patch.object(upload, "supabase_client", supabase), \
+                patch.object(ingestion, "supabase_client", supabase), \
+                patch.object(ingestion, "DEDUP_TRANSACTIONS", False):
+            response = TestClient(app).post(
+                "/upload/bank-statement?background=false",
+                files={"file": ("jan.csv", content, "text/csv")}
+            )
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["status"] == "partial"
+        assert body["transactions_parsed"] == 5000  # The chunk holding the bad row is lost
+        assert body["transactions_saved"] == 5000
+        assert "CSV parsing error" in body["error"]
+
+        updates = [c.args[0] for c in supabase.table.return_value.update.call_args_list]
+        assert {"status": "failed", "transactions_count": 5000} in updates
+        assert any("CSV parsing error" in u.get("error_message", "") for u in updates)
+        assert {"status": "completed", "transactions_count": 5000} not in updates
+
+
+class TestStatementStatusEndpoint:
+    """Tests for GET /upload/bank-statement/{id}."""
+
+    def setup_method(self):
+        app.dependency_overrides[get_current_user] = lambda: CurrentUser(
+            id="user-1", email="user@example.com"
+        )
+
+    def teardown_method(self):
+        app.dependency_overrides.pop(get_current_user, None)
+
+    def _supabase_with_statement(self, statement):
+        supabase = MagicMock()
+        supabase.table.return_value.select.return_value.eq.return_value.limit.return_value \
+            .execute.return_value.data = [statement] if statement else []
+        return supabase
+
+    def test_reports_progress(self):
+        """Live counters are merged into the stored status."""
+        supabase = self._supabase_with_statement({
+            "id": "stmt-9", "user_id": "user-1", "file_name": "jan.csv",
+            "status": "processing", "transactions_count": 500
+        })
+        statement_jobs._job_progress.set("stmt-9", {"status": "processing", "transactions_parsed": 1200})
+
+        with patch.object(upload, "supabase_client", supabase):
+            response = TestClient(app).get("/upload/bank-statement/stmt-9")
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["status"] == "processing"
+        assert body["transactions_saved"] == 500
+        assert body["transactions_parsed"] == 1200
+
+    def test_other_users_statement_forbidden(self):
+        """Users cannot poll statements they do not own."""
+        supabase = self._supabase_with_statement({"id": "stmt-2", "user_id": "someone-else"})
+
+        with patch.object(upload, "supabase_client", supabase):
+            response = TestClient(app).get("/upload/bank-statement/stmt-2")
+
+        assert response.status_code == 403
+
+    def test_missing_statement(self):
+        """Unknown IDs return 404."""
+        with patch.object(upload, "supabase_client", self._supabase_with_statement(None)):
+            response = TestClient(app).get("/upload/bank-statement/nope")
+
+        assert response.status_code == 404
+
+    def test_background_upload_returns_immediately(self, tmp_path):
+        """?background=true stores the file, queues a job and returns 202."""
+        supabase = MagicMock()
+        supabase.table.return_value.insert.return_value.execute.return_value.data = [{"id": "stmt-5"}]
+        supabase.table.return_value.select.return_value.eq.return_value.limit.return_value \
+            .execute.return_value.data = []
+
+        with patch.object(upload, "supabase_client", supabase), \
+                patch.object(statement_jobs, "STATEMENT_UPLOAD_DIR", str(tmp_path)), \
+                patch.object(statement_jobs, "submit_statement_job") as submit:
+            response = TestClient(app).post(
+                "/upload/bank-statement?background=true",
+                files={"file": ("jan.csv", STATEMENT, "text/csv")}
+            )
+
+        assert response.status_code == 202
+        assert response.json()["statement_id"] == "stmt-5"
+        statement_id, path, user_id, _ = submit.call_args.args
+        assert (statement_id, user_id) == ("stmt-5", "user-1")
+        with open(path, "rb") as f:
+            assert f.read() == STATEMENT